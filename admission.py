@@ -0,0 +1,335 @@
+"""
+Admission control for the generation endpoints.
+
+Requests pass three gates before any Gemini work starts:
+1. a per-client token bucket per endpoint (429 + Retry-After when empty)
+2. a per-endpoint in-flight cap
+3. a global in-flight cap
+Gates 2 and 3 have a bounded wait queue; when it is full, or a queued request
+waits too long, the request is shed with 503 + Retry-After.
+
+Limits are per process. Token buckets can optionally live in SQLite so all
+workers on a host share them.
+"""
+import asyncio
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+
+class Rejected(Exception):
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    In-flight cap with a bounded wait queue.
+
+    Args:
+        max_in_flight: Requests allowed to run at once
+        max_queue: Requests allowed to wait for a slot
+        queue_timeout: Seconds a request may wait before being shed
+    """
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise Rejected(503, "Server is busy, please retry later", max(1, math.ceil(self.queue_timeout)))
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected(503, "Timed out waiting for capacity, please retry later",
+                                       max(1, math.ceil(self.queue_timeout)))
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+
+class MemoryBucketStore:
+    """ In-process token buckets, LRU-bounded by client count. """
+
+    blocking = False
+
+    def __init__(self, max_clients=10000):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """ Takes one token; returns 0 on success or the seconds until a token is available. """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBucketStore:
+    """ Token buckets shared by all workers on a host through a SQLite file. """
+
+    # take() may wait up to the 5s busy timeout, so async callers run it in a thread
+    blocking = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class EndpointLimits:
+    """
+    Args:
+        rate: Requests per second refilled into each client's bucket (0 disables rate limiting)
+        burst: Bucket capacity
+        max_in_flight: Concurrent requests for this endpoint
+        max_queue: Requests allowed to wait for an endpoint slot
+    """
+
+    def __init__(self, rate, burst, max_in_flight, max_queue):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+
+    @classmethod
+    def from_env(cls, endpoint, rate, burst, max_in_flight, max_queue):
+        prefix = f"ADMISSION_{endpoint.upper()}_"
+        return cls(
+            rate=float(os.getenv(prefix + "RATE", rate)),
+            burst=float(os.getenv(prefix + "BURST", burst)),
+            max_in_flight=int(os.getenv(prefix + "MAX_IN_FLIGHT", max_in_flight)),
+            max_queue=int(os.getenv(prefix + "MAX_QUEUE", max_queue)),
+        )
+
+
+class AdmissionController:
+    """
+    Args:
+        limits: Mapping of endpoint name to EndpointLimits
+        bucket_store: MemoryBucketStore or SQLiteBucketStore
+        max_in_flight: Global concurrent request cap
+        max_queue: Global wait queue size
+        queue_timeout: Seconds a request may wait in either queue
+        trust_proxy: Use the first X-Forwarded-For address as the client IP
+        enabled: When false, limit() leaves routes undecorated
+    """
+
+    def __init__(self, limits, bucket_store, max_in_flight=32, max_queue=64, queue_timeout=10, trust_proxy=False,
+                 enabled=True):
+        self.enabled = enabled
+        self.limits = limits
+        self.bucket_store = bucket_store
+        self.trust_proxy = trust_proxy
+        self.global_limiter = ConcurrencyLimiter(max_in_flight, max_queue, queue_timeout)
+        self.endpoint_limiters = {
+            endpoint: ConcurrencyLimiter(endpoint_limits.max_in_flight, endpoint_limits.max_queue, queue_timeout)
+            for endpoint, endpoint_limits in limits.items()
+        }
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, endpoint, name):
+        with self._lock:
+            stats = self._stats.setdefault(
+                endpoint, {"admitted": 0, "rate_limited": 0, "shed": 0}
+            )
+            stats[name] += 1
+
+    def client_key(self, headers=None, remote_addr=None):
+        """ Bucket key for a client; defaults to the current Flask request's headers and address. """
+        if headers is None:
+            headers, remote_addr = request.headers, request.remote_addr
+        api_key = headers.get('X-API-Key')
+        if api_key:
+            return f"key:{api_key}"
+        if self.trust_proxy and headers.get('X-Forwarded-For'):
+            return "ip:" + headers['X-Forwarded-For'].split(',')[0].strip()
+        return f"ip:{remote_addr}"
+
+    def check_rate(self, endpoint, client_key):
+        """ Takes a token from the client's bucket for the endpoint; raises Rejected (429) when empty. """
+        endpoint_limits = self.limits[endpoint]
+        if endpoint_limits.rate > 0:
+            wait = self.bucket_store.take(f"{endpoint}:{client_key}", endpoint_limits.rate, endpoint_limits.burst)
+            if wait > 0:
+                self._count(endpoint, "rate_limited")
+                raise Rejected(429, "Rate limit exceeded, please slow down", max(1, math.ceil(wait)))
+
+    async def check_rate_async(self, endpoint, client_key):
+        """ check_rate() for the asyncio serving mode; a SQLite bucket store is used from a worker thread. """
+        if self.bucket_store.blocking:
+            await asyncio.to_thread(self.check_rate, endpoint, client_key)
+        else:
+            self.check_rate(endpoint, client_key)
+
+    def admit(self, endpoint):
+        """ Runs all gates; returns a release callback or raises Rejected. """
+        self.check_rate(endpoint, self.client_key())
+
+        endpoint_limiter = self.endpoint_limiters[endpoint]
+        try:
+            endpoint_limiter.acquire()
+        except Rejected:
+            self._count(endpoint, "shed")
+            raise
+        try:
+            self.global_limiter.acquire()
+        except Rejected:
+            endpoint_limiter.release()
+            self._count(endpoint, "shed")
+            raise
+        self._count(endpoint, "admitted")
+
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self.global_limiter.release()
+                endpoint_limiter.release()
+
+        return release
+
+    def limit(self, endpoint):
+        """
+        Route decorator applying admission control.
+
+        Slots are held until the response finishes, including streamed responses.
+        """
+        def decorator(view):
+            if not self.enabled:
+                return view
+
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    release = self.admit(endpoint)
+                except Rejected as rejected:
+                    response = jsonify({"error": rejected.message})
+                    response.status_code = rejected.status
+                    response.headers['Retry-After'] = str(rejected.retry_after)
+                    return response
+                try:
+                    result = view(*args, **kwargs)
+                except BaseException:
+                    release()
+                    raise
+                response = result[0] if isinstance(result, tuple) else result
+                if getattr(response, "is_streamed", False):
+                    response.call_on_close(release)
+                else:
+                    release()
+                return result
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            stats = {endpoint: dict(values) for endpoint, values in self._stats.items()}
+        for endpoint, limiter in self.endpoint_limiters.items():
+            stats.setdefault(endpoint, {}).update({"in_flight": limiter.in_flight, "queued": limiter.waiting})
+        stats["global"] = {
+            "in_flight": self.global_limiter.in_flight,
+            "queued": self.global_limiter.waiting,
+            "max_in_flight": self.global_limiter.max_in_flight,
+            "max_queue": self.global_limiter.max_queue,
+        }
+        return stats
+
+
+def create_admission_controller():
+    """ Builds admission limits from ADMISSION_* environment variables. """
+    limits = {
+        # Itineraries are by far the most expensive call, so they get the tightest limits.
+        "itinerary": EndpointLimits.from_env("itinerary", rate=0.1, burst=3, max_in_flight=8, max_queue=16),
+        "itinerary_days": EndpointLimits.from_env("itinerary_days", rate=0.5, burst=5, max_in_flight=16, max_queue=32),
+        "guide": EndpointLimits.from_env("guide", rate=1, burst=10, max_in_flight=24, max_queue=48),
+        "gems": EndpointLimits.from_env("gems", rate=2, burst=10, max_in_flight=24, max_queue=48),
+        # Batch items are charged to their own endpoint's bucket; this only caps concurrent batches
+        "batch": EndpointLimits.from_env("batch", rate=0, burst=1, max_in_flight=4, max_queue=8),
+    }
+    state_db = os.getenv("ADMISSION_STATE_DB")
+    bucket_store = SQLiteBucketStore(state_db) if state_db else MemoryBucketStore()
+    return AdmissionController(
+        limits,
+        bucket_store,
+        max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+        trust_proxy=os.getenv("ADMISSION_TRUST_PROXY", "").lower() in ("1", "true", "yes"),
+        enabled=os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no"),
+    )
@@ -1,20 +1,46 @@
 import os
-from flask import Flask, request, jsonify
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from flask import Blueprint, Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import logging
 
 # --- Vertex AI Client Libraries ---
-import google.generativeai as genai
-from google.generativeai import types
-from google.api_core import exceptions as google_exceptions
-import google.auth
+# Imported on first use (see lazy_imports.py) so workers start fast
+from lazy_imports import lazy_module
+
+google_exceptions = lazy_module("google.api_core.exceptions")
+
+from model_provider import ModelProvider
+from prompts import (
+    build_gems_prompt,
+    build_guide_prompt,
+    build_guide_session_opening,
+    build_itinerary_days_prompt,
+    build_itinerary_prompt,
+    system_instruction_for,
+)
+from cache import create_response_cache, make_cache_key, normalize_list, normalize_text
+from singleflight import create_single_flight
+from gems_catalog import DEFAULT_CATALOG_PATH, GemsCatalog, normalize_location
+from query_matching import create_near_duplicate_index
+from jobs import QueueFullError, create_job_queue
+from itineraries import Itinerary, VersionConflictError, create_itinerary_store
+from guide_sessions import create_guide_session_store
+from http_cache import create_http_cache
+from admission import Rejected, create_admission_controller
+from resilience import CircuitOpenError, create_resilient_caller
+from serving import GenerationStream, cache_bypass_requested, revalidatable_value, streaming_requested
+import metrics
+import warm
 
 # --- Configuration ---
 load_dotenv()
-app = Flask(__name__)
-CORS(app)
-logging.basicConfig(level=logging.INFO)
+api = Blueprint('api', __name__)
 
 # --- Vertex AI Initialization ---
 VERTEX_PROJECT = os.getenv("VERTEX_AI_PROJECT")
@@ -24,128 +50,193 @@ GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 GOOGLE_TRANSLATE_API_KEY = os.getenv("GOOGLE_TRANSLATE_API_KEY")
 GOOGLE_VISION_API_KEY = os.getenv("GOOGLE_VISION_API_KEY")
 
-# Check for required environment variables
-if not VERTEX_PROJECT or not VERTEX_LOCATION:
-    logging.warning("VERTEX_AI_PROJECT or VERTEX_AI_LOCATION environment variables not set.")
-if not VERTEX_API_KEY:
-    logging.warning("GOOGLE_MAPS_API_KEY environment variable not set - required for Gemini API access.")
-
-# --- System Instruction for Itinerary ---
-ITINERARY_SYSTEM_INSTRUCTION = """Okay, understood! You want a detailed day-by-day plan with specific activities for each location. Absolutely, let's craft that richer itinerary for you!
-(Assistant's Response After Receiving All User Inputs - Enhanced Detail)
-Namaste! Thank you very much for providing your travel details to Dream Vacations. I'm excited to start planning based on this:
-Destination(s): [Insert Destination(s) Provided by User]
-Vacation Type: [Insert Vacation Type Provided by User - e.g., Romantic, Family Fun, Exploration]
-Travelling Group: [Insert Group Type Provided by User - e.g., Couple, Family (mention kids if applicable), Friends, Solo]
-Duration: [Insert Number of Days Provided by User]
-Budget: Approximately [Insert Budget Provided by User] (typically excluding initial travel to the destination, unless specified otherwise)
-This is a fantastic set of preferences! Planning a [Insert Vacation Type] trip to [Insert Destination] for [Insert Number of Days] sounds like an incredible experience waiting to happen. Especially for a [Insert Group Type] group, we can tailor the activities perfectly.
-Based on your inputs, here is a detailed potential day-by-day itinerary designed just for you:
-(Here, you would insert a detailed draft itinerary based on the specific inputs. See example below using hypothetical inputs: Destination: Jaipur & Udaipur (Rajasthan), Type: Family Exploration, Group: Family (2 adults, 2 kids 8 & 12), Days: 7, Budget: ₹1,50,000)
-Example Detailed Itinerary: Rajasthan Family Exploration (Jaipur & Udaipur)
-Focus: Exploring historical sites with family-friendly activities.
-Duration: 7 Days / 6 Nights
-Budget: Approx. ₹1,50,000 (excluding flights/trains to Jaipur & from Udaipur)
-Day 1: Arrival in Jaipur & City Palace Exploration
-Arrive at Jaipur Airport (JAI) or Railway Station. Transfer to your pre-booked family-friendly hotel.
-Check-in and freshen up. Have lunch at the hotel or a nearby restaurant.
-Afternoon: Visit the magnificent City Palace complex. Explore the museums (textiles, armoury - fascinating for kids!), courtyards, and Mubarak Mahal. Allow ample time (2-3 hours).
-Evening: Stroll through the nearby Bapu Bazaar or Johari Bazaar for colourful souvenirs, textiles, and jewellery (optional). Enjoy dinner at a local Rajasthani Thali restaurant for an authentic experience.
-Return to the hotel.
-Day 2: Jaipur - Amber Fort & Hawa Mahal
-After breakfast at the hotel.
-Morning: Drive to Amber Fort (Amer Fort), located just outside the city. You can opt for an elephant ride (book in advance, check ethics/availability) or a jeep ride up to the fort entrance. Explore the stunning palaces, halls, and Sheesh Mahal (Mirror Palace) within the fort complex (allow 3-4 hours).
-On the way back, stop for photos at Jal Mahal (Water Palace), which appears to float on Man Sagar Lake.
-Lunch near Amber Fort or back in Jaipur city.
-Afternoon: Visit the iconic Hawa Mahal (Palace of Winds). Admire its unique facade from the outside and perhaps explore the small museum inside.
-Optional Evening: Consider a block-printing workshop (fun for kids and adults) or visit Chokhi Dhani (an ethnic village resort offering cultural shows, camel rides, traditional dinner - can be a full evening activity, extra cost).
-Dinner either at Chokhi Dhani or back in the city.
-Day 3: Jaipur - Jantar Mantar & Travel to Udaipur (Flight Recommended)
-After breakfast, check out from the hotel (you can store luggage).
-Morning: Visit Jantar Mantar, the incredible astronomical observatory with giant stone instruments (UNESCO site). It's fascinating for all ages (allow 1-1.5 hours).
-Visit the Albert Hall Museum (State Museum) for its Indo-Saracenic architecture and diverse collection (optional, if time permits).
-Have an early lunch.
-Afternoon: Transfer to Jaipur Airport (JAI) for your flight to Udaipur (UDR). (Flight is recommended to save time compared to a 6-7 hour drive).
-Arrive at Udaipur Airport. Transfer to your pre-booked hotel, preferably one with views of Lake Pichola if budget allows.
-Check-in and relax.
-Evening: Enjoy a leisurely walk by Lake Pichola or Fateh Sagar Lake.
-Dinner at a lakeside restaurant offering beautiful night views of the City Palace and Lake Palace.
-Day 4: Udaipur - City Palace & Lake Pichola Boat Ride
-Enjoy breakfast at the hotel.
-Morning: Explore the sprawling Udaipur City Palace, perched on the banks of Lake Pichola. Discover its courtyards, balconies, museums, and intricate artwork (allow 3-4 hours). The views over the lake are spectacular.
-Visit the nearby Jagdish Temple, an impressive Indo-Aryan temple.
-Lunch at a rooftop restaurant in the old city area with palace views.
-Late Afternoon/Evening: Take a serene boat ride on Lake Pichola. Enjoy views of the City Palace, Jag Mandir Island, and the Lake Palace (now a luxury hotel). The sunset boat ride is particularly magical.
-Optional Evening: Watch the Dharohar folk dance show at Bagore Ki Haveli for a cultural experience.
-Dinner in the old city or back at the hotel.
-Day 5: Udaipur - Saheliyon Ki Bari & Shilpgram
-Breakfast at the hotel.
-Morning: Visit Saheliyon Ki Bari (Garden of the Maidens), a beautiful garden with fountains, kiosks, marble elephants, and a delightful lotus pool. It's a pleasant spot for families.
-Explore Shilpgram, the rural arts and crafts complex located a few kilometres outside the city. See traditional huts from different states, watch artisans at work, and enjoy cultural performances (check timings). It's engaging for kids.
-Lunch at Shilpgram's restaurant or back in Udaipur.
-Afternoon: Relax or perhaps visit the Vintage Car Museum (interesting collection, might appeal to some family members).
-Evening: Visit Sajjangarh Monsoon Palace, perched on a hilltop offering panoramic sunset views over Udaipur city and its lakes (best visited just before sunset).
-Dinner at a restaurant of your choice.
-Day 6: Udaipur - Optional Excursion or Relaxation
-After breakfast.
-Option 1 (Excursion): Take a day trip to Ranakpur Jain Temples (approx. 2.5 hours drive each way). Known for their intricate marble carvings, they are truly stunning (requires appropriate dress code). You could combine this with a brief stop at Kumbhalgarh Fort (UNESCO site, requires more time). This would be a long day.
-Option 2 (Relaxation/Local): Enjoy a more relaxed day. Revisit a favourite spot, go shopping for local crafts and miniature paintings in the old city markets, or enjoy the hotel facilities (pool, etc.). Maybe try a Rajasthani cooking class?
-Lunch according to your chosen activity.
-Evening: Enjoy a final farewell dinner in Udaipur.
-Day 7: Departure from Udaipur
-Enjoy a final Rajasthani breakfast at your hotel.
-Depending on your flight/train schedule, you might have time for some last-minute souvenir shopping or a final stroll by the lake.
-Check out from the hotel.
-Transfer to Udaipur Airport (UDR) or Railway Station for your onward journey home, filled with royal memories!
-Accommodation Style: We'll aim for comfortable, family-friendly hotels or heritage havelis in both cities, ensuring they fit within the ₹1,50,000 budget. Location will be key for ease of access.
-Transport: A private air-conditioned vehicle (like an Innova or similar) for sightseeing and transfers within/between cities (if driving) or for airport/station transfers is highly recommended for a family. Flight between Jaipur and Udaipur is suggested for efficiency.
-(End of Example)
-Include cost of each activity. Include local eatery names too."""
-
-GUIDE_SYSTEM_INSTRUCTION = """SYSTEM PROMPT: INDIAN DIGITAL GUIDE
-
-You are the Ultimate Indian Tourist Guide, a sophisticated AI assistant embedded in an Indian travel application. Your primary purpose is to provide comprehensive, accurate, and engaging information about Indian tourist destinations.
-
-CORE RESPONSIBILITIES:
-- Provide detailed knowledge about Indian tourist spots, including historical significance, cultural context, practical visitor information, and hidden gems
-- Adapt your communication style based on user preference (General, Funny, or Basic/Child-friendly)
-- Offer actionable guidance including directions, best times to visit, photography spots, local customs, and safety tips
-- Personalize recommendations based on user interests and constraints when provided
-
-COMMUNICATION STYLES:
-1. GENERAL: Clear, informative, and professional. Focus on historical facts, cultural significance, and practical visitor information.
-2. FUNNY: Incorporate humor, interesting anecdotes, and light-hearted observations while maintaining factual accuracy. Use cultural references and wordplay appropriate to Indian tourism.
-3. BASIC: Use simplified language, shorter sentences, and fundamental explanations suitable for children or non-native English speakers. Emphasize visual descriptions and concrete examples.
-
-RESPONSE GUIDELINES:
-- Begin each response by acknowledging the selected tourist spot and communication style
-- When responding, always provide specific and actionable information related to the tourist spot
-- Prioritize clarity and helpfulness over brevity, especially when addressing open-ended questions
-- Include practical details: opening hours, entry fees, accessibility information, and local transportation options
-- Suggest nearby attractions, local cuisine, and cultural experiences relevant to the location
-- Respect cultural sensitivities and present diverse perspectives when discussing historical or religious sites
-- For uncertain information, acknowledge limitations rather than providing potentially incorrect details
-
-SAFETY & ETHICS:
-- Prioritize user safety with appropriate warnings about location-specific risks
-- Promote responsible tourism practices and cultural respect
-- Avoid reinforcing stereotypes about India or specific regions
-- Refrain from political commentary unless directly relevant to understanding a historical site
-
-Remember: Your guidance should enrich the traveler's experience by deepening their understanding of India's diverse heritage while providing practical assistance for their journey."""
-
-GEMS_SYSTEM_INSTRUCTION = """You are a travel insider with extensive knowledge of hidden gems worldwide.
-For the location provided, recommend 5-7 lesser-known attractions or experiences that match the user's preferences.
-For each hidden gem, include:
-1. Name and brief description
-2. Why it's special/unique
-3. Best time to visit
-4. Approximate cost
-5. How to get there from city center
-6. One insider tip that makes the experience better
-Focus on authentic, non-touristy experiences that reveal the true character of the destination."""
+# --- Shared Gemini Client ---
+# Configured once per process on first use; see model_provider.py for per-endpoint model overrides.
+model_provider = ModelProvider.from_env(VERTEX_API_KEY)
+
+# --- Response Cache ---
+response_cache = create_response_cache()
+single_flight = create_single_flight()
+
+def _itinerary_cache_params(location, duration, interests, other_prefs):
+    return {
+        "location": normalize_text(location),
+        "duration": normalize_text(duration),
+        "interests": normalize_list(interests),
+        "other_prefs": normalize_text(other_prefs),
+    }
+
+def _guide_cache_params(location, topic, style="GENERAL"):
+    return {
+        "location": normalize_text(location),
+        "topic": normalize_text(topic),
+        "style": normalize_text(style),
+    }
+
+def _gems_cache_params(location, preferences):
+    return {
+        "location": normalize_text(location),
+        "preferences": normalize_list(preferences),
+    }
+
+def _cache_bypass_requested(data=None):
+    """ True when the caller asked to skip the response cache. """
+    return cache_bypass_requested(request.args, request.headers, data)
+
+# --- HTTP Caching ---
+http_cache = create_http_cache()
+
+def _cached_get_response(endpoint, cache_key, produce, complete=None):
+    """
+    Serves a GET endpoint with ETag, Cache-Control and stale-while-revalidate.
+    
+    An expired response cache entry still inside the endpoint's
+    stale-while-revalidate window is served immediately and regenerated in the
+    background. Otherwise ``produce`` runs, which answers fresh entries from
+    the response cache, so a matching If-None-Match gets 304 without calling Gemini.
+    
+    Args:
+        endpoint: Endpoint name selecting the HTTP cache policy (guide, gems)
+        cache_key: Response cache key of the generation, or None if it is not cached
+        produce: Callable taking ``bypass_cache`` and returning the result dict
+        complete: Optional callable telling whether a result is final; partial
+            results and cache bypasses are sent with no-store
+    """
+    bypass_cache = _cache_bypass_requested()
+    result = None
+    if cache_key is not None and not bypass_cache:
+        result = revalidatable_value(response_cache, http_cache, endpoint, cache_key)
+        if result is not None:
+            logging.info(f"Serving stale {endpoint} response while revalidating")
+            http_cache.schedule_refresh(cache_key, lambda: produce(True))
+    
+    stale = result is not None
+    if result is None:
+        result = produce(bypass_cache)
+    
+    if 'error' in result:
+        return jsonify(result), 500
+    cacheable = not bypass_cache and (complete is None or complete(result))
+    return http_cache.respond(
+        endpoint, result, request.headers.get('If-None-Match'), stale=stale, cacheable=cacheable,
+        accept_encoding=request.headers.get('Accept-Encoding')
+    )
+
+# --- Admission Control ---
+admission = create_admission_controller()
+
+# --- Upstream Resilience ---
+resilient_caller = create_resilient_caller()
+
+# --- Instrumentation ---
+@contextmanager
+def upstream_call(endpoint, track_request=True):
+    """
+    Times one Gemini call for metrics and the Server-Timing header.
+
+    Records latency by outcome, in-flight calls and errors by exception type;
+    exceptions are re-raised unchanged. With ``track_request`` the time is also
+    added to the current request's upstream total.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    metrics.UPSTREAM_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        yield
+    except BaseException as e:
+        outcome = "error"
+        metrics.UPSTREAM_ERRORS.inc(endpoint=endpoint, exception=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.UPSTREAM_IN_FLIGHT.dec(endpoint=endpoint)
+        metrics.UPSTREAM_LATENCY.observe(elapsed, endpoint=endpoint, outcome=outcome)
+        if track_request:
+            _add_request_upstream_time(elapsed)
+
+def _add_request_upstream_time(seconds):
+    if has_request_context() and 'upstream_seconds' in g:
+        g.upstream_seconds += seconds
+
+def resilient_generate(endpoint, model, contents, policy=None):
+    """
+    Calls model.generate_content under the endpoint's deadline, retry, hedging
+    and circuit breaker policy (see resilience.py).
+    """
+    return resilient_send(
+        endpoint, lambda timeout: model.generate_content(contents, request_options={"timeout": timeout}), policy
+    )
+
+def resilient_send(endpoint, send, policy=None):
+    """
+    Runs ``send(timeout)``, a single Gemini request, under the endpoint's
+    resilience policy. Each attempt is instrumented separately; the request's
+    Server-Timing gets the total including retries.
+    """
+    def attempt(timeout):
+        with upstream_call(endpoint, track_request=False):
+            return send(timeout)
+    
+    started = time.perf_counter()
+    try:
+        return resilient_caller.call(policy or endpoint, attempt)
+    finally:
+        _add_request_upstream_time(time.perf_counter() - started)
+
+def _endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+@api.before_app_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    g.upstream_seconds = 0.0
+    g.endpoint_label = _endpoint_label()
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=g.endpoint_label)
+
+@api.after_app_request
+def _add_timing_headers(response):
+    # Compress first so the size metric records bytes sent
+    response = http_cache.compress(response, request.headers.get('Accept-Encoding'))
+    elapsed = time.perf_counter() - g.request_started
+    g.response_status = response.status_code
+    upstream = g.upstream_seconds
+    response.headers['Server-Timing'] = (
+        f"upstream;dur={upstream * 1000:.1f}, "
+        f"app;dur={max(elapsed - upstream, 0) * 1000:.1f}, "
+        f"total;dur={elapsed * 1000:.1f}"
+    )
+    if not response.is_streamed and response.content_length is not None:
+        metrics.RESPONSE_SIZE.observe(response.content_length, endpoint=g.endpoint_label)
+    return response
+
+@api.teardown_app_request
+def _finish_request_timer(error=None):
+    if 'request_started' not in g:
+        return
+    status = 500 if error is not None else g.get('response_status', 500)
+    metrics.REQUESTS_IN_FLIGHT.dec(endpoint=g.endpoint_label)
+    metrics.REQUEST_LATENCY.observe(
+        time.perf_counter() - g.request_started,
+        endpoint=g.endpoint_label, method=request.method, status=status
+    )
+
+# --- Curated Hidden Gems ---
+gems_catalog = GemsCatalog.load(os.getenv("CURATED_GEMS_PATH", DEFAULT_CATALOG_PATH))
+GEMS_SUPPLEMENT_MODE = os.getenv("GEMS_SUPPLEMENT_MODE", "async").lower()
+_supplement_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gems-supplement")
+_pending_supplements = set()
+_pending_supplements_lock = threading.Lock()
+
+# --- Near-Duplicate Queries ---
+def _canonical_location(location):
+    """ Curated destination key for catalog aliases ("Mt. Abu" -> "mount abu"), else the normalized text. """
+    destination = gems_catalog.resolve(location)
+    return destination.key if destination is not None else normalize_location(location)
+
+near_duplicates = create_near_duplicate_index(location_resolver=_canonical_location)
 
 # --- Integrated Vertex AI Function (Itinerary) ---
+@response_cache.cached("itinerary", _itinerary_cache_params, single_flight=single_flight, near_duplicates=near_duplicates)
 def generate_itinerary_vertexai(location, duration, interests, other_prefs):
     """
     Calls Vertex AI using the google-generativeai library to generate an itinerary.
@@ -154,37 +245,26 @@ def generate_itinerary_vertexai(location, duration, interests, other_prefs):
     logging.info(f"Initiating itinerary generation for: {location}, Duration: {duration}, Interests: {interests}, Prefs: {other_prefs}")
     
     try:
-        # Configure Vertex AI client with API key
-        genai.configure(api_key=VERTEX_API_KEY)
-        
-        # Get Gemini model
-        model = genai.GenerativeModel('gemini-1.5-pro')
+        # Get the shared Gemini model for this endpoint
+        model = model_provider.model_for("itinerary", system_instruction=system_instruction_for("itinerary"))
         
-        # Prepare user prompt - combining system instructions with user prompt since Gemini doesn't support system role
-        user_prompt = f"""{ITINERARY_SYSTEM_INSTRUCTION}
-
-Please create a detailed travel itinerary for:
-Location: {location}
-Duration: {duration} days
-Interests: {interests}
-Additional Preferences: {other_prefs if other_prefs else 'None specified'}
-
-Please provide a day-by-day itinerary with specific recommendations, approximate costs, and local eateries."""
-        
-        # Generate content without system role
-        response = model.generate_content(user_prompt)
+        # System instruction travels with the model; only the request goes in the prompt
+        user_prompt = build_itinerary_prompt(location, duration, interests, other_prefs)
+        response = resilient_generate("itinerary", model, user_prompt)
+        model_provider.record_usage("itinerary", response)
         
         # Process response
         result_text = response.text
         return {"itinerary": result_text}
         
-    except google_exceptions.GoogleAPIError as api_error:
+    except (CircuitOpenError, google_exceptions.GoogleAPIError) as api_error:
         logging.error(f"Vertex AI API error: {str(api_error)}")
         return {"error": f"API Error: {str(api_error)}"}
     except Exception as e:
         logging.error(f"Error generating itinerary: {str(e)}")
         return {"error": f"Error: {str(e)}"}
 
+@response_cache.cached("guide", _guide_cache_params, single_flight=single_flight, near_duplicates=near_duplicates)
 def get_digital_guide_vertexai(location, topic, style="GENERAL"):
     """
     Calls Vertex AI to get digital guide information.
@@ -197,212 +277,415 @@ def get_digital_guide_vertexai(location, topic, style="GENERAL"):
     logging.info(f"Received guide request for: {location}, topic: {topic}, style: {style}")
     
     try:
-        # Configure Vertex AI client with API key
-        genai.configure(api_key=VERTEX_API_KEY)
+        # Get the shared Gemini model for this endpoint
+        model = model_provider.model_for("guide", system_instruction=system_instruction_for("guide"))
         
-        # Get Gemini model
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Prepare user prompt - combining system instructions with user prompt
-        user_prompt = f"""{GUIDE_SYSTEM_INSTRUCTION}
-
-Please create a digital guide for:
-Location: {location}
-Topic: {topic}
-Communication Style: {style}
-
-Provide detailed information about this Indian tourist destination as a knowledgeable local guide would."""
-        
-        # Generate content without system role
-        response = model.generate_content(user_prompt)
+        # System instruction travels with the model; only the request goes in the prompt
+        user_prompt = build_guide_prompt(location, topic, style)
+        response = resilient_generate("guide", model, user_prompt)
+        model_provider.record_usage("guide", response)
         
         # Process response
         result_text = response.text
         return {"guide_info": result_text}
         
-    except google_exceptions.GoogleAPIError as api_error:
+    except (CircuitOpenError, google_exceptions.GoogleAPIError) as api_error:
         logging.error(f"Vertex AI API error: {str(api_error)}")
         return {"error": f"API Error: {str(api_error)}"}
     except Exception as e:
         logging.error(f"Error generating digital guide: {str(e)}")
         return {"error": f"Error: {str(e)}"}
 
-def find_hidden_gems_vertexai(location, preferences):
-    """
-    Calls Vertex AI to find hidden gems.
+def find_hidden_gems_vertexai(location, preferences, bypass_cache=False):
     """
-    logging.info(f"Received hidden gems request for: {location}, preferences: {preferences}")
+    Finds hidden gems, answering curated destinations from the catalog.
     
-    # Check for special case locations
-    location_lower = location.lower().strip()
-    
-    # Special case for Mount Abu
-    if location_lower in ["mt. abu", "mount abu", "mt abu"]:
-        special_gems = """
-# Top Hidden Gems in Mount Abu
-
-1. **Golden Horn**
-   - **Description**: A less-visited peak offering panoramic views of the Aravalli range and surrounding valleys
-   - **Why it's special**: One of the best sunset viewpoints away from crowds with unique rock formations
-   - **Best time to visit**: Early morning or late afternoon for golden hour lighting
-   - **Approximate cost**: Free entry
-   - **How to get there**: 5km from Mount Abu town center, accessible by local taxi or a moderate hike
-   - **Insider tip**: Bring a picnic and stay until dusk to see the valley lights come on
-
-2. **Gautam Rishi Temple**
-   - **Description**: Ancient temple dedicated to Sage Gautam with historical significance
-   - **Why it's special**: Quiet, serene atmosphere with architectural details often missed by tourists
-   - **Best time to visit**: Mornings, especially during sunrise
-   - **Approximate cost**: Free entry (donations appreciated)
-   - **How to get there**: Located 3km from the main market, accessible by auto-rickshaw
-   - **Insider tip**: The local priest can share fascinating stories about the temple's history if asked
-
-3. **Kodra Dam**
-   - **Description**: A small dam surrounded by lush greenery and hills
-   - **Why it's special**: Peaceful picnic spot with opportunities for spotting local birds and wildlife
-   - **Best time to visit**: Monsoon and post-monsoon season when water levels are high
-   - **Approximate cost**: Free entry
-   - **How to get there**: 7km from town center, hire a taxi or auto for the day
-   - **Insider tip**: Visit early morning to catch mist rising from the water and hills
-
-4. **Shalgaon**
-   - **Description**: Quaint village with traditional Rajasthani architecture and lifestyle
-   - **Why it's special**: Authentic glimpse into rural life near Mount Abu, hardly visited by tourists
-   - **Best time to visit**: Year-round, though winter months are most pleasant
-   - **Approximate cost**: Free to explore (budget ₹500 for handicrafts)
-   - **How to get there**: 12km from Mount Abu town, accessible by local bus or taxi
-   - **Insider tip**: Visit the village potter who creates unique Aravalli-inspired designs
-
-5. **Sadka Mata Temple**
-   - **Description**: Ancient temple dedicated to the local deity, nestled in the forest
-   - **Why it's special**: Blends tribal and traditional Hindu architecture with unique rituals
-   - **Best time to visit**: Any day except during local festivals when it gets crowded
-   - **Approximate cost**: Free entry
-   - **How to get there**: 9km from the bus stand, accessible by taxi or auto-rickshaw
-   - **Insider tip**: Thursday is when locals perform special pujas, which is interesting to witness
-
-"""
-        # Get additional gems from the API to supplement our special recommendations
-        try:
-            genai.configure(api_key=VERTEX_API_KEY)
-            model = genai.GenerativeModel('gemini-1.5-pro')
-            
-            # Ask for additional gems beyond our prioritized ones
-            user_prompt = f"""Find 2-3 more hidden gems in Mount Abu besides these already known ones:
-- Golden Horn
-- Gautam Rishi Temple
-- Kodra Dam
-- Shalgaon
-- Sadka Mata Temple
-
-Please only include truly lesser-known attractions that would interest a traveler looking for authentic experiences.
-Format each gem with: name, brief description, why it's special, best time to visit, cost, how to get there, and one insider tip."""
-            
-            response = model.generate_content(user_prompt)
-            additional_gems = response.text
-            
-            # Combine special gems with additional recommendations
-            full_response = special_gems + "\n## Additional Hidden Gems\n\n" + additional_gems
-            return {"gems": full_response}
-            
-        except Exception as e:
-            logging.error(f"Error getting additional gems for Mount Abu: {str(e)}")
-            # Fall back to just our special recommendations if API call fails
-            return {"gems": special_gems}
-    
-    # Special case for Goa
-    elif location_lower == "goa":
-        special_gems = """
-# Top Hidden Gems in Goa
-
-1. **Dona Paula**
-   - **Description**: A former fishing village with a romantic legend, beautiful viewpoint, and water sports
-   - **Why it's special**: Less crowded than major beaches, with panoramic views of the Arabian Sea and Mormugao Harbor
-   - **Best time to visit**: October to March, ideally during sunset
-   - **Approximate cost**: Free entry (water sports: ₹600-1500)
-   - **How to get there**: 7km from Panjim, accessible by local bus, taxi, or rented scooter
-   - **Insider tip**: Visit the small cove below the viewpoint for a secluded beach experience few tourists know about
-
-2. **Davar Island**
-   - **Description**: Small uninhabited island accessible by boat from Chapora
-   - **Why it's special**: Pristine beaches with no facilities and very few visitors - a true hidden gem
-   - **Best time to visit**: November to February, during low tide
-   - **Approximate cost**: ₹800-1200 for boat transport (negotiable for groups)
-   - **How to get there**: Hire a fishing boat from Chapora fishing jetty
-   - **Insider tip**: Pack a picnic, plenty of water, and ask your boatman to pick you up before high tide returns
-
-3. **Majorda Beach**
-   - **Description**: Long stretch of golden sand lined with coconut groves without the crowds
-   - **Why it's special**: Local baking tradition - said to be where Jesuits introduced European-style baking to Goa
-   - **Best time to visit**: October to March, early mornings for local bakery visits
-   - **Approximate cost**: Free (budget ₹300-500 for local bakery treats)
-   - **How to get there**: Located in South Goa, accessible by train (Majorda has its own station) or taxi
-   - **Insider tip**: Try the sweet Goan bread called 'poi' from local bakeries in Majorda village, particularly Jila Bakery
-
-"""
-        # Get additional gems from the API to supplement our special recommendations
-        try:
-            genai.configure(api_key=VERTEX_API_KEY)
-            model = genai.GenerativeModel('gemini-1.5-pro')
-            
-            # Ask for additional gems beyond our prioritized ones
-            user_prompt = f"""Find 3-4 more hidden gems in Goa besides these already known ones:
-- Dona Paula
-- Davar Island
-- Majorda Beach
-
-Focus on truly lesser-known beaches, villages, or cultural experiences that most tourists miss.
-Format each gem with: name, brief description, why it's special, best time to visit, cost, how to get there, and one insider tip."""
-            
-            response = model.generate_content(user_prompt)
-            additional_gems = response.text
-            
-            # Combine special gems with additional recommendations
-            full_response = special_gems + "\n## Additional Hidden Gems\n\n" + additional_gems
-            return {"gems": full_response}
-            
-        except Exception as e:
-            logging.error(f"Error getting additional gems for Goa: {str(e)}")
-            # Fall back to just our special recommendations if API call fails
-            return {"gems": special_gems}
+    Curated gems are returned immediately. Depending on GEMS_SUPPLEMENT_MODE the
+    extra Gemini recommendations are fetched in the background and appended once
+    cached ("async"), fetched inline ("sync"), or skipped ("off").
+    """
+    destination = gems_catalog.resolve(location)
+    if destination is None:
+        return _generate_hidden_gems_vertexai(location, preferences, bypass_cache=bypass_cache)
     
-    # Regular case for all other locations
+    logging.info(f"Serving curated hidden gems for: {destination.name}")
+    if GEMS_SUPPLEMENT_MODE == "sync":
+        supplement = _generate_gems_supplement(destination.key, bypass_cache=bypass_cache)
+    elif GEMS_SUPPLEMENT_MODE == "async":
+        supplement = response_cache.peek(make_cache_key("gems_supplement", **_supplement_cache_params(destination.key)))
+        if supplement is None or bypass_cache:
+            _schedule_gems_supplement(destination.key, bypass_cache)
+    else:
+        supplement = None
+    return _curated_gems_result(destination, supplement)
+
+GEMS_SUPPLEMENT_HEADING = "\n## Additional Hidden Gems\n\n"
+
+def _curated_gems_result(destination, supplement=None):
+    """ Curated gems for a destination, followed by Gemini's extra gems when available. """
+    if supplement and "gems" in supplement:
+        return {"gems": destination.markdown + GEMS_SUPPLEMENT_HEADING + supplement["gems"]}
+    return {"gems": destination.markdown}
+
+def _gems_result_check(location):
+    """
+    For _cached_get_response: None when every gems answer for ``location`` is
+    final, else a check that a curated answer already includes Gemini's extra gems.
+    """
+    if GEMS_SUPPLEMENT_MODE == "off" or gems_catalog.resolve(location) is None:
+        return None
+    return lambda result: GEMS_SUPPLEMENT_HEADING in result["gems"]
+
+def _supplement_cache_params(destination_key):
+    return {"destination": destination_key}
+
+@response_cache.cached("gems_supplement", _supplement_cache_params, single_flight=single_flight)
+def _generate_gems_supplement(destination_key):
+    """
+    Calls Vertex AI for extra gems beyond a curated destination's own list.
+    """
+    destination = gems_catalog.resolve(destination_key)
     try:
-        # Configure Vertex AI client with API key
-        genai.configure(api_key=VERTEX_API_KEY)
-        
-        # Get Gemini model
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Prepare user prompt - combining system instructions with user prompt
-        user_prompt = f"""{GEMS_SYSTEM_INSTRUCTION}
+        model = model_provider.model_for("gems")
+        response = resilient_generate("gems_supplement", model, destination.supplement_prompt(), policy="gems")
+        model_provider.record_usage("gems", response)
+        return {"gems": response.text}
+    except Exception as e:
+        logging.error(f"Error getting additional gems for {destination.name}: {str(e)}")
+        return {"error": f"Error: {str(e)}"}
 
-Please find hidden gems for:
-Location: {location}
-Preferences: {preferences if preferences else 'Any authentic local experiences'}
+def _schedule_gems_supplement(destination_key, bypass_cache=False):
+    """ Starts a background supplement fetch unless one is already running. """
+    with _pending_supplements_lock:
+        if destination_key in _pending_supplements:
+            return
+        _pending_supplements.add(destination_key)
+    
+    def fetch():
+        try:
+            _generate_gems_supplement(destination_key, bypass_cache=bypass_cache)
+        finally:
+            with _pending_supplements_lock:
+                _pending_supplements.discard(destination_key)
+    
+    _supplement_executor.submit(fetch)
 
-Provide 5-7 lesser-known attractions or experiences."""
+@response_cache.cached("gems", _gems_cache_params, single_flight=single_flight, near_duplicates=near_duplicates)
+def _generate_hidden_gems_vertexai(location, preferences):
+    """
+    Calls Vertex AI to find hidden gems.
+    """
+    logging.info(f"Received hidden gems request for: {location}, preferences: {preferences}")
+    
+    try:
+        # Get the shared Gemini model for this endpoint
+        model = model_provider.model_for("gems", system_instruction=system_instruction_for("gems"))
         
-        # Generate content without system role
-        response = model.generate_content(user_prompt)
+        # System instruction travels with the model; only the request goes in the prompt
+        user_prompt = build_gems_prompt(location, preferences)
+        response = resilient_generate("gems", model, user_prompt)
+        model_provider.record_usage("gems", response)
         
         # Process response
         result_text = response.text
         return {"gems": result_text}
         
-    except google_exceptions.GoogleAPIError as api_error:
+    except (CircuitOpenError, google_exceptions.GoogleAPIError) as api_error:
         logging.error(f"Vertex AI API error: {str(api_error)}")
         return {"error": f"API Error: {str(api_error)}"}
     except Exception as e:
         logging.error(f"Error finding hidden gems: {str(e)}")
         return {"error": f"Error: {str(e)}"}
 
+# --- Streaming (Server-Sent Events) ---
+def stream_generation_vertexai(kind, result_field, user_prompt, cache_key=None, bypass_cache=False, on_complete=None):
+    """
+    Streams a Gemini generation as Server-Sent Events (see serving.GenerationStream).
+
+    ``on_complete`` receives the full text of a successful stream and returns extra metadata.
+    """
+    stream = GenerationStream(kind, result_field, response_cache, resilient_caller.breaker(kind), cache_key, bypass_cache)
+    try:
+        event = stream.cached_event()
+        if event is not None:
+            yield event
+        else:
+            try:
+                stream.admit()
+                model = model_provider.model_for(kind, system_instruction=system_instruction_for(kind))
+                timeout = resilient_caller.policies[kind].deadline
+                with upstream_call(f"{kind}_stream"):
+                    response = model.generate_content(user_prompt, stream=True, request_options={"timeout": timeout})
+                    for chunk in response:
+                        event = stream.chunk_event(chunk.text)
+                        if event is not None:
+                            yield event
+                model_provider.record_usage(kind, response)
+                stream.succeed()
+            except Exception as e:
+                stream.fail(e)
+            event = stream.stale_event()
+            if event is not None:
+                yield event
+        if on_complete is not None and stream.ok:
+            stream.metadata.update(on_complete(stream.text))
+        yield stream.done_event()
+    finally:
+        # Also runs when the client disconnects and the server closes the generator mid-stream
+        stream.close()
+
+def _streaming_requested():
+    """ True when the caller opted into SSE via ?stream=1 or Accept: text/event-stream. """
+    return streaming_requested(request.args, request.headers)
+
+def _sse_response(events):
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# --- Batch Lookups ---
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+VALID_GUIDE_STYLES = ['GENERAL', 'FUNNY', 'BASIC']
+
+def _run_batch_item(item, bypass_cache=False, charge=None):
+    """
+    Runs one guide/gems sub-request of a batch.
+
+    Returns (status_code, body) using the same validation and result shape as
+    the corresponding single endpoint. ``charge``, when given, is called with
+    the item's endpoint before any work and raises Rejected once the client's
+    rate limit for that endpoint is used up.
+    """
+    if not isinstance(item, dict):
+        return 400, {"error": "Each batch item must be an object"}
+    
+    item_type = item.get('type')
+    location = item.get('location')
+    if item_type == 'guide':
+        topic = item.get('topic')
+        if not location or not topic:
+            return 400, {"error": "Missing required parameters: location, topic"}
+        style = str(item.get('style', 'GENERAL')).upper()
+        if style not in VALID_GUIDE_STYLES:
+            style = 'GENERAL'
+        run = lambda: get_digital_guide_vertexai(location, topic, style, bypass_cache=bypass_cache)
+    elif item_type == 'gems':
+        if not location:
+            return 400, {"error": "Missing required parameter: location"}
+        run = lambda: find_hidden_gems_vertexai(location, item.get('preferences', ''), bypass_cache=bypass_cache)
+    else:
+        return 400, {"error": "Unsupported type, expected 'guide' or 'gems'"}
+    
+    if charge is not None:
+        try:
+            charge(item_type)
+        except Rejected as rejected:
+            return rejected.status, {"error": rejected.message, "retry_after": rejected.retry_after}
+    
+    result = run()
+    if 'error' in result:
+        return 500, result
+    return 200, result
+
+# --- Structured Itineraries ---
+itinerary_store = create_itinerary_store()
+
+def _store_itinerary(params, itinerary_text):
+    """
+    Stores a generated itinerary for later day edits; returns {"itinerary_id": ...} or {} on failure.
+    
+    Repeated requests answered from the response cache get the stored id back
+    until someone edits that itinerary.
+    """
+    try:
+        cache_key = make_cache_key("itinerary", **_itinerary_cache_params(**params))
+        return {"itinerary_id": itinerary_store.create(params, Itinerary.parse(itinerary_text), cache_key=cache_key)}
+    except Exception as e:
+        logging.error(f"Error storing itinerary: {str(e)}")
+        return {}
+
+def _run_itinerary_job(location, duration, interests, other_prefs):
+    result = generate_itinerary_vertexai(location, duration, interests, other_prefs)
+    if 'error' in result:
+        return result
+    params = {"location": location, "duration": duration, "interests": interests, "other_prefs": other_prefs}
+    return dict(result, **_store_itinerary(params, result["itinerary"]))
+
+def regenerate_itinerary_days_vertexai(record, start_day, end_day, changes=""):
+    """
+    Regenerates days ``start_day`` to ``end_day`` of a stored itinerary and merges them back.
+    
+    Only the trip details, a one-line outline of the other days and the days
+    being replaced are sent to Gemini, so the cost scales with the days edited
+    rather than the trip length.
+    
+    Args:
+        record: Stored itinerary from itinerary_store.get()
+        start_day: First day number to regenerate
+        end_day: Last day number to regenerate
+        changes: What the traveller wants changed (optional)
+    """
+    itinerary = record["itinerary"]
+    old_days = itinerary.days_in_range(start_day, end_day)
+    logging.info(f"Regenerating days {start_day}-{end_day} of itinerary {record['id']}")
+    
+    try:
+        model = model_provider.model_for("itinerary", system_instruction=system_instruction_for("itinerary_days"))
+        user_prompt = build_itinerary_days_prompt(
+            record["params"], itinerary.outline(), "".join(day.markdown for day in old_days), changes
+        )
+        response = resilient_generate("itinerary_days", model, user_prompt)
+        model_provider.record_usage("itinerary_days", response)
+        
+        expected = [day.number for day in old_days]
+        new_days = [day for day in Itinerary.parse(response.text).days if day.number in expected]
+        if sorted(day.number for day in new_days) != expected:
+            logging.error(f"Regenerated text for itinerary {record['id']} did not contain days {expected}")
+            return {"error": "Error: Generated text did not contain the requested days"}
+        
+        updated = itinerary.replace_days(new_days)
+        version = itinerary_store.update(record["id"], updated, record["version"], days_changed=len(new_days))
+        return {
+            "itinerary_id": record["id"],
+            "version": version,
+            "itinerary": updated.markdown,
+            "days": [day.to_dict() for day in updated.days_in_range(start_day, end_day)],
+        }
+        
+    except VersionConflictError:
+        raise
+    except (CircuitOpenError, google_exceptions.GoogleAPIError) as api_error:
+        logging.error(f"Vertex AI API error: {str(api_error)}")
+        return {"error": f"API Error: {str(api_error)}"}
+    except Exception as e:
+        logging.error(f"Error regenerating itinerary days: {str(e)}")
+        return {"error": f"Error: {str(e)}"}
+
+# --- Guide Sessions ---
+guide_sessions = create_guide_session_store()
+
+def _guide_session_contents(session, topic):
+    """ Returns (history, message) for the next turn; the opening rides on the first kept turn. """
+    opening = build_guide_session_opening(session.location, session.style, session.dropped_topics)
+    history = []
+    for past_topic, answer in session.turns:
+        text = f"Topic: {past_topic}" if history else f"{opening}\n\nTopic: {past_topic}"
+        history.append({"role": "user", "parts": [text]})
+        history.append({"role": "model", "parts": [answer]})
+    message = f"Topic: {topic}" if history else f"{opening}\n\nTopic: {topic}"
+    return history, message
+
+def ask_guide_session_vertexai(session, topic):
+    """
+    Answers a topic within a guide session, sending the session's chat history
+    rather than a fresh single-shot prompt.
+    
+    Args:
+        session: GuideSession from guide_sessions
+        topic: The specific topic or aspect of interest
+    """
+    logging.info(f"Guide session {session.id} ({session.location}, {session.style}): {topic}")
+    
+    # Turns of one session run one at a time so the history stays in order
+    with session.lock:
+        try:
+            # Another worker may have answered a turn of this session since it was read
+            guide_sessions.reload(session)
+            model = model_provider.model_for("guide", system_instruction=system_instruction_for("guide"))
+            history, message = _guide_session_contents(session, topic)
+            
+            def send(timeout):
+                chat = model.start_chat(history=history)
+                return chat.send_message(message, request_options={"timeout": timeout})
+            
+            response = resilient_send("guide_session", send, policy="guide")
+            model_provider.record_usage("guide_session", response)
+            
+            result_text = response.text
+            guide_sessions.record_turn(session, topic, result_text)
+            return {"guide_info": result_text}
+            
+        except (CircuitOpenError, google_exceptions.GoogleAPIError) as api_error:
+            logging.error(f"Vertex AI API error: {str(api_error)}")
+            return {"error": f"API Error: {str(api_error)}"}
+        except Exception as e:
+            logging.error(f"Error in guide session: {str(e)}")
+            return {"error": f"Error: {str(e)}"}
+
+# --- Async Jobs ---
+job_queue = create_job_queue({"itinerary": _run_itinerary_job})
+
+# --- Metrics Collectors ---
+metrics.registry.register_collector(
+    "travel_app_response_cache", "Response cache counters and sizes.",
+    lambda: [({"stat": name}, value) for name, value in response_cache.stats().items() if not isinstance(value, bool)]
+)
+if near_duplicates is not None:
+    metrics.registry.register_collector(
+        "travel_app_near_duplicates", "Near-duplicate query lookups, extra cache hits and index size.",
+        lambda: [({"stat": name}, value) for name, value in near_duplicates.stats().items()]
+    )
+metrics.registry.register_collector(
+    "travel_app_single_flight", "Request coalescing counters.",
+    lambda: [({"stat": name}, value) for name, value in single_flight.stats().items() if not isinstance(value, bool)]
+)
+metrics.registry.register_collector(
+    "travel_app_itinerary_jobs", "Itinerary job queue counters, depth and latency.",
+    lambda: [({"stat": name}, value) for name, value in job_queue.stats().items()]
+)
+metrics.registry.register_collector(
+    "travel_app_itineraries", "Stored itineraries and day regeneration counters.",
+    lambda: [({"stat": name}, value) for name, value in itinerary_store.stats().items()]
+)
+metrics.registry.register_collector(
+    "travel_app_guide_sessions", "Guide session counts, evictions and approximate memory use.",
+    lambda: [({"stat": name}, value) for name, value in guide_sessions.stats().items()]
+)
+metrics.registry.register_collector(
+    "travel_app_http_cache", "Conditional GET, background revalidation and compression counters.",
+    lambda: [({"stat": name}, value) for name, value in http_cache.stats().items() if not isinstance(value, bool)]
+)
+metrics.registry.register_collector(
+    "travel_app_upstream_resilience", "Retry, hedging and failure counters per endpoint.",
+    lambda: [
+        ({"endpoint": endpoint, "stat": name}, value)
+        for endpoint, stats in resilient_caller.stats().items()
+        for name, value in stats.items() if name != "breaker"
+    ]
+)
+metrics.registry.register_collector(
+    "travel_app_circuit_breaker_open", "1 while an endpoint's circuit breaker is open or half-open.",
+    lambda: [
+        ({"endpoint": endpoint}, 0 if stats["breaker"]["state"] == "closed" else 1)
+        for endpoint, stats in resilient_caller.stats().items() if "breaker" in stats
+    ]
+)
+metrics.registry.register_collector(
+    "travel_app_admission", "Admission control counters, in-flight and queued requests.",
+    lambda: [
+        ({"endpoint": endpoint, "stat": name}, value)
+        for endpoint, stats in admission.stats().items()
+        for name, value in stats.items()
+    ]
+)
+metrics.registry.register_collector(
+    "travel_app_gemini_tokens", "Gemini token usage per endpoint.",
+    lambda: [
+        ({"endpoint": endpoint, "stat": name}, value)
+        for endpoint, totals in model_provider.usage_stats().items()
+        for name, value in totals.items()
+    ]
+)
+
 # --- API Routes ---
-@app.route('/')
+@api.route('/')
 def index():
     return jsonify({"message": "Welcome to the Travel App API!"})
 
-@app.route('/api/itinerary', methods=['POST'])
+@api.route('/api/itinerary', methods=['POST'])
+@admission.limit("itinerary")
 def create_itinerary():
     """ API endpoint to generate a travel itinerary. """
     try:
@@ -415,18 +698,159 @@ def create_itinerary():
         duration = data['duration']
         interests = data['interests']
         other_prefs = data.get('other_prefs', '')
+        params = {"location": location, "duration": duration, "interests": interests, "other_prefs": other_prefs}
         
-        result = generate_itinerary_vertexai(location, duration, interests, other_prefs)
+        if _streaming_requested():
+            cache_key = make_cache_key(
+                "itinerary", **_itinerary_cache_params(location, duration, interests, other_prefs)
+            )
+            return _sse_response(stream_generation_vertexai(
+                "itinerary", "itinerary",
+                build_itinerary_prompt(location, duration, interests, other_prefs),
+                cache_key=cache_key, bypass_cache=_cache_bypass_requested(data),
+                on_complete=lambda text: _store_itinerary(params, text)
+            ))
+        
+        result = generate_itinerary_vertexai(
+            location, duration, interests, other_prefs,
+            bypass_cache=_cache_bypass_requested(data)
+        )
         
         if 'error' in result:
             return jsonify(result), 500
-        return jsonify(result)
+        return jsonify(dict(result, **_store_itinerary(params, result["itinerary"])))
     
     except Exception as e:
         logging.error(f"Error in create_itinerary: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-@app.route('/api/guide', methods=['GET'])
+@api.route('/api/itinerary/stats', methods=['GET'])
+def get_itinerary_stats():
+    """ API endpoint exposing stored itinerary and day regeneration counters. """
+    return jsonify(itinerary_store.stats())
+
+@api.route('/api/itinerary/<itinerary_id>', methods=['GET'])
+def get_stored_itinerary(itinerary_id):
+    """ API endpoint returning a stored itinerary with its structured days. """
+    record = itinerary_store.get(itinerary_id)
+    if record is None:
+        return jsonify({"error": "Itinerary not found or expired"}), 404
+    
+    body = {
+        "itinerary_id": record["id"],
+        "version": record["version"],
+        "params": record["params"],
+        "created_at": record["created_at"],
+        "updated_at": record["updated_at"],
+    }
+    body.update(record["itinerary"].to_dict())
+    return jsonify(body)
+
+def _day_number(value):
+    """ Day number from a JSON field; accepts integers and digit strings, raises ValueError for anything else (bools, 2.7, "2.0"). """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Invalid day: {value!r}")
+    if isinstance(value, str) and not value.strip().isdigit():
+        raise ValueError(f"Invalid day: {value!r}")
+    return int(value)
+
+@api.route('/api/itinerary/<itinerary_id>/days', methods=['POST'])
+@admission.limit("itinerary_days")
+def regenerate_itinerary_days(itinerary_id):
+    """
+    API endpoint to regenerate one day ({"day": 3}) or a range of days
+    ({"start_day": 3, "end_day": 4}) of a stored itinerary. An optional
+    "changes" field describes what the traveller wants different.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            start_day = _day_number(data.get('start_day', data.get('day')))
+            end_day = _day_number(data.get('end_day', start_day))
+        except ValueError:
+            return jsonify({"error": "Missing or invalid field: day, or start_day and end_day"}), 400
+        
+        record = itinerary_store.get(itinerary_id)
+        if record is None:
+            return jsonify({"error": "Itinerary not found or expired"}), 404
+        
+        day_numbers = record["itinerary"].day_numbers()
+        if start_day > end_day or start_day not in day_numbers or end_day not in day_numbers:
+            return jsonify({"error": f"Days must be within the itinerary's days: {day_numbers}"}), 400
+        
+        result = regenerate_itinerary_days_vertexai(record, start_day, end_day, data.get('changes', ''))
+        
+        if 'error' in result:
+            return jsonify(result), 500
+        return jsonify(result)
+    
+    except VersionConflictError as conflict:
+        logging.warning(str(conflict))
+        return jsonify({"error": "Itinerary was changed by another request, please retry"}), 409
+    except Exception as e:
+        logging.error(f"Error in regenerate_itinerary_days: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@api.route('/api/itinerary/jobs', methods=['POST'])
+@admission.limit("itinerary")
+def create_itinerary_job():
+    """ API endpoint to queue itinerary generation and return a job id immediately. """
+    try:
+        data = request.get_json()
+        if not data or 'location' not in data or 'duration' not in data or 'interests' not in data:
+            logging.warning("Itinerary job request missing required fields.")
+            return jsonify({"error": "Missing required fields: location, duration, interests"}), 400
+        
+        params = {
+            "location": data['location'],
+            "duration": data['duration'],
+            "interests": data['interests'],
+            "other_prefs": data.get('other_prefs', ''),
+        }
+        job_id = job_queue.submit("itinerary", params)
+        
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/itinerary/jobs/{job_id}",
+        }), 202
+    
+    except QueueFullError:
+        logging.warning("Itinerary job rejected: queue is full.")
+        response = jsonify({"error": "Too many pending itinerary jobs, please retry later"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        logging.error(f"Error in create_itinerary_job: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@api.route('/api/itinerary/jobs/stats', methods=['GET'])
+def get_itinerary_job_stats():
+    """ API endpoint exposing job queue depth and latency. """
+    return jsonify(job_queue.stats())
+
+@api.route('/api/itinerary/jobs/<job_id>', methods=['GET'])
+def get_itinerary_job(job_id):
+    """ API endpoint to poll an itinerary job for status and result. """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    
+    body = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["result"]:
+        body.update(job["result"])
+    if job["error"]:
+        body["error"] = job["error"]
+    return jsonify(body)
+
+@api.route('/api/guide', methods=['GET'])
+@admission.limit("guide")
 def get_guide():
     """ API endpoint to get digital guide info. """
     try:
@@ -438,21 +862,91 @@ def get_guide():
             return jsonify({"error": "Missing required parameters: location, topic"}), 400
         
         # Validate style parameter
-        valid_styles = ['GENERAL', 'FUNNY', 'BASIC']
-        if style.upper() not in valid_styles:
+        if style.upper() not in VALID_GUIDE_STYLES:
             style = 'GENERAL'  # Default to GENERAL if invalid style
         
-        result = get_digital_guide_vertexai(location, topic, style.upper())
+        cache_key = make_cache_key("guide", **_guide_cache_params(location, topic, style.upper()))
+        if _streaming_requested():
+            return _sse_response(stream_generation_vertexai(
+                "guide", "guide_info",
+                build_guide_prompt(location, topic, style.upper()),
+                cache_key=cache_key, bypass_cache=_cache_bypass_requested()
+            ))
         
-        if 'error' in result:
-            return jsonify(result), 500
-        return jsonify(result)
+        return _cached_get_response("guide", cache_key, lambda bypass_cache: get_digital_guide_vertexai(
+            location, topic, style.upper(), bypass_cache=bypass_cache
+        ))
         
     except Exception as e:
         logging.error(f"Error in get_guide: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-@app.route('/api/gems', methods=['GET'])
+@api.route('/api/guide/sessions', methods=['POST'])
+def create_guide_session():
+    """ API endpoint to start a guide conversation for a location and style. """
+    try:
+        data = request.get_json(silent=True) or {}
+        location = data.get('location')
+        if not location:
+            return jsonify({"error": "Missing required field: location"}), 400
+        
+        style = str(data.get('style', 'GENERAL')).upper()
+        if style not in VALID_GUIDE_STYLES:
+            style = 'GENERAL'
+        
+        session = guide_sessions.create(location, style)
+        return jsonify(dict(session.to_dict(), messages_url=f"/api/guide/sessions/{session.id}/messages")), 201
+    
+    except Exception as e:
+        logging.error(f"Error in create_guide_session: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@api.route('/api/guide/sessions/stats', methods=['GET'])
+def get_guide_session_stats():
+    """ API endpoint exposing guide session counts, evictions and memory use. """
+    return jsonify(guide_sessions.stats())
+
+@api.route('/api/guide/sessions/<session_id>', methods=['GET'])
+def get_guide_session(session_id):
+    """ API endpoint returning a guide session's location, style and topics so far. """
+    session = guide_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Guide session not found or expired"}), 404
+    return jsonify(session.to_dict())
+
+@api.route('/api/guide/sessions/<session_id>', methods=['DELETE'])
+def delete_guide_session(session_id):
+    """ API endpoint to end a guide session and free its history. """
+    if not guide_sessions.delete(session_id):
+        return jsonify({"error": "Guide session not found or expired"}), 404
+    return '', 204
+
+@api.route('/api/guide/sessions/<session_id>/messages', methods=['POST'])
+@admission.limit("guide")
+def post_guide_session_message(session_id):
+    """ API endpoint to ask a follow-up topic within a guide session. """
+    try:
+        data = request.get_json(silent=True) or {}
+        topic = data.get('topic')
+        if not topic:
+            return jsonify({"error": "Missing required field: topic"}), 400
+        
+        session = guide_sessions.get(session_id)
+        if session is None:
+            return jsonify({"error": "Guide session not found or expired"}), 404
+        
+        result = ask_guide_session_vertexai(session, topic)
+        
+        if 'error' in result:
+            return jsonify(result), 500
+        return jsonify(dict(result, session_id=session.id, turns=session.to_dict()["turns"]))
+    
+    except Exception as e:
+        logging.error(f"Error in post_guide_session_message: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@api.route('/api/gems', methods=['GET'])
+@admission.limit("gems")
 def get_gems():
     """ API endpoint to find hidden gems. """
     try:
@@ -462,16 +956,173 @@ def get_gems():
         if not location:
             return jsonify({"error": "Missing required parameter: location"}), 400
         
-        result = find_hidden_gems_vertexai(location, preferences)
-        
-        if 'error' in result:
-            return jsonify(result), 500
-        return jsonify(result)
+        # Curated answers come from the catalog, so only generated gems are revalidated in the background
+        cache_key = None
+        if gems_catalog.resolve(location) is None:
+            cache_key = make_cache_key("gems", **_gems_cache_params(location, preferences))
+        return _cached_get_response("gems", cache_key, lambda bypass_cache: find_hidden_gems_vertexai(
+            location, preferences, bypass_cache=bypass_cache
+        ), complete=_gems_result_check(location))
         
     except Exception as e:
         logging.error(f"Error in get_gems: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@api.route('/api/batch', methods=['POST'])
+@admission.limit("batch")
+def run_batch():
+    """ API endpoint to run several guide/gems lookups concurrently. """
+    try:
+        data = request.get_json()
+        items = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Missing required field: requests (non-empty list)"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Too many batch requests (maximum {BATCH_MAX_ITEMS})"}), 400
+        
+        try:
+            concurrency = int(data.get('concurrency', BATCH_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = BATCH_CONCURRENCY
+        concurrency = max(1, min(concurrency, BATCH_CONCURRENCY, len(items)))
+        bypass_cache = _cache_bypass_requested(data)
+        
+        # Each item costs a token from the client's bucket for its own endpoint
+        charge = None
+        if admission.enabled:
+            client_key = admission.client_key()
+            charge = lambda endpoint: admission.check_rate(endpoint, client_key)
+        
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+            futures = {
+                executor.submit(_run_batch_item, item, bypass_cache, charge): index
+                for index, item in enumerate(items)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    status, body = future.result()
+                except Exception as e:
+                    logging.error(f"Error in batch item {index}: {str(e)}")
+                    status, body = 500, {"error": f"Server error: {str(e)}"}
+                item_type = items[index].get('type') if isinstance(items[index], dict) else None
+                results[index] = {"index": index, "type": item_type, "status": status, **body}
+        
+        succeeded = sum(1 for result in results if result["status"] == 200)
+        return jsonify({
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+        })
+    
+    except Exception as e:
+        logging.error(f"Error in run_batch: {str(e)}")
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@api.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """ API endpoint exposing response cache hit/miss counters. """
+    return jsonify(response_cache.stats())
+
+@api.route('/api/cache/near-duplicates/stats', methods=['GET'])
+def get_near_duplicate_stats():
+    """ API endpoint exposing near-duplicate lookups, extra hits and index size. """
+    if near_duplicates is None:
+        return jsonify({"enabled": False})
+    return jsonify(near_duplicates.stats())
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Prometheus text exposition of request, upstream, cache and job metrics. """
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/httpcache/stats', methods=['GET'])
+def get_http_cache_stats():
+    """ API endpoint exposing conditional GET, revalidation and compression counters. """
+    return jsonify(http_cache.stats())
+
+@api.route('/api/usage/stats', methods=['GET'])
+def get_usage_stats():
+    """ API endpoint exposing Gemini token usage per endpoint. """
+    return jsonify(model_provider.usage_stats())
+
+@api.route('/api/admission/stats', methods=['GET'])
+def get_admission_stats():
+    """ API endpoint exposing admitted, rate-limited and shed request counts. """
+    return jsonify(admission.stats())
+
+@api.route('/api/resilience/stats', methods=['GET'])
+def get_resilience_stats():
+    """ API endpoint exposing retry, hedging and circuit breaker state per endpoint. """
+    return jsonify(resilient_caller.stats())
+
+@api.route('/api/singleflight/stats', methods=['GET'])
+def get_single_flight_stats():
+    """ API endpoint exposing request coalescing counters. """
+    return jsonify(single_flight.stats())
+
+# --- App Factory ---
+def warmup():
+    """
+    Imports the Google client libraries and builds the shared Gemini models so
+    the first real request does not pay for them. Called from the gunicorn
+    post_worker_init hook (see gunicorn.conf.py); safe to call more than once.
+    """
+    started = time.perf_counter()
+    google_exceptions.load()
+    for endpoint in ("itinerary", "guide", "gems"):
+        model_provider.model_for(endpoint, system_instruction=system_instruction_for(endpoint))
+    model_provider.model_for("itinerary", system_instruction=system_instruction_for("itinerary_days"))
+    model_provider.model_for("gems")
+    logging.info(f"Warmup finished in {time.perf_counter() - started:.2f}s")
+
+def create_app(config=None):
+    """
+    Builds the Flask application.
+
+    Shared state (caches, job queue, admission limits, metrics) lives at module
+    level and is created once per process; each app gets the API blueprint,
+    CORS and request instrumentation.
+
+    Args:
+        config: Optional mapping applied to app.config
+    """
+    # No-op when a server (e.g. gunicorn) or the caller already set up logging
+    logging.basicConfig(level=logging.INFO)
+    
+    # Check for required environment variables
+    if not VERTEX_PROJECT or not VERTEX_LOCATION:
+        logging.warning("VERTEX_AI_PROJECT or VERTEX_AI_LOCATION environment variables not set.")
+    if not VERTEX_API_KEY:
+        logging.warning("GOOGLE_MAPS_API_KEY environment variable not set - required for Gemini API access.")
+    
+    flask_app = Flask(__name__)
+    if config:
+        flask_app.config.update(config)
+    CORS(flask_app)
+    flask_app.register_blueprint(api)
+    return flask_app
+
+# Module-level app for `python app.py`, `flask run` and existing imports
+app = create_app()
+
 # --- Run the App ---
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == 'warm':
+        sys.exit(warm.main(
+            sys.argv[2:],
+            response_cache,
+            {
+                "guide": (get_digital_guide_vertexai, _guide_cache_params),
+                "gems": (_generate_hidden_gems_vertexai, _gems_cache_params),
+            },
+            VALID_GUIDE_STYLES,
+            skip_gems_for=lambda location: gems_catalog.resolve(location) is not None,
+        ))
+    # Development server only; run production traffic with: gunicorn -c gunicorn.conf.py
+    debug = os.getenv("FLASK_DEBUG", "1").lower() in ("1", "true", "yes")
+    # With the debug reloader only the child process serves requests
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_queue.recover()
+    app.run(debug=debug, host='0.0.0.0', port=int(os.getenv("PORT", "5000"))) 
\ No newline at end of file
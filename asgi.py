@@ -0,0 +1,468 @@
+"""
+Asyncio serving mode for the generation endpoints.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+Serves /api/itinerary, /api/guide and /api/gems with the same request and
+response contracts as the Flask app, including streaming, ETags and
+admission rate limits. Gemini is called with generate_content_async under a
+bounded upstream pool (upstream_pool.py), so an open request costs a
+coroutine instead of an OS thread while it waits.
+
+Models, prompts, the response cache, the near-duplicate index, resilience
+policies and circuit breakers come from app.py, so both modes share one copy
+of that state and the same generation code; the Flask app remains the
+complete API (itinerary edits, jobs, guide sessions, batch).
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as travel_app
+import metrics
+from admission import Rejected
+from cache import make_cache_key
+from http_cache import encoded_etag
+from prompts import build_gems_prompt, build_guide_prompt, build_itinerary_prompt, system_instruction_for
+from resilience import CircuitOpenError, google_exceptions
+from serving import GenerationStream, cache_bypass_requested, revalidatable_value, streaming_requested
+from singleflight import AsyncSingleFlight
+from upstream_pool import UpstreamBusyError, create_upstream_pool
+
+# --- Shared State (app.py) ---
+model_provider = travel_app.model_provider
+response_cache = travel_app.response_cache
+resilient_caller = travel_app.resilient_caller
+near_duplicates = travel_app.near_duplicates
+gems_catalog = travel_app.gems_catalog
+http_cache = travel_app.http_cache
+admission = travel_app.admission
+
+# --- Upstream Pool ---
+upstream_pool = create_upstream_pool()
+single_flight = AsyncSingleFlight()
+metrics.registry.register_collector(
+    "travel_app_async_upstream_pool", "Async upstream pool slots, waiters and shed calls.",
+    lambda: [({"stat": name}, value) for name, value in upstream_pool.stats().items()]
+)
+
+# Per-request holder for Gemini time, read by the Server-Timing header
+_request_upstream = contextvars.ContextVar("request_upstream", default=None)
+
+def _add_request_upstream_time(seconds):
+    holder = _request_upstream.get()
+    if holder is not None:
+        holder[0] += seconds
+
+async def generate_async(endpoint, model, contents, policy=None):
+    """
+    Awaits model.generate_content_async under an upstream pool slot and the
+    endpoint's resilience policy. The slot is held across retries, so a
+    request that is shed fails before any attempt is made.
+    """
+    async def attempt(timeout):
+        with travel_app.upstream_call(endpoint, track_request=False):
+            return await model.generate_content_async(contents, request_options={"timeout": timeout})
+
+    started = time.perf_counter()
+    try:
+        async with upstream_pool.slot():
+            return await resilient_caller.call_async(policy or endpoint, attempt)
+    finally:
+        _add_request_upstream_time(time.perf_counter() - started)
+
+async def _generate(endpoint, model, user_prompt, result_field, usage_endpoint=None, policy=None):
+    """ One generation as a result dict, with errors mapped the way app.py maps them. """
+    try:
+        response = await generate_async(endpoint, model, user_prompt, policy=policy)
+        model_provider.record_usage(usage_endpoint or endpoint, response)
+        return {result_field: response.text}
+    except UpstreamBusyError:
+        raise
+    except (CircuitOpenError, google_exceptions.GoogleAPIError) as api_error:
+        logging.error(f"Vertex AI API error: {str(api_error)}")
+        return {"error": f"API Error: {str(api_error)}"}
+    except Exception as e:
+        logging.error(f"Error generating {endpoint}: {str(e)}")
+        return {"error": f"Error: {str(e)}"}
+
+# --- Generation ---
+@response_cache.cached_async(
+    "itinerary", travel_app._itinerary_cache_params, single_flight=single_flight, near_duplicates=near_duplicates
+)
+async def generate_itinerary_async(location, duration, interests, other_prefs):
+    """ Async counterpart of app.generate_itinerary_vertexai. """
+    logging.info(f"Initiating itinerary generation for: {location}, Duration: {duration}, Interests: {interests}, Prefs: {other_prefs}")
+    model = model_provider.model_for("itinerary", system_instruction=system_instruction_for("itinerary"))
+    user_prompt = build_itinerary_prompt(location, duration, interests, other_prefs)
+    return await _generate("itinerary", model, user_prompt, "itinerary")
+
+@response_cache.cached_async(
+    "guide", travel_app._guide_cache_params, single_flight=single_flight, near_duplicates=near_duplicates
+)
+async def get_digital_guide_async(location, topic, style="GENERAL"):
+    """ Async counterpart of app.get_digital_guide_vertexai. """
+    logging.info(f"Received guide request for: {location}, topic: {topic}, style: {style}")
+    model = model_provider.model_for("guide", system_instruction=system_instruction_for("guide"))
+    return await _generate("guide", model, build_guide_prompt(location, topic, style), "guide_info")
+
+@response_cache.cached_async(
+    "gems", travel_app._gems_cache_params, single_flight=single_flight, near_duplicates=near_duplicates
+)
+async def _generate_hidden_gems_async(location, preferences):
+    logging.info(f"Received hidden gems request for: {location}, preferences: {preferences}")
+    model = model_provider.model_for("gems", system_instruction=system_instruction_for("gems"))
+    return await _generate("gems", model, build_gems_prompt(location, preferences), "gems")
+
+@response_cache.cached_async("gems_supplement", travel_app._supplement_cache_params, single_flight=single_flight)
+async def _generate_gems_supplement_async(destination_key):
+    destination = gems_catalog.resolve(destination_key)
+    return await _generate(
+        "gems_supplement", model_provider.model_for("gems"), destination.supplement_prompt(), "gems",
+        usage_endpoint="gems", policy="gems"
+    )
+
+async def find_hidden_gems_async(location, preferences, bypass_cache=False):
+    """ Async counterpart of app.find_hidden_gems_vertexai, honouring GEMS_SUPPLEMENT_MODE. """
+    destination = gems_catalog.resolve(location)
+    if destination is None:
+        return await _generate_hidden_gems_async(location, preferences, bypass_cache=bypass_cache)
+
+    logging.info(f"Serving curated hidden gems for: {destination.name}")
+    supplement = None
+    if travel_app.GEMS_SUPPLEMENT_MODE == "sync":
+        supplement = await _generate_gems_supplement_async(destination.key, bypass_cache=bypass_cache)
+    elif travel_app.GEMS_SUPPLEMENT_MODE == "async":
+        supplement = await response_cache.run_async(
+            response_cache.peek, make_cache_key("gems_supplement", **travel_app._supplement_cache_params(destination.key))
+        )
+        if supplement is None or bypass_cache:
+            # Background fetch on app.py's supplement thread, shared with the sync mode
+            travel_app._schedule_gems_supplement(destination.key, bypass_cache)
+    return travel_app._curated_gems_result(destination, supplement)
+
+# --- Streaming (Server-Sent Events) ---
+async def stream_generation_async(kind, result_field, user_prompt, cache_key=None, bypass_cache=False, on_complete=None):
+    """
+    Async counterpart of app.stream_generation_vertexai; the events and their
+    bookkeeping come from serving.GenerationStream.
+
+    The upstream slot is held for the whole stream. Cache reads and writes and
+    ``on_complete`` run in worker threads when they touch SQLite.
+    """
+    stream = GenerationStream(kind, result_field, response_cache, resilient_caller.breaker(kind), cache_key, bypass_cache)
+    try:
+        event = await response_cache.run_async(stream.cached_event)
+        if event is not None:
+            yield event
+        else:
+            try:
+                async with upstream_pool.slot():
+                    stream.admit()
+                    model = model_provider.model_for(kind, system_instruction=system_instruction_for(kind))
+                    timeout = resilient_caller.policies[kind].deadline
+                    with travel_app.upstream_call(f"{kind}_stream", track_request=False):
+                        response = await model.generate_content_async(
+                            user_prompt, stream=True, request_options={"timeout": timeout}
+                        )
+                        async for chunk in response:
+                            event = stream.chunk_event(chunk.text)
+                            if event is not None:
+                                yield event
+                model_provider.record_usage(kind, response)
+                await response_cache.run_async(stream.succeed)
+            except UpstreamBusyError as busy:
+                stream.skip(busy.message)
+            except Exception as e:
+                stream.fail(e)
+            event = await response_cache.run_async(stream.stale_event)
+            if event is not None:
+                yield event
+        if on_complete is not None and stream.ok:
+            stream.metadata.update(await run_in_threadpool(on_complete, stream.text))
+        yield stream.done_event()
+    finally:
+        # Also runs when the client disconnects: the stream is cancelled or closed at a yield
+        stream.close()
+
+def _sse_response(events):
+    return StreamingResponse(
+        events, media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# --- Request Helpers ---
+async def _check_rate(request, endpoint):
+    """
+    Applies the per-client token buckets from admission control. In-flight
+    limits are replaced by the upstream pool in this mode.
+    """
+    if admission.enabled:
+        client_key = admission.client_key(request.headers, request.client.host if request.client else "unknown")
+        await admission.check_rate_async(endpoint, client_key)
+
+def _busy_response(status, message, retry_after):
+    return JSONResponse({"error": message}, status_code=status, headers={'Retry-After': str(retry_after)})
+
+def _json_body(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _json_response(request, payload, status_code=200, headers=None):
+    """ JSON response, compressed like the Flask app's responses when large enough. """
+    headers = dict(headers or {})
+    body = _json_body(payload)
+    if status_code == 200:
+        headers['Vary'] = 'Accept-Encoding'
+        body, encoding = http_cache.encode(body, request.headers.get('Accept-Encoding'))
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+            if 'ETag' in headers:
+                headers['ETag'] = encoded_etag(headers['ETag'], encoding)
+    return Response(body, status_code=status_code, headers=headers, media_type='application/json')
+
+async def _cached_get_response(request, endpoint, cache_key, produce, complete=None):
+    """ Async counterpart of app._cached_get_response (ETag, 304 and stale-while-revalidate). """
+    bypass_cache = cache_bypass_requested(request.query_params, request.headers)
+    result = None
+    if cache_key is not None and not bypass_cache:
+        result = await response_cache.run_async(revalidatable_value, response_cache, http_cache, endpoint, cache_key)
+        if result is not None:
+            logging.info(f"Serving stale {endpoint} response while revalidating")
+            loop = asyncio.get_running_loop()
+            # Refreshes run on the event loop; HttpCache's worker only waits, deduplicates and counts
+            http_cache.schedule_refresh(
+                cache_key, lambda: asyncio.run_coroutine_threadsafe(produce(True), loop).result()
+            )
+
+    stale = result is not None
+    if result is None:
+        result = await produce(bypass_cache)
+
+    if 'error' in result:
+        return JSONResponse(result, status_code=500)
+    cacheable = not bypass_cache and (complete is None or complete(result))
+    not_modified, headers = http_cache.validate(
+        endpoint, result, request.headers.get('If-None-Match'), stale=stale, cacheable=cacheable
+    )
+    if not_modified:
+        headers['ETag'] = http_cache.representation_etag(
+            headers['ETag'], len(_json_body(result)), request.headers.get('Accept-Encoding')
+        )
+        return Response(status_code=304, headers=headers)
+    return _json_response(request, result, headers=headers)
+
+# --- API Routes ---
+async def index(request):
+    return JSONResponse({"message": "Welcome to the Travel App API!"})
+
+async def create_itinerary(request):
+    """ API endpoint to generate a travel itinerary. """
+    try:
+        await _check_rate(request, "itinerary")
+        data = await request.json()
+        if not data or 'location' not in data or 'duration' not in data or 'interests' not in data:
+            logging.warning("Itinerary request missing required fields.")
+            return JSONResponse({"error": "Missing required fields: location, duration, interests"}, status_code=400)
+
+        location = data['location']
+        duration = data['duration']
+        interests = data['interests']
+        other_prefs = data.get('other_prefs', '')
+        params = {"location": location, "duration": duration, "interests": interests, "other_prefs": other_prefs}
+
+        if streaming_requested(request.query_params, request.headers):
+            cache_key = make_cache_key(
+                "itinerary", **travel_app._itinerary_cache_params(location, duration, interests, other_prefs)
+            )
+            return _sse_response(stream_generation_async(
+                "itinerary", "itinerary",
+                build_itinerary_prompt(location, duration, interests, other_prefs),
+                cache_key=cache_key, bypass_cache=cache_bypass_requested(request.query_params, request.headers, data),
+                on_complete=lambda text: travel_app._store_itinerary(params, text)
+            ))
+
+        result = await generate_itinerary_async(
+            location, duration, interests, other_prefs,
+            bypass_cache=cache_bypass_requested(request.query_params, request.headers, data)
+        )
+
+        if 'error' in result:
+            return JSONResponse(result, status_code=500)
+        stored = await run_in_threadpool(travel_app._store_itinerary, params, result["itinerary"])
+        return _json_response(request, dict(result, **stored))
+
+    except Rejected as rejected:
+        return _busy_response(rejected.status, rejected.message, rejected.retry_after)
+    except UpstreamBusyError as busy:
+        return _busy_response(503, busy.message, busy.retry_after)
+    except Exception as e:
+        logging.error(f"Error in create_itinerary: {str(e)}")
+        return JSONResponse({"error": f"Server error: {str(e)}"}, status_code=500)
+
+async def get_guide(request):
+    """ API endpoint to get digital guide info. """
+    try:
+        await _check_rate(request, "guide")
+        location = request.query_params.get('location')
+        topic = request.query_params.get('topic')
+        style = request.query_params.get('style', 'GENERAL')
+
+        if not location or not topic:
+            return JSONResponse({"error": "Missing required parameters: location, topic"}, status_code=400)
+
+        if style.upper() not in travel_app.VALID_GUIDE_STYLES:
+            style = 'GENERAL'
+
+        cache_key = make_cache_key("guide", **travel_app._guide_cache_params(location, topic, style.upper()))
+        if streaming_requested(request.query_params, request.headers):
+            return _sse_response(stream_generation_async(
+                "guide", "guide_info",
+                build_guide_prompt(location, topic, style.upper()),
+                cache_key=cache_key, bypass_cache=cache_bypass_requested(request.query_params, request.headers)
+            ))
+
+        return await _cached_get_response(request, "guide", cache_key, lambda bypass_cache: get_digital_guide_async(
+            location, topic, style.upper(), bypass_cache=bypass_cache
+        ))
+
+    except Rejected as rejected:
+        return _busy_response(rejected.status, rejected.message, rejected.retry_after)
+    except UpstreamBusyError as busy:
+        return _busy_response(503, busy.message, busy.retry_after)
+    except Exception as e:
+        logging.error(f"Error in get_guide: {str(e)}")
+        return JSONResponse({"error": f"Server error: {str(e)}"}, status_code=500)
+
+async def get_gems(request):
+    """ API endpoint to find hidden gems. """
+    try:
+        await _check_rate(request, "gems")
+        location = request.query_params.get('location')
+        preferences = request.query_params.get('preferences', '')
+
+        if not location:
+            return JSONResponse({"error": "Missing required parameter: location"}, status_code=400)
+
+        cache_key = None
+        if gems_catalog.resolve(location) is None:
+            cache_key = make_cache_key("gems", **travel_app._gems_cache_params(location, preferences))
+        return await _cached_get_response(request, "gems", cache_key, lambda bypass_cache: find_hidden_gems_async(
+            location, preferences, bypass_cache=bypass_cache
+        ), complete=travel_app._gems_result_check(location))
+
+    except Rejected as rejected:
+        return _busy_response(rejected.status, rejected.message, rejected.retry_after)
+    except UpstreamBusyError as busy:
+        return _busy_response(503, busy.message, busy.retry_after)
+    except Exception as e:
+        logging.error(f"Error in get_gems: {str(e)}")
+        return JSONResponse({"error": f"Server error: {str(e)}"}, status_code=500)
+
+async def get_upstream_stats(request):
+    """ API endpoint exposing the upstream pool and async coalescing counters. """
+    return JSONResponse({"pool": upstream_pool.stats(), "singleflight": single_flight.stats()})
+
+async def get_metrics(request):
+    """ Prometheus text exposition, including the upstream pool. """
+    return Response(metrics.registry.render(), media_type='text/plain; version=0.0.4')
+
+routes = [
+    Route('/', index),
+    Route('/api/itinerary', create_itinerary, methods=['POST']),
+    Route('/api/guide', get_guide, methods=['GET']),
+    Route('/api/gems', get_gems, methods=['GET']),
+    Route('/api/upstream/stats', get_upstream_stats, methods=['GET']),
+    Route('/metrics', get_metrics, methods=['GET']),
+]
+
+# --- Instrumentation ---
+class TimingMiddleware:
+    """ Request metrics and the Server-Timing header, as app.py records them for Flask. """
+
+    def __init__(self, asgi_app):
+        self.asgi_app = asgi_app
+        self.paths = {route.path for route in routes}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.asgi_app(scope, receive, send)
+
+        label = scope["path"] if scope["path"] in self.paths else "unmatched"
+        started = time.perf_counter()
+        holder = [0.0]
+        token = _request_upstream.set(holder)
+        status = 500
+        metrics.REQUESTS_IN_FLIGHT.inc(endpoint=label)
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                upstream = holder[0]
+                server_timing = (
+                    f"upstream;dur={upstream * 1000:.1f}, "
+                    f"app;dur={max(elapsed - upstream, 0) * 1000:.1f}, "
+                    f"total;dur={elapsed * 1000:.1f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing.encode("latin-1")))
+                for name, value in headers:
+                    if name.lower() == b"content-length":
+                        metrics.RESPONSE_SIZE.observe(int(value), endpoint=label)
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.asgi_app(scope, receive, send_with_timing)
+        finally:
+            _request_upstream.reset(token)
+            metrics.REQUESTS_IN_FLIGHT.dec(endpoint=label)
+            metrics.REQUEST_LATENCY.observe(
+                time.perf_counter() - started, endpoint=label, method=scope["method"], status=status
+            )
+
+# --- App Factory ---
+WARMUP = os.getenv("ASGI_WARMUP", "1").lower() not in ("0", "false", "no")
+
+@contextlib.asynccontextmanager
+async def lifespan(asgi_app):
+    # Loads the Google client libraries and models before traffic, as the gunicorn hook does for Flask
+    if WARMUP:
+        await run_in_threadpool(travel_app.warmup)
+    yield
+
+def create_app():
+    """ Builds the Starlette application for the asyncio serving mode. """
+    logging.basicConfig(level=logging.INFO)
+    return Starlette(
+        routes=routes,
+        middleware=[
+            Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+            Middleware(TimingMiddleware),
+        ],
+        lifespan=lifespan,
+    )
+
+app = create_app()
+
+# --- Run the App ---
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(
+        "asgi:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "5000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
@@ -0,0 +1,253 @@
+"""
+Offline load test for the Travel App API.
+
+Drives /api/itinerary, /api/guide and /api/gems against a stub Gemini backend
+(see stub_gemini.py) and reports throughput, latency percentiles and memory per
+endpoint. Runs without network access or API keys.
+
+Usage:
+    python -m benchmarks.load_test --requests 200 --concurrency 20 --latency-ms 500
+    python -m benchmarks.load_test --mode wsgi --endpoints guide,gems --unique-keys
+    python -m benchmarks.load_test --mode asgi --unique-keys --concurrency 1000 --requests 2000
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ("itinerary", "guide", "gems")
+LOCATIONS = ("Jaipur", "Goa", "Udaipur", "Varanasi", "Rishikesh", "Hampi", "Munnar", "Leh")
+
+
+def build_request(endpoint, index, unique_keys):
+    """ Returns (method, path, json_body) for the index-th request to an endpoint. """
+    location = LOCATIONS[index % len(LOCATIONS)]
+    suffix = f" {index}" if unique_keys else ""
+    if endpoint == "itinerary":
+        body = {"location": location, "duration": 3, "interests": f"food, history{suffix}"}
+        return "POST", "/api/itinerary", body
+    if endpoint == "guide":
+        query = urllib.parse.urlencode({"location": location, "topic": f"history{suffix}", "style": "GENERAL"})
+        return "GET", f"/api/guide?{query}", None
+    query = urllib.parse.urlencode({"location": f"{location}{suffix}", "preferences": "food"})
+    return "GET", f"/api/gems?{query}", None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def current_rss_mb():
+    """ Resident set size from /proc, falling back to peak RSS where /proc is unavailable. """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class TestClientDriver:
+    """ Sends requests through Flask's in-process test client (one client per thread). """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self._local = threading.local()
+
+    def send(self, method, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.flask_app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, len(response.get_data())
+
+    def close(self):
+        pass
+
+
+class WSGIDriver:
+    """ Serves the app with Werkzeug's threaded WSGI server and sends real HTTP requests. """
+
+    def __init__(self, flask_app):
+        from werkzeug.serving import make_server
+
+        self.server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def send(self, method, path, body):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                return response.status, len(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+    def close(self):
+        self.server.shutdown()
+
+
+class ASGIDriver(WSGIDriver):
+    """ Serves asgi.py with uvicorn on its own event loop thread and sends real HTTP requests. """
+
+    def __init__(self, asgi_app):
+        import socket
+
+        import uvicorn
+
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        self.server = uvicorn.Server(uvicorn.Config(asgi_app, log_level="warning", backlog=4096))
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [sock]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def run_endpoint(driver, endpoint, total, concurrency, unique_keys):
+    """ Fires ``total`` requests at one endpoint and returns a result summary. """
+    latencies = []
+    statuses = {}
+    sizes = []
+    lock = threading.Lock()
+
+    def one(index):
+        method, path, body = build_request(endpoint, index, unique_keys)
+        started = time.perf_counter()
+        try:
+            status, size = driver.send(method, path, body)
+        except Exception:
+            status, size = "exception", 0
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            sizes.append(size)
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+
+    return {
+        "endpoint": endpoint,
+        "requests": total,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "req_per_s": round(total / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "avg_response_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+        "rss_mb": round(current_rss_mb(), 1),
+        "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+    }
+
+
+def print_report(results, stub_calls):
+    header = f"{'endpoint':<10} {'req':>6} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}  statuses"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['endpoint']:<10} {result['requests']:>6} {result['concurrency']:>5} "
+            f"{result['req_per_s']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+            f"{result['rss_mb']:>8}  {result['statuses']}"
+        )
+    print(f"\nStub Gemini calls: {stub_calls}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test with a stub Gemini backend.")
+    parser.add_argument("--mode", choices=("client", "wsgi", "asgi"), default="client",
+                        help="Flask test client (in-process), a real threaded WSGI server, or the asyncio app under uvicorn")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints to drive")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent client threads")
+    parser.add_argument("--unique-keys", action="store_true", help="Make every request distinct (defeats caching)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Median stub latency")
+    parser.add_argument("--latency-dist", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub calls that fail")
+    parser.add_argument("--response-chars", type=int, default=4000, help="Approximate generated text size")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep admission control on (off by default: all load comes from one client)")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(unknown)}")
+
+    from benchmarks import stub_gemini
+
+    config = stub_gemini.install(stub_gemini.StubConfig(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist, latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate, response_chars=args.response_chars, seed=args.seed,
+    ))
+
+    # Keep benchmark state out of the working tree and away from any configured shared stores.
+    workdir = tempfile.mkdtemp(prefix="travel-app-bench-")
+    os.environ["JOB_STORE_DB"] = os.path.join(workdir, "jobs.db")
+    os.environ["ITINERARY_STORE_DB"] = os.path.join(workdir, "itineraries.db")
+    os.environ.pop("RESPONSE_CACHE_DB", None)
+    os.environ.pop("SINGLE_FLIGHT_LOCK_DIR", None)
+    os.environ.pop("ADMISSION_STATE_DB", None)
+    if not args.admission:
+        os.environ["ADMISSION_ENABLED"] = "0"
+
+    import logging
+    import app as travel_app
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.mode == "asgi":
+        import asgi
+
+        driver = ASGIDriver(asgi.app)
+    elif args.mode == "wsgi":
+        driver = WSGIDriver(travel_app.app)
+    else:
+        driver = TestClientDriver(travel_app.app)
+    try:
+        results = [
+            run_endpoint(driver, endpoint, args.requests, args.concurrency, args.unique_keys)
+            for endpoint in endpoints
+        ]
+    finally:
+        driver.close()
+
+    print_report(results, config.calls)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"mode": args.mode, "args": vars(args), "results": results, "stub_calls": config.calls}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Near-duplicate index benchmark.
+
+Fills a NearDuplicateIndex with synthetic itinerary requests (random
+locations, durations and interest sets) and measures insert throughput,
+lookup latency, the share of lookups answered by a near-duplicate and the
+process memory the index added.
+
+Usage:
+    python -m benchmarks.near_duplicates --entries 200000 --lookups 5000
+"""
+import argparse
+import json
+import random
+import resource
+import statistics
+import sys
+import time
+
+from query_matching import NearDuplicateIndex
+
+INTERESTS = (
+    "beaches", "food", "history", "temples", "trekking", "shopping", "museums", "budget", "luxury", "family",
+    "photography", "vegetarian", "nightlife", "architecture", "adventure", "wildlife", "spiritual", "relaxing",
+    "forts", "waterfalls", "cafes", "art", "music", "yoga", "boating", "camping", "sunsets", "lakes", "caves",
+    "villages", "tea", "wine",
+)
+
+
+def _rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_request(rng, locations):
+    return {
+        "location": f"city {rng.randrange(locations)}",
+        "duration": str(rng.randint(1, 10)),
+        "interests": ",".join(rng.sample(INTERESTS, rng.randint(2, 6))),
+        "other_prefs": "",
+    }
+
+
+def run(entries, lookups, locations, threshold, num_perm, seed):
+    rng = random.Random(seed)
+    rss_before = _rss_mb()
+    index = NearDuplicateIndex(threshold=threshold, num_perm=num_perm, max_entries=entries)
+
+    started = time.perf_counter()
+    for number in range(entries):
+        index.add("itinerary", make_request(rng, locations), f"itinerary:{number}")
+    insert_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(lookups):
+        started = time.perf_counter()
+        index.find("itinerary", make_request(rng, locations), lambda key: {"itinerary": key})
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    stats = index.stats()
+    return {
+        "entries": entries,
+        "inserts_per_second": round(entries / insert_seconds),
+        "lookup_p50_ms": round(statistics.median(latencies), 3),
+        "lookup_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+        "extra_hit_rate": stats["extra_hit_rate"],
+        "candidates_per_lookup": round(stats["candidates_checked"] / max(stats["lookups"], 1), 2),
+        "bands": stats["bands"],
+        "rows": stats["rows"],
+        "memory_mb": round(_rss_mb() - rss_before, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate index throughput, latency and memory.")
+    parser.add_argument("--entries", type=int, default=200000, help="Cache keys to index")
+    parser.add_argument("--lookups", type=int, default=5000, help="Lookups to time")
+    parser.add_argument("--locations", type=int, default=2000, help="Distinct locations in the synthetic traffic")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Jaccard threshold")
+    parser.add_argument("--num-perm", type=int, default=32, help="MinHash functions per signature")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    result = run(args.entries, args.lookups, args.locations, args.threshold, args.num_perm, args.seed)
+    for name, value in result.items():
+        print(f"{name:<24} {value}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Startup-time benchmark for the Travel App API.
+
+Each run starts a fresh interpreter and measures how long it takes to import
+the app, serve a first trivial request and serve a first generation request
+against the stub Gemini backend. Modes:
+
+    eager   imports the Google client libraries up front, as app.py did before
+            the app factory and lazy imports
+    lazy    current behaviour: Google libraries load on the first Gemini call
+    warmup  lazy import followed by app.warmup(), as the gunicorn hook does
+
+Usage:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("eager", "lazy", "warmup")
+STEPS = ("import_ms", "warmup_ms", "first_request_ms", "first_generation_ms", "total_ms")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def measure(mode):
+    """ Runs in the child interpreter and returns timings for one cold start. """
+    timings = {}
+    started = time.perf_counter()
+
+    step = time.perf_counter()
+    if mode == "eager":
+        import google.auth  # noqa: F401
+        import google.generativeai  # noqa: F401
+        from google.api_core import exceptions  # noqa: F401
+    import app as travel_app
+    timings["import_ms"] = _elapsed_ms(step)
+
+    client = travel_app.app.test_client()
+    step = time.perf_counter()
+    client.get("/")
+    timings["first_request_ms"] = _elapsed_ms(step)
+
+    # The stub needs google.generativeai, so installing it is part of the first
+    # generation (or warmup) cost, just as the real lazy import would be.
+    step = time.perf_counter()
+    from benchmarks import stub_gemini
+
+    stub_gemini.install(stub_gemini.StubConfig(latency_ms=0, latency_dist="fixed"))
+    if mode == "warmup":
+        travel_app.warmup()
+        timings["warmup_ms"] = _elapsed_ms(step)
+        step = time.perf_counter()
+    response = client.get("/api/guide?location=Jaipur&topic=history")
+    if response.status_code != 200:
+        raise RuntimeError(f"First generation request failed with {response.status_code}")
+    timings["first_generation_ms"] = _elapsed_ms(step)
+    timings["total_ms"] = _elapsed_ms(started)
+    return timings
+
+
+def run_child(mode):
+    """ Starts a fresh interpreter for one measurement and returns its timings. """
+    workdir = tempfile.mkdtemp(prefix="travel-app-startup-")
+    env = dict(os.environ)
+    env["JOB_STORE_DB"] = os.path.join(workdir, "jobs.db")
+    env["ITINERARY_STORE_DB"] = os.path.join(workdir, "itineraries.db")
+    env["ADMISSION_ENABLED"] = "0"
+    for name in ("RESPONSE_CACHE_DB", "SINGLE_FLIGHT_LOCK_DIR", "ADMISSION_STATE_DB"):
+        env.pop(name, None)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", mode],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    """ Median of each step across runs. """
+    return {
+        step: round(statistics.median(sample[step] for sample in samples), 1)
+        for step in STEPS if all(step in sample for sample in samples)
+    }
+
+
+def print_report(results, runs):
+    header = f"{'mode':<8} " + " ".join(f"{step[:-3]:>18}" for step in STEPS)
+    print(f"Median of {runs} cold starts (ms)")
+    print(header)
+    print("-" * len(header))
+    for mode, summary in results.items():
+        print(f"{mode:<8} " + " ".join(f"{summary.get(step, '-'):>18}" for step in STEPS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start import and first-request latency.")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated modes to measure")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        import logging
+
+        logging.disable(logging.WARNING)
+        print(json.dumps(measure(args.child)))
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(unknown)}")
+
+    results = {}
+    samples = {}
+    for mode in modes:
+        samples[mode] = [run_child(mode) for _ in range(args.runs)]
+        results[mode] = summarize(samples[mode])
+
+    print_report(results, args.runs)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"runs": args.runs, "results": results, "samples": samples}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Offline stand-in for genai.GenerativeModel.
+
+Simulates Gemini latency, failures and response sizes without network access
+or API quota, so the Flask app can be load-tested on any Linux box. The
+async methods back the asyncio serving mode (asgi.py).
+"""
+import asyncio
+import random
+import threading
+import time
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+LOREM = (
+    "Day {n}: Explore the old city bazaars, sample local street food at a family-run dhaba, "
+    "visit the fort at sunset and enjoy a thali dinner (approx. 800 INR per person). "
+)
+
+
+class StubConfig:
+    """
+    Args:
+        latency_ms: Median simulated upstream latency
+        latency_dist: "fixed", "uniform" (0.5x-1.5x median) or "lognormal"
+        latency_sigma: Spread of the lognormal distribution
+        error_rate: Fraction of calls that raise ServiceUnavailable
+        response_chars: Approximate length of each generated text
+        chunks: Number of chunks yielded in streaming mode
+        seed: Random seed for reproducible runs
+    """
+
+    def __init__(self, latency_ms=800, latency_dist="lognormal", latency_sigma=0.5, error_rate=0.0,
+                 response_chars=4000, chunks=8, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.response_chars = response_chars
+        self.chunks = chunks
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def sample_latency(self):
+        with self.lock:
+            if self.latency_dist == "fixed":
+                value = self.latency_ms
+            elif self.latency_dist == "uniform":
+                value = self.random.uniform(0.5 * self.latency_ms, 1.5 * self.latency_ms)
+            else:
+                value = self.latency_ms * self.random.lognormvariate(0, self.latency_sigma)
+        return value / 1000.0
+
+    def should_fail(self):
+        with self.lock:
+            self.calls += 1
+            return self.random.random() < self.error_rate
+
+    def text(self):
+        parts = []
+        n = 1
+        while sum(len(part) for part in parts) < self.response_chars:
+            parts.append(LOREM.format(n=n))
+            n += 1
+        return "".join(parts)[:self.response_chars]
+
+
+class _Usage:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = len(str(prompt)) // 4
+        self.candidates_token_count = len(text) // 4
+
+
+class _Response:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+
+
+class _StreamResponse:
+    def __init__(self, config, text, prompt):
+        self._config = config
+        self._text = text
+        self._prompt = prompt
+        self.usage_metadata = None
+
+    def __iter__(self):
+        size = max(1, len(self._text) // self._config.chunks)
+        # The first chunk arrives after a quarter of the total latency, the rest spread evenly.
+        latency = self._config.sample_latency()
+        time.sleep(latency / 4)
+        pieces = [self._text[i:i + size] for i in range(0, len(self._text), size)]
+        for piece in pieces:
+            yield _Response(piece, "")
+            time.sleep(latency * 0.75 / len(pieces))
+        self.usage_metadata = _Usage(self._prompt, self._text)
+
+
+class _AsyncStreamResponse(_StreamResponse):
+    async def __aiter__(self):
+        size = max(1, len(self._text) // self._config.chunks)
+        latency = self._config.sample_latency()
+        await asyncio.sleep(latency / 4)
+        pieces = [self._text[i:i + size] for i in range(0, len(self._text), size)]
+        for piece in pieces:
+            yield _Response(piece, "")
+            await asyncio.sleep(latency * 0.75 / len(pieces))
+        self.usage_metadata = _Usage(self._prompt, self._text)
+
+
+class _StubChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content, **kwargs):
+        response = self.model.generate_content(self.history + [{"role": "user", "parts": [content]}], **kwargs)
+        self.history += [{"role": "user", "parts": [content]}, {"role": "model", "parts": [response.text]}]
+        return response
+
+
+def make_stub_model_class(config):
+    """ Builds a GenerativeModel replacement bound to a StubConfig. """
+
+    class StubGenerativeModel:
+        def __init__(self, model_name="gemini-1.5-pro", generation_config=None, system_instruction=None, **kwargs):
+            self.model_name = model_name
+            self.system_instruction = system_instruction
+
+        def generate_content(self, contents, stream=False, **kwargs):
+            prompt = f"{self.system_instruction or ''}{contents}"
+            if config.should_fail():
+                time.sleep(config.sample_latency() / 2)
+                raise google_exceptions.ServiceUnavailable("Stub Gemini backend unavailable")
+            if stream:
+                return _StreamResponse(config, config.text(), prompt)
+            time.sleep(config.sample_latency())
+            return _Response(config.text(), prompt)
+
+        async def generate_content_async(self, contents, stream=False, **kwargs):
+            prompt = f"{self.system_instruction or ''}{contents}"
+            if config.should_fail():
+                await asyncio.sleep(config.sample_latency() / 2)
+                raise google_exceptions.ServiceUnavailable("Stub Gemini backend unavailable")
+            if stream:
+                return _AsyncStreamResponse(config, config.text(), prompt)
+            await asyncio.sleep(config.sample_latency())
+            return _Response(config.text(), prompt)
+
+        def start_chat(self, history=None):
+            return _StubChat(self, history)
+
+    return StubGenerativeModel
+
+
+def install(config):
+    """ Replaces genai.GenerativeModel and genai.configure with offline stubs. """
+    genai.GenerativeModel = make_stub_model_class(config)
+    genai.configure = lambda **kwargs: None
+    return config
@@ -0,0 +1,444 @@
+"""
+Response cache for Gemini generations.
+
+Two tiers sit in front of the generation functions in app.py:
+- an in-memory LRU with size and TTL eviction (per process)
+- an optional SQLite store that survives restarts and is shared by workers
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- Key Normalization ---
+_WHITESPACE_RE = re.compile(r"\s+")
+_LIST_SPLIT_RE = re.compile(r"\s*(?:,|;|/|\band\b|&)\s*")
+
+
+def normalize_text(value):
+    """ Lowercases and collapses whitespace so cosmetic differences share a key. """
+    if value is None:
+        return ""
+    return _WHITESPACE_RE.sub(" ", str(value)).strip().lower()
+
+
+def normalize_list(value):
+    """ Normalizes a free-text or list value into a sorted, de-duplicated string. """
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple, set)):
+        items = [normalize_text(item) for item in value]
+    else:
+        items = _LIST_SPLIT_RE.split(normalize_text(value))
+    return ",".join(sorted({item for item in items if item}))
+
+
+def make_cache_key(kind, **params):
+    """
+    Builds a stable cache key for a generation request.
+
+    Args:
+        kind: The generation type (itinerary, guide, gems)
+        params: Already-normalized request parameters
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{kind}:{digest}"
+
+
+# --- Cache Tiers ---
+class MemoryCache:
+    """ Thread-safe LRU cache with a maximum size and per-entry TTL. """
+
+    def __init__(self, max_size=512, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_stale=False):
+        """
+        Returns a live entry, or None.
+
+        Expired entries stay in place (until LRU eviction) so they can still be
+        served with ``allow_stale`` when upstream is failing.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time() and not allow_stale:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def entry(self, key):
+        """ Returns (value, expires_at) even if expired, without touching LRU order; None if absent. """
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache tier backed by SQLite, safe to share between worker processes.
+
+    Expired rows are kept for ``stale_ttl`` more seconds so they can still be
+    served stale, then deleted by a purge that runs on write at most once per
+    ``purge_interval``. The file and table are created on first use.
+
+    Args:
+        path: SQLite file
+        ttl: Default entry lifetime in seconds
+        stale_ttl: Seconds an expired entry is kept for stale serving
+        purge_interval: Minimum seconds between purges of entries past the stale horizon
+    """
+
+    def __init__(self, path, ttl=86400, stale_ttl=604800, purge_interval=300):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._create_schema(conn)
+        return conn
+
+    def _create_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS response_cache_expires_at ON response_cache (expires_at)")
+            self._schema_ready = True
+
+    def get(self, key, allow_stale=False):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now and (not allow_stale or row[1] < now - self.stale_ttl):
+            return None
+        return json.loads(row[0])
+
+    def entry(self, key):
+        """ Returns (value, expires_at) even if expired; None if absent. """
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+        self.purge_expired()
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def expires_at(self, key):
+        row = self._connect().execute(
+            "SELECT expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def purge_expired(self, force=False):
+        """ Deletes entries past the stale horizon, at most once per purge_interval unless ``force`` is set. """
+        now = time.time()
+        with self._purge_lock:
+            if not force and now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now - self.stale_ttl,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    """
+    Tiered response cache: memory first, then the optional disk tier.
+
+    Disk hits are promoted into memory. Only successful results (no "error"
+    key) are stored, so a failed generation is retried on the next request.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "stale_served": 0,
+            "near_hits": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("hits")
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                logging.error(f"Response cache disk read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self._count("hits")
+                self._count("disk_hits")
+                self.memory.set(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value, ttl=None):
+        if not isinstance(value, dict) or "error" in value:
+            return
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl)
+            except sqlite3.Error as e:
+                logging.error(f"Response cache disk write failed: {str(e)}")
+        self._count("stores")
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        # Misses answered by a near-duplicate request's entry
+        stats["effective_hit_rate"] = round((stats["hits"] + stats["near_hits"]) / lookups, 4) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        stats["disk_enabled"] = self.disk is not None
+        return stats
+
+    def peek(self, key):
+        """ Reads both tiers without touching hit/miss counters. """
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error:
+                value = None
+        return value
+
+    def get_entry(self, key):
+        """
+        Returns (value, expires_at) for a key, expired or not, or (None, None).
+
+        Used to serve stale-while-revalidate; reads both tiers without touching
+        counters and prefers whichever tier holds the later expiry.
+        """
+        entry = self.memory.entry(key)
+        if (entry is None or entry[1] < time.time()) and self.disk is not None:
+            try:
+                disk_entry = self.disk.entry(key)
+            except sqlite3.Error:
+                disk_entry = None
+            if disk_entry is not None and (entry is None or disk_entry[1] > entry[1]):
+                entry = disk_entry
+        return entry if entry is not None else (None, None)
+
+    def get_stale(self, key):
+        """ Returns an entry even if expired; used as a fallback when generation fails. """
+        value = self.memory.get(key, allow_stale=True)
+        if value is None and self.disk is not None:
+            try:
+                value = self.disk.get(key, allow_stale=True)
+            except sqlite3.Error:
+                value = None
+        return value
+
+    async def run_async(self, func, *args):
+        """
+        Awaits ``func(*args)``, a call that may touch the disk tier, from a coroutine.
+
+        With a disk tier it runs in a worker thread so SQLite never blocks the
+        event loop; memory-only caches answer inline.
+        """
+        if self.disk is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def cached(self, kind, key_builder, single_flight=None, near_duplicates=None):
+        """
+        Decorator that serves a generation function from the cache.
+
+        The wrapped function accepts an extra ``bypass_cache`` keyword; when
+        true the cache is not read, but a fresh successful result is still stored.
+        With ``single_flight`` set, concurrent misses for the same key share
+        one call to the wrapped function. If generation returns an error and a
+        stale entry for the key survives, the stale entry is served instead.
+        With ``near_duplicates`` set (a query_matching.NearDuplicateIndex), a
+        miss is answered from the entry of a paraphrased earlier request when
+        one is similar enough, and every stored result is indexed.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, bypass_cache=False, **kwargs):
+                params = key_builder(*args, **kwargs)
+                key = make_cache_key(kind, **params)
+                if bypass_cache:
+                    self._count("bypassed")
+                else:
+                    cached_value = self.get(key)
+                    if cached_value is None and near_duplicates is not None:
+                        cached_value = near_duplicates.find(kind, params, self.peek)
+                        if cached_value is not None:
+                            logging.info(f"Response cache near-duplicate hit for {kind}")
+                            self._count("near_hits")
+                            return cached_value
+                    if cached_value is not None:
+                        logging.info(f"Response cache hit for {kind}")
+                        return cached_value
+
+                def generate():
+                    result = func(*args, **kwargs)
+                    self.set(key, result)
+                    if near_duplicates is not None and isinstance(result, dict) and "error" not in result:
+                        near_duplicates.add(kind, params, key)
+                    return result
+
+                if single_flight is None:
+                    result = generate()
+                else:
+                    result = single_flight.do(key, generate, recheck=lambda: self.peek(key))
+                if isinstance(result, dict) and "error" in result:
+                    stale_value = self.get_stale(key)
+                    if stale_value is not None:
+                        logging.warning(f"Serving stale {kind} response after generation error: {result['error']}")
+                        self._count("stale_served")
+                        return stale_value
+                return result
+            return wrapper
+        return decorator
+
+    def cached_async(self, kind, key_builder, single_flight=None, near_duplicates=None):
+        """
+        Async counterpart of cached() for coroutine generation functions.
+
+        Keys are built the same way, so the sync and asyncio serving modes share
+        entries. ``single_flight`` is a singleflight.AsyncSingleFlight. Disk
+        tier reads and writes go through run_async().
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, bypass_cache=False, **kwargs):
+                params = key_builder(*args, **kwargs)
+                key = make_cache_key(kind, **params)
+                if bypass_cache:
+                    self._count("bypassed")
+                else:
+                    cached_value = await self.run_async(self.get, key)
+                    if cached_value is None and near_duplicates is not None:
+                        cached_value = await self.run_async(near_duplicates.find, kind, params, self.peek)
+                        if cached_value is not None:
+                            logging.info(f"Response cache near-duplicate hit for {kind}")
+                            self._count("near_hits")
+                            return cached_value
+                    if cached_value is not None:
+                        logging.info(f"Response cache hit for {kind}")
+                        return cached_value
+
+                async def generate():
+                    result = await func(*args, **kwargs)
+                    await self.run_async(self.set, key, result)
+                    if near_duplicates is not None and isinstance(result, dict) and "error" not in result:
+                        near_duplicates.add(kind, params, key)
+                    return result
+
+                if single_flight is None:
+                    result = await generate()
+                else:
+                    result = await single_flight.do(key, generate)
+                if isinstance(result, dict) and "error" in result:
+                    stale_value = await self.run_async(self.get_stale, key)
+                    if stale_value is not None:
+                        logging.warning(f"Serving stale {kind} response after generation error: {result['error']}")
+                        self._count("stale_served")
+                        return stale_value
+                return result
+            return wrapper
+        return decorator
+
+
+def create_response_cache():
+    """ Builds the response cache from RESPONSE_CACHE_* environment variables. """
+    memory = MemoryCache(
+        max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+        ttl=int(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    )
+    disk = None
+    db_path = os.getenv("RESPONSE_CACHE_DB")
+    if db_path:
+        disk = SQLiteCache(
+            db_path,
+            ttl=int(os.getenv("RESPONSE_CACHE_DISK_TTL", "86400")),
+            stale_ttl=int(os.getenv("RESPONSE_CACHE_DISK_STALE_TTL", "604800")),
+        )
+    return ResponseCache(memory, disk)
@@ -0,0 +1,116 @@
+"""
+Curated hidden gems catalog.
+
+Curated destinations live in data/curated_gems.json and are loaded once at
+startup. Location lookups go through a normalized alias index, so "Mt. Abu",
+"mount abu" and "MT ABU" all resolve with a single dict lookup; a fuzzy match
+is only attempted (and memoized) when the exact lookup misses, and only for
+names long enough that a close spelling is a typo rather than another word
+("Goal" must not become Goa).
+"""
+import difflib
+import functools
+import json
+import os
+import re
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "curated_gems.json")
+
+# Abbreviations expanded during normalization, e.g. "mt. abu" -> "mount abu"
+ABBREVIATIONS = {
+    "mt": "mount",
+    "st": "saint",
+    "ft": "fort",
+}
+
+GEM_FIELDS = [
+    ("Description", "description"),
+    ("Why it's special", "why_special"),
+    ("Best time to visit", "best_time"),
+    ("Approximate cost", "cost"),
+    ("How to get there", "how_to_get_there"),
+    ("Insider tip", "insider_tip"),
+]
+
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_location(location):
+    """ Lowercases, strips punctuation and expands abbreviations. """
+    words = _NON_WORD_RE.sub(" ", str(location or "").lower()).split()
+    return " ".join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+class CuratedDestination:
+    def __init__(self, name, gems, aliases=None, supplement_count="2-3", supplement_focus=""):
+        self.name = name
+        self.gems = gems
+        self.aliases = aliases or []
+        self.supplement_count = supplement_count
+        self.supplement_focus = supplement_focus
+        self.key = normalize_location(name)
+        self.markdown = self._render()
+
+    def _render(self):
+        """ Renders the curated gems as the markdown the /api/gems endpoint returns. """
+        lines = ["", f"# Top Hidden Gems in {self.name}", ""]
+        for number, gem in enumerate(self.gems, start=1):
+            lines.append(f"{number}. **{gem['name']}**")
+            for label, field in GEM_FIELDS:
+                lines.append(f"   - **{label}**: {gem[field]}")
+            lines.append("")
+        return "\n".join(lines) + "\n"
+
+    def supplement_prompt(self):
+        """ Prompt asking Gemini for extra gems beyond the curated ones. """
+        known = "\n".join(f"- {gem['name']}" for gem in self.gems)
+        return f"""Find {self.supplement_count} more hidden gems in {self.name} besides these already known ones:
+{known}
+
+{self.supplement_focus}
+Format each gem with: name, brief description, why it's special, best time to visit, cost, how to get there, and one insider tip."""
+
+
+class GemsCatalog:
+    """
+    Args:
+        destinations: CuratedDestination entries
+        fuzzy_cutoff: Minimum difflib similarity (0-1) for a fuzzy alias match
+        fuzzy_min_length: Shortest location, and alias, that may be matched fuzzily
+    """
+
+    def __init__(self, destinations, fuzzy_cutoff=0.9, fuzzy_min_length=6):
+        self.destinations = destinations
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.fuzzy_min_length = fuzzy_min_length
+        self._index = {}
+        for destination in destinations:
+            for alias in [destination.name] + destination.aliases:
+                self._index[normalize_location(alias)] = destination
+        self._fuzzy_lookup = functools.lru_cache(maxsize=1024)(self._fuzzy_match)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CATALOG_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([CuratedDestination(**entry) for entry in data["destinations"]])
+
+    def _fuzzy_match(self, normalized):
+        if len(normalized) < self.fuzzy_min_length:
+            return None
+        aliases = [alias for alias in self._index if len(alias) >= self.fuzzy_min_length]
+        matches = difflib.get_close_matches(normalized, aliases, n=1, cutoff=self.fuzzy_cutoff)
+        return self._index[matches[0]] if matches else None
+
+    def resolve(self, location):
+        """ Returns the curated destination for a free-text location, or None. """
+        normalized = normalize_location(location)
+        if not normalized:
+            return None
+        destination = self._index.get(normalized)
+        if destination is None:
+            destination = self._fuzzy_lookup(normalized)
+        return destination
+
+    def __len__(self):
+        return len(self.destinations)
@@ -0,0 +1,377 @@
+"""
+Server-side sessions for multi-turn digital guide conversations.
+
+A session pins the location and communication style and keeps a short chat
+history, so follow-up topics are sent as chat turns instead of fresh
+single-shot prompts. The store is bounded three ways: idle sessions expire,
+the least recently used sessions are evicted beyond a count or memory budget,
+and each session keeps only its most recent turns (older topics survive as a
+one-line note) with stored answers clipped to a fixed length.
+
+Sessions are stored in a SQLite file by default, so every gunicorn worker
+sees every session and a follow-up turn can land on any worker. The in-memory
+store (GUIDE_SESSION_DB set to an empty value) only suits a single process.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+# Rough per-session bookkeeping overhead on top of the stored text
+SESSION_OVERHEAD_BYTES = 1024
+CLIPPED_MARKER = " [...]"
+# Earlier topics remembered per session once their turns are dropped
+MAX_EARLIER_TOPICS = 20
+
+
+class GuideSession:
+    """
+    Args:
+        location: Tourist spot the conversation is about
+        style: Communication style (GENERAL, FUNNY or BASIC)
+    """
+
+    def __init__(self, location, style, session_id=None, lock=None):
+        self.id = session_id or uuid.uuid4().hex
+        self.location = location
+        self.style = style
+        self.turns = []
+        self.dropped_topics = []
+        self.turn_count = 0
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.lock = lock or threading.Lock()
+
+    def add_turn(self, topic, answer, max_turns, answer_chars):
+        """ Appends an exchange, clipping the answer and folding turns beyond max_turns into topics; returns turns dropped. """
+        if len(answer) > answer_chars:
+            answer = answer[:answer_chars] + CLIPPED_MARKER
+        self.turns.append((topic, answer))
+        self.turn_count += 1
+        dropped = len(self.turns) - max_turns
+        if dropped > 0:
+            self.dropped_topics.extend(topic for topic, _ in self.turns[:dropped])
+            del self.turns[:dropped]
+            del self.dropped_topics[:-MAX_EARLIER_TOPICS]
+        return max(dropped, 0)
+
+    def load_history(self, turns, dropped_topics, turn_count):
+        self.turns = [tuple(turn) for turn in turns]
+        self.dropped_topics = list(dropped_topics)
+        self.turn_count = turn_count
+
+    def size_bytes(self):
+        text = [self.location, self.style] + self.dropped_topics
+        for topic, answer in self.turns:
+            text.extend((topic, answer))
+        return SESSION_OVERHEAD_BYTES + sum(len(part.encode("utf-8")) for part in text)
+
+    def topics(self):
+        return self.dropped_topics + [topic for topic, _ in self.turns]
+
+    def to_dict(self):
+        return {
+            "session_id": self.id,
+            "location": self.location,
+            "style": self.style,
+            "turns": self.turn_count,
+            "topics": self.topics(),
+            "created_at": self.created_at,
+        }
+
+
+class GuideSessionStore:
+    """
+    Memory-bounded LRU store of guide sessions.
+
+    Args:
+        max_sessions: Sessions kept before the least recently used is evicted
+        max_bytes: Approximate memory budget for all sessions
+        idle_timeout: Seconds without use after which a session expires
+        max_turns: Exchanges kept per session; older ones are reduced to their topic
+        answer_chars: Characters of each answer kept as chat context
+    """
+
+    def __init__(self, max_sessions=1000, max_bytes=32 * 1024 * 1024, idle_timeout=1800, max_turns=4,
+                 answer_chars=1200):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.max_turns = max_turns
+        self.answer_chars = answer_chars
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0, "messages": 0, "truncated_turns": 0,
+            "evicted_idle": 0, "evicted_lru": 0, "evicted_memory": 0, "not_found": 0,
+        }
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._bytes -= self._sizes.pop(session_id, 0)
+
+    def _evict(self):
+        """ Drops idle sessions, then least recently used ones while over the count or memory budget. """
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used > self.idle_timeout:
+                self._stats["evicted_idle"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self._stats["evicted_lru"] += 1
+            elif self._bytes > self.max_bytes and len(self._sessions) > 1:
+                self._stats["evicted_memory"] += 1
+            else:
+                break
+            self._remove(session_id)
+
+    def create(self, location, style):
+        session = GuideSession(location, style)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sizes[session.id] = session.size_bytes()
+            self._bytes += self._sizes[session.id]
+            self._stats["created"] += 1
+            self._evict()
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._stats["not_found"] += 1
+                return None
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            existed = session_id in self._sessions
+            self._remove(session_id)
+        return existed
+
+    def reload(self, session):
+        """ Sessions are the stored objects themselves, so there is nothing to refresh. """
+
+    def record_turn(self, session, topic, answer):
+        """ Appends an exchange, clipping the answer and folding turns beyond max_turns into topics. """
+        dropped = session.add_turn(topic, answer, self.max_turns, self.answer_chars)
+        size = session.size_bytes()
+        with self._lock:
+            self._stats["messages"] += 1
+            self._stats["truncated_turns"] += dropped
+            if session.id in self._sessions:
+                self._bytes += size - self._sizes[session.id]
+                self._sizes[session.id] = size
+                self._evict()
+
+    def stats(self):
+        with self._lock:
+            self._evict()
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._sessions)
+            stats["bytes"] = self._bytes
+        stats["max_sessions"] = self.max_sessions
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+class SQLiteGuideSessionStore:
+    """
+    Guide sessions in a SQLite file shared by all worker processes.
+
+    Bounded like GuideSessionStore: idle sessions expire, and the least recently
+    used are deleted beyond max_sessions or max_bytes of stored text. Counters
+    in stats() are per process; "sessions" and "bytes" cover the whole file.
+    The file and table are created on first use.
+
+    Args:
+        path: SQLite file
+        max_sessions, max_bytes, idle_timeout, max_turns, answer_chars: As for GuideSessionStore
+    """
+
+    def __init__(self, path, max_sessions=1000, max_bytes=32 * 1024 * 1024, idle_timeout=1800, max_turns=4,
+                 answer_chars=1200):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.max_turns = max_turns
+        self.answer_chars = answer_chars
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        # One lock per session id while any request holds it, so turns in this process run in order
+        self._session_locks = weakref.WeakValueDictionary()
+        self._stats = {
+            "created": 0, "messages": 0, "truncated_turns": 0,
+            "evicted_idle": 0, "evicted_lru": 0, "evicted_memory": 0, "not_found": 0,
+        }
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._create_schema(conn)
+        return conn
+
+    def _create_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS guide_sessions ("
+                    "id TEXT PRIMARY KEY, location TEXT NOT NULL, style TEXT NOT NULL, history TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, last_used REAL NOT NULL, size INTEGER NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS guide_sessions_last_used ON guide_sessions (last_used)")
+            self._schema_ready = True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _lock_for(self, session_id):
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def _history(session):
+        return json.dumps(
+            {"turns": session.turns, "dropped_topics": session.dropped_topics, "turn_count": session.turn_count},
+            ensure_ascii=False,
+        )
+
+    def _session(self, row):
+        session = GuideSession(row["location"], row["style"], session_id=row["id"], lock=self._lock_for(row["id"]))
+        history = json.loads(row["history"])
+        session.load_history(history["turns"], history["dropped_topics"], history["turn_count"])
+        session.created_at = row["created_at"]
+        return session
+
+    def _evict(self, conn):
+        """ Drops idle sessions, then least recently used ones while over the count or byte budget. """
+        cursor = conn.execute("DELETE FROM guide_sessions WHERE last_used < ?", (time.time() - self.idle_timeout,))
+        self._count("evicted_idle", cursor.rowcount)
+        cursor = conn.execute(
+            "DELETE FROM guide_sessions WHERE id IN ("
+            "SELECT id FROM guide_sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+        self._count("evicted_lru", cursor.rowcount)
+        # Keeps the most recently used sessions that fit the budget, and always the newest one
+        cursor = conn.execute(
+            "DELETE FROM guide_sessions WHERE id IN (SELECT id FROM ("
+            "SELECT id, SUM(size) OVER (ORDER BY last_used DESC, id) AS total, "
+            "ROW_NUMBER() OVER (ORDER BY last_used DESC, id) AS position FROM guide_sessions"
+            ") WHERE total > ? AND position > 1)",
+            (self.max_bytes,),
+        )
+        self._count("evicted_memory", cursor.rowcount)
+
+    def create(self, location, style):
+        session = GuideSession(location, style)
+        session.lock = self._lock_for(session.id)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO guide_sessions (id, location, style, history, created_at, last_used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session.id, location, style, self._history(session), session.created_at, now, session.size_bytes()),
+            )
+            self._evict(conn)
+        self._count("created")
+        return session
+
+    def get(self, session_id):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM guide_sessions WHERE id = ? AND last_used >= ?", (session_id, now - self.idle_timeout)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE guide_sessions SET last_used = ? WHERE id = ?", (now, session_id))
+        if row is None:
+            self._count("not_found")
+            return None
+        return self._session(row)
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM guide_sessions WHERE id = ?", (session_id,))
+        return cursor.rowcount == 1
+
+    def reload(self, session):
+        """ Refreshes the history of a session another request may have extended since it was read. """
+        row = self._connect().execute("SELECT history FROM guide_sessions WHERE id = ?", (session.id,)).fetchone()
+        if row is not None:
+            history = json.loads(row["history"])
+            session.load_history(history["turns"], history["dropped_topics"], history["turn_count"])
+
+    def record_turn(self, session, topic, answer):
+        """ Appends an exchange to the stored history, as GuideSessionStore.record_turn does in memory. """
+        conn = self._connect()
+        with conn:
+            # Takes the write lock before reading, so turns recorded by other workers are not lost
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT history FROM guide_sessions WHERE id = ?", (session.id,)).fetchone()
+            if row is not None:
+                history = json.loads(row["history"])
+                session.load_history(history["turns"], history["dropped_topics"], history["turn_count"])
+            dropped = session.add_turn(topic, answer, self.max_turns, self.answer_chars)
+            if row is not None:
+                conn.execute(
+                    "UPDATE guide_sessions SET history = ?, last_used = ?, size = ? WHERE id = ?",
+                    (self._history(session), time.time(), session.size_bytes(), session.id),
+                )
+                self._evict(conn)
+        with self._lock:
+            self._stats["messages"] += 1
+            self._stats["truncated_turns"] += dropped
+
+    def stats(self):
+        with self._connect() as conn:
+            self._evict(conn)
+            sessions, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM guide_sessions").fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats["sessions"] = sessions
+        stats["bytes"] = size
+        stats["max_sessions"] = self.max_sessions
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+def create_guide_session_store():
+    """
+    Builds the session store from GUIDE_SESSION_* environment variables: shared
+    SQLite (GUIDE_SESSION_DB, default guide_sessions.db), or process memory when
+    GUIDE_SESSION_DB is empty.
+    """
+    settings = dict(
+        max_sessions=int(os.getenv("GUIDE_SESSION_MAX", "1000")),
+        max_bytes=int(float(os.getenv("GUIDE_SESSION_MAX_MB", "32")) * 1024 * 1024),
+        idle_timeout=float(os.getenv("GUIDE_SESSION_IDLE_TIMEOUT", "1800")),
+        max_turns=int(os.getenv("GUIDE_SESSION_MAX_TURNS", "4")),
+        answer_chars=int(os.getenv("GUIDE_SESSION_ANSWER_CHARS", "1200")),
+    )
+    db_path = os.getenv("GUIDE_SESSION_DB", "guide_sessions.db")
+    if not db_path:
+        return GuideSessionStore(**settings)
+    return SQLiteGuideSessionStore(db_path, **settings)
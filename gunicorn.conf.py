@@ -0,0 +1,53 @@
+"""
+Production server settings.
+
+    gunicorn -c gunicorn.conf.py
+
+Requests spend almost all of their time waiting on Gemini, so each worker runs
+many threads and the worker count stays small: caches, request coalescing and
+admission limits are per process, and fewer, larger workers share them better.
+Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "app:app"
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+# "gthread" (default) or "gevent" (pip install gevent)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 4))))
+# Matches the default ADMISSION_MAX_IN_FLIGHT so admission control, not the thread pool, decides what waits
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# Longer than the 90s itinerary deadline, so Gemini calls time out before the worker is killed
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# grpc is not fork-safe, so the app is imported in each worker rather than in the master
+preload_app = False
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+
+WARMUP = os.getenv("GUNICORN_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+def post_worker_init(worker):
+    """
+    Prepares grpc for gevent, loads the Google client libraries and models, and
+    resumes itinerary jobs left by a previous worker before the worker accepts requests.
+    """
+    if worker_class == "gevent":
+        # Lets grpc calls cooperate with gevent's event loop instead of blocking it. Must run after
+        # gunicorn's gevent worker has monkey-patched the stdlib, which happens after post_fork.
+        from grpc.experimental import gevent as grpc_gevent
+
+        grpc_gevent.init_gevent()
+    import app
+
+    if WARMUP:
+        app.warmup()
+    app.job_queue.recover()
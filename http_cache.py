@@ -0,0 +1,270 @@
+"""
+HTTP caching for the idempotent GET endpoints.
+
+- strong ETags from a hash of the response payload, and 304 Not Modified when
+  If-None-Match matches
+- per-endpoint Cache-Control (max-age, stale-while-revalidate, stale-if-error)
+  so CDNs and the mobile client can reuse responses
+- stale-while-revalidate on the server too: an expired response cache entry
+  inside the window is served at once and refreshed in the background
+- gzip, or brotli when the optional Brotli package is installed, for large bodies
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Response, jsonify
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install Brotli
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/plain", "text/markdown", "text/html", "text/css")
+
+
+def payload_etag(payload):
+    """ Strong ETag for a JSON payload, independent of how Flask serializes it. """
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return '"' + hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of an If-None-Match header against an ETag (RFC 9110).
+
+    Compressed responses carry the encoding as an ETag suffix ("<hash>-gzip"),
+    so those validators match the uncompressed ETag too.
+    """
+    if not if_none_match:
+        return False
+    opaque = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"').split("-", 1)[0] == opaque:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding):
+    """ Picks "br" or "gzip" from an Accept-Encoding header, or None for identity. """
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def encoded_etag(etag, encoding):
+    """ Each encoding is a different representation, so it gets its own strong ETag. """
+    opaque = etag.strip('"')
+    return f'"{opaque}-{encoding}"'
+
+
+class HttpCachePolicy:
+    """
+    Args:
+        max_age: Seconds clients and CDNs may reuse a response without revalidating
+        stale_while_revalidate: Seconds after max_age a stale response may be served
+            while it is refreshed (also applied to the server-side response cache)
+        stale_if_error: Seconds after max_age a stale response may be served when refreshing fails
+        public: Allow shared caches (CDNs) to store the response
+    """
+
+    def __init__(self, max_age=0, stale_while_revalidate=0, stale_if_error=0, public=True):
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.public = public
+
+    @classmethod
+    def from_env(cls, endpoint, max_age, stale_while_revalidate, stale_if_error):
+        prefix = f"HTTP_CACHE_{endpoint.upper()}_"
+        return cls(
+            max_age=int(os.getenv(prefix + "MAX_AGE", max_age)),
+            stale_while_revalidate=int(os.getenv(prefix + "SWR", stale_while_revalidate)),
+            stale_if_error=int(os.getenv(prefix + "STALE_IF_ERROR", stale_if_error)),
+            public=os.getenv(prefix + "PUBLIC", "1").lower() not in ("0", "false", "no"),
+        )
+
+    def cache_control(self):
+        if self.max_age <= 0:
+            return "no-cache"
+        parts = ["public" if self.public else "private", f"max-age={self.max_age}"]
+        if self.stale_while_revalidate:
+            parts.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        if self.stale_if_error:
+            parts.append(f"stale-if-error={self.stale_if_error}")
+        return ", ".join(parts)
+
+
+class HttpCache:
+    """
+    Builds cacheable responses and compresses large bodies.
+
+    Args:
+        policies: Mapping of endpoint name to HttpCachePolicy
+        min_compress_bytes: Smallest body worth compressing
+        gzip_level: gzip compression level (1-9)
+        brotli_quality: brotli quality (0-11)
+        refresh_workers: Threads refreshing stale entries in the background
+    """
+
+    def __init__(self, policies, min_compress_bytes=1024, gzip_level=6, brotli_quality=5, refresh_workers=2):
+        self.policies = policies
+        self.min_compress_bytes = min_compress_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._default_policy = HttpCachePolicy()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="http-refresh")
+        self._pending_refreshes = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            "responses": 0, "not_modified": 0, "stale_served": 0, "refreshes": 0, "refresh_errors": 0,
+            "compressed_gzip": 0, "compressed_br": 0, "bytes_before_compression": 0, "bytes_after_compression": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def policy(self, endpoint):
+        return self.policies.get(endpoint, self._default_policy)
+
+    def validate(self, endpoint, payload, if_none_match=None, stale=False, cacheable=True):
+        """
+        Returns (not_modified, headers) with the ETag and Cache-Control for ``payload``.
+
+        Responses that must not be reused, such as cache bypasses or answers
+        still missing part of their content, pass ``cacheable=False`` and get no-store.
+        """
+        etag = payload_etag(payload)
+        not_modified = etag_matches(if_none_match, etag)
+        self._count("not_modified" if not_modified else "responses")
+        if stale:
+            self._count("stale_served")
+        headers = {
+            'ETag': etag,
+            'Cache-Control': self.policy(endpoint).cache_control() if cacheable else "no-store",
+            'Vary': 'Accept-Encoding',
+        }
+        return not_modified, headers
+
+    def respond(self, endpoint, payload, if_none_match=None, stale=False, cacheable=True, accept_encoding=None):
+        """ JSON response for ``payload`` with ETag and Cache-Control, or 304 when the client's copy matches. """
+        not_modified, headers = self.validate(endpoint, payload, if_none_match, stale, cacheable)
+        body = jsonify(payload)
+        if not_modified:
+            # compress() only sees the 200; the 304 carries the ETag of the representation it would have sent
+            headers['ETag'] = self.representation_etag(headers['ETag'], len(body.get_data()), accept_encoding)
+        response = Response(status=304) if not_modified else body
+        response.headers['ETag'] = headers['ETag']
+        response.headers['Cache-Control'] = headers['Cache-Control']
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def representation_etag(self, etag, body_size, accept_encoding):
+        """ ETag of the representation encode() picks for a body of ``body_size`` bytes. """
+        encoding = self.negotiate(body_size, accept_encoding)
+        return etag if encoding is None else encoded_etag(etag, encoding)
+
+    def schedule_refresh(self, key, refresh):
+        """ Runs ``refresh()`` in the background unless a refresh for ``key`` is already running. """
+        with self._lock:
+            if key in self._pending_refreshes:
+                return
+            self._pending_refreshes.add(key)
+
+        def run():
+            try:
+                result = refresh()
+                if isinstance(result, dict) and "error" in result:
+                    self._count("refresh_errors")
+                else:
+                    self._count("refreshes")
+            except Exception as e:
+                logging.error(f"Background refresh failed: {str(e)}")
+                self._count("refresh_errors")
+            finally:
+                with self._lock:
+                    self._pending_refreshes.discard(key)
+
+        self._refresh_executor.submit(run)
+
+    def compress(self, response, accept_encoding):
+        """ Compresses a large, complete JSON or text response if the client accepts it. """
+        if (response.is_streamed or response.direct_passthrough or response.status_code != 200
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        body, encoding = self.encode(response.get_data(), accept_encoding)
+        if encoding is None:
+            return response
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        etag = response.headers.get('ETag')
+        if etag:
+            response.headers['ETag'] = encoded_etag(etag, encoding)
+        return response
+
+    def negotiate(self, body_size, accept_encoding):
+        """ Encoding for a body of ``body_size`` bytes, or None when it is sent uncompressed. """
+        if body_size < self.min_compress_bytes:
+            return None
+        return negotiate_encoding(accept_encoding)
+
+    def encode(self, body, accept_encoding):
+        """ Returns (body, encoding): the compressed body, or the body unchanged and None. """
+        encoding = self.negotiate(len(body), accept_encoding)
+        if encoding is None:
+            return body, None
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        self._count(f"compressed_{encoding}")
+        self._count("bytes_before_compression", len(body))
+        self._count("bytes_after_compression", len(compressed))
+        return compressed, encoding
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_refreshes"] = len(self._pending_refreshes)
+        stats["brotli_available"] = brotli is not None
+        return stats
+
+
+def create_http_cache():
+    """ Builds HTTP cache policies and compression settings from HTTP_* environment variables. """
+    policies = {
+        "guide": HttpCachePolicy.from_env("guide", max_age=3600, stale_while_revalidate=86400, stale_if_error=86400),
+        "gems": HttpCachePolicy.from_env("gems", max_age=3600, stale_while_revalidate=86400, stale_if_error=86400),
+    }
+    return HttpCache(
+        policies,
+        min_compress_bytes=int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024")),
+        gzip_level=int(os.getenv("HTTP_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("HTTP_BROTLI_QUALITY", "5")),
+    )
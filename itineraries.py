@@ -0,0 +1,350 @@
+"""
+Structured itineraries for incremental editing.
+
+Generated itinerary markdown is split into a preamble, one section per day and
+closing notes, and stored under a stable id. Single days (or ranges) can then be
+regenerated and merged back without asking Gemini for the whole trip again.
+Rendering an unmodified itinerary reproduces the original text exactly.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+# "Day 3: ...", "## Day 3 - ...", "**Day 3:** ...", "Days 6-7: ..."
+DAY_HEADING_RE = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*|__)?[ \t]*Days?[ \t]+(\d+)(?:[ \t]*(?:-|–|—|to|&)[ \t]*(\d+))?\b.*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_EPILOGUE_TOPICS = (
+    r"(?:Accommodation|Transport(?:ation)?|Getting Around|Budget|Total|Estimated|Notes?|Tips|Important|"
+    r"General Tips|Packing)\b"
+)
+# Closing sections that follow the last day rather than belonging to it: a markdown heading
+# ("## Budget") or a bold line on its own after a blank line ("**Accommodation:**"). Bullets such
+# as "- **Estimated Cost for the day:** ₹4,000" belong to the day and never match.
+EPILOGUE_RE = re.compile(
+    r"^(?P<heading>[ \t]*#{1,6}[ \t]*(?:\*\*|__)?[ \t]*" + _EPILOGUE_TOPICS + r"[^\n]*)$"
+    r"|^[ \t]*\n(?P<bold>[ \t]*(?:\*\*|__)[ \t]*" + _EPILOGUE_TOPICS + r"[^*_\n]*(?:\*\*|__)[ \t]*:?[ \t]*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+COST_RE = re.compile(
+    r"(?:₹|Rs\.?|INR|\$|€|£)[ \t]?\d[\d,]*(?:\.\d+)?(?:[ \t]?(?:-|–|to)[ \t]?(?:₹|Rs\.?)?[ \t]?\d[\d,]*)?"
+    r"|\d[\d,]*(?:\.\d+)?(?:[ \t]?(?:-|–|to)[ \t]?\d[\d,]*)?[ \t]?(?:INR|rupees|USD)\b",
+    re.IGNORECASE,
+)
+MEAL_RE = re.compile(r"\b(?:breakfast|brunch|lunch|dinner|snack|eat|dine|restaurant|cafe|café|dhaba|thali)\b", re.IGNORECASE)
+EATERY_RE = re.compile(
+    r"\*\*([^*\n]{2,60})\*\*"
+    r"|\b(?:at|try|visit)[ \t]+(?:the[ \t]+)?((?:[A-Z][\w'&.-]*)(?:[ \t]+(?:[A-Z][\w'&.-]*|of|de|ki|ka|la))*)"
+)
+BULLET_RE = re.compile(r"^[ \t]*(?:[-*•]|\d+[.)])[ \t]+")
+
+
+class ItineraryDay:
+    """
+    One day of an itinerary.
+
+    Args:
+        number: First day number covered by this section
+        heading: The heading line as written (e.g. "Day 3: Udaipur - City Palace")
+        body: Everything after the heading up to the next section, verbatim
+        end_number: Last day number for combined sections such as "Days 6-7"
+    """
+
+    def __init__(self, number, heading, body, end_number=None):
+        self.number = number
+        self.heading = heading
+        self.body = body
+        self.end_number = end_number or number
+
+    @property
+    def markdown(self):
+        return self.heading + self.body
+
+    @property
+    def title(self):
+        """ Heading text without markdown markers and the "Day N" prefix. """
+        text = re.sub(r"[#*_]", "", self.heading).strip()
+        text = re.sub(r"^Days?\s+\d+(?:\s*(?:-|–|—|to|&)\s*\d+)?\s*[:.\-–—]?\s*", "", text, flags=re.IGNORECASE)
+        return text
+
+    @property
+    def activities(self):
+        activities = []
+        for line in self.body.splitlines():
+            text = BULLET_RE.sub("", line).replace("**", "").strip()
+            if text:
+                activities.append(text)
+        return activities
+
+    @property
+    def costs(self):
+        costs = []
+        for activity in self.activities:
+            for match in COST_RE.finditer(activity):
+                costs.append({"amount": match.group(0).strip(), "activity": activity})
+        return costs
+
+    @property
+    def eateries(self):
+        eateries = []
+        for line in self.body.splitlines():
+            if not MEAL_RE.search(line):
+                continue
+            for match in EATERY_RE.finditer(line):
+                name = (match.group(1) or match.group(2) or "").strip()
+                # Skip bold labels such as "**Lunch:**"
+                if not name or name.endswith(":") or MEAL_RE.fullmatch(name.lower()):
+                    continue
+                name = name.strip(" .,")
+                if name not in eateries:
+                    eateries.append(name)
+        return eateries
+
+    def to_dict(self):
+        return {
+            "day": self.number,
+            "end_day": self.end_number,
+            "title": self.title,
+            "activities": self.activities,
+            "costs": self.costs,
+            "eateries": self.eateries,
+            "markdown": self.markdown,
+        }
+
+    def to_record(self):
+        return {"number": self.number, "end_number": self.end_number, "heading": self.heading, "body": self.body}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["number"], record["heading"], record["body"], record.get("end_number"))
+
+
+class Itinerary:
+    """
+    A parsed itinerary: free text before the first day, the days, and closing notes.
+
+    Args:
+        preamble: Text before the first day heading
+        days: List of ItineraryDay in order
+        epilogue: Closing notes after the last day (accommodation, transport, ...)
+    """
+
+    def __init__(self, preamble, days, epilogue=""):
+        self.preamble = preamble
+        self.days = days
+        self.epilogue = epilogue
+
+    @classmethod
+    def parse(cls, markdown):
+        """ Splits itinerary markdown into days; text without day headings becomes the preamble. """
+        headings = list(DAY_HEADING_RE.finditer(markdown))
+        if not headings:
+            return cls(markdown, [])
+
+        days = []
+        for index, match in enumerate(headings):
+            end = headings[index + 1].start() if index + 1 < len(headings) else len(markdown)
+            number = int(match.group(1))
+            end_number = int(match.group(2)) if match.group(2) else number
+            days.append(ItineraryDay(number, match.group(0), markdown[match.end():end], max(end_number, number)))
+
+        epilogue = ""
+        last = days[-1]
+        closing = EPILOGUE_RE.search(last.body)
+        if closing:
+            # Keep the newline ending the day's last line (and a blank line before a bold heading) with the day
+            split = closing.start(closing.lastgroup)
+            last.body, epilogue = last.body[:split], last.body[split:]
+        return cls(markdown[:headings[0].start()], days, epilogue)
+
+    @property
+    def markdown(self):
+        return self.preamble + "".join(day.markdown for day in self.days) + self.epilogue
+
+    def day_numbers(self):
+        return [day.number for day in self.days]
+
+    def days_in_range(self, start_day, end_day):
+        return [day for day in self.days if start_day <= day.number <= end_day]
+
+    def outline(self):
+        """ One line per day, used as compact context when regenerating other days. """
+        return "\n".join(
+            f"Day {day.number}{f'-{day.end_number}' if day.end_number != day.number else ''}: {day.title}"
+            for day in self.days
+        )
+
+    def replace_days(self, new_days):
+        """ Returns a copy with days of matching numbers replaced by ``new_days``. """
+        replacements = {day.number: day for day in new_days}
+        days = []
+        for day in self.days:
+            new_day = replacements.get(day.number)
+            if new_day is None:
+                days.append(day)
+                continue
+            body = new_day.body
+            # Keep the separation to the following section the original text had
+            trailing = day.body[len(day.body.rstrip("\n")):]
+            days.append(ItineraryDay(day.number, new_day.heading, body.rstrip("\n") + trailing, day.end_number))
+        return Itinerary(self.preamble, days, self.epilogue)
+
+    def to_dict(self):
+        return {
+            "itinerary": self.markdown,
+            "days": [day.to_dict() for day in self.days],
+        }
+
+    def to_record(self):
+        return {"preamble": self.preamble, "days": [day.to_record() for day in self.days], "epilogue": self.epilogue}
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["preamble"], [ItineraryDay.from_record(day) for day in record["days"]], record["epilogue"])
+
+
+class VersionConflictError(Exception):
+    """ Raised when an itinerary changed between reading and saving an edit. """
+
+
+class ItineraryStore:
+    """
+    SQLite-backed structured itineraries with expiry. The file and table are created on first use.
+
+    Each record has a stable id and a version that increases on every edit;
+    updates only apply to the version they were based on. Records created with
+    a response cache key are reused for the same key and text until edited.
+    """
+
+    def __init__(self, path, ttl=604800, purge_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "regenerations": 0, "days_regenerated": 0, "conflicts": 0}
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._create_schema(conn)
+        return conn
+
+    def _create_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS itineraries ("
+                    "id TEXT PRIMARY KEY, params TEXT NOT NULL, data TEXT NOT NULL, version INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL, cache_key TEXT)"
+                )
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(itineraries)")}
+                if "cache_key" not in columns:
+                    conn.execute("ALTER TABLE itineraries ADD COLUMN cache_key TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS itineraries_cache_key ON itineraries (cache_key)")
+                conn.execute("CREATE INDEX IF NOT EXISTS itineraries_expires_at ON itineraries (expires_at)")
+            self._schema_ready = True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _purge_due(self, now):
+        """ True at most once per purge_interval; expired rows are already hidden from reads. """
+        with self._lock:
+            if now < self._next_purge:
+                return False
+            self._next_purge = now + self.purge_interval
+            return True
+
+    def create(self, params, itinerary, cache_key=None):
+        """
+        Stores an itinerary and returns its id.
+
+        With ``cache_key``, an unedited record for the same key and text is
+        reused (and its expiry extended), so response cache hits do not add rows.
+        """
+        data = json.dumps(itinerary.to_record(), ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            if self._purge_due(now):
+                conn.execute("DELETE FROM itineraries WHERE expires_at < ?", (now,))
+            if cache_key is not None:
+                row = conn.execute(
+                    "SELECT id FROM itineraries WHERE cache_key = ? AND version = 1 AND data = ? AND expires_at >= ?",
+                    (cache_key, data, now),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE itineraries SET expires_at = ? WHERE id = ?", (now + self.ttl, row["id"]))
+                    self._count("reused")
+                    return row["id"]
+            itinerary_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO itineraries (id, params, data, version, created_at, updated_at, expires_at, cache_key) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?, ?)",
+                (itinerary_id, json.dumps(params, ensure_ascii=False), data, now, now, now + self.ttl, cache_key),
+            )
+        self._count("created")
+        return itinerary_id
+
+    def get(self, itinerary_id):
+        row = self._connect().execute(
+            "SELECT * FROM itineraries WHERE id = ? AND expires_at >= ?", (itinerary_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "params": json.loads(row["params"]),
+            "itinerary": Itinerary.from_record(json.loads(row["data"])),
+            "version": row["version"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def update(self, itinerary_id, itinerary, expected_version, days_changed=0):
+        """ Saves an edit made to ``expected_version``; raises VersionConflictError if it is stale. """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE itineraries SET data = ?, version = version + 1, updated_at = ?, expires_at = ? "
+                "WHERE id = ? AND version = ?",
+                (json.dumps(itinerary.to_record(), ensure_ascii=False), now, now + self.ttl,
+                 itinerary_id, expected_version),
+            )
+        if cursor.rowcount != 1:
+            self._count("conflicts")
+            raise VersionConflictError(f"Itinerary {itinerary_id} was modified concurrently")
+        self._count("regenerations")
+        self._count("days_regenerated", days_changed)
+        return expected_version + 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["stored"] = self._connect().execute(
+            "SELECT COUNT(*) FROM itineraries WHERE expires_at >= ?", (time.time(),)
+        ).fetchone()[0]
+        return stats
+
+
+def create_itinerary_store():
+    """ Builds the itinerary store from ITINERARY_* environment variables. """
+    return ItineraryStore(
+        os.getenv("ITINERARY_STORE_DB", "itineraries.db"),
+        ttl=int(os.getenv("ITINERARY_TTL", "604800")),
+    )
@@ -0,0 +1,293 @@
+"""
+Asynchronous job execution for long-running generations.
+
+Jobs are persisted in SQLite so status and results survive a worker restart,
+and executed by a bounded thread pool. Submissions beyond the queue limit are
+rejected so callers can back off instead of piling up work.
+
+The SQLite file is only created on first use, and jobs left behind by a
+previous worker are only picked up when a serving worker calls
+JobQueue.recover(), so importing the app (CLI, asgi.py, benchmarks) has no
+effect on the job store.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """ Raised when a job is submitted while the queue is at capacity. """
+
+
+class JobStore:
+    """
+    SQLite-backed job records with expiry. The file and table are created on first use.
+
+    Args:
+        path: SQLite file
+        ttl: Seconds a job and its result are kept
+        purge_interval: Minimum seconds between deletions of expired jobs
+    """
+
+    def __init__(self, path, ttl=86400, purge_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._create_schema(conn)
+        return conn
+
+    def _create_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                    "params TEXT NOT NULL, result TEXT, error TEXT, "
+                    "created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+                conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+            self._schema_ready = True
+
+    def create(self, kind, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_QUEUED, json.dumps(params, ensure_ascii=False), now, now + self.ttl),
+            )
+        return job_id
+
+    def claim(self, job_id):
+        """ Atomically moves a queued job to running; False if another worker got it first. """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (JOB_RUNNING, time.time(), job_id, JOB_QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, result=None, error=None):
+        now = time.time()
+        status = JOB_FAILED if error else JOB_SUCCEEDED
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, now, now + self.ttl, job_id),
+            )
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE id = ? AND expires_at >= ?", (job_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def ids_with_status(self, status):
+        rows = self._connect().execute(
+            "SELECT id FROM jobs WHERE status = ? AND expires_at >= ? ORDER BY created_at", (status, time.time())
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def fail_stale_running(self, older_than):
+        """ Marks jobs left running by a dead worker as failed. """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND started_at < ?",
+                (JOB_FAILED, "Job interrupted by a worker restart", time.time(), JOB_RUNNING, older_than),
+            )
+        return cursor.rowcount
+
+    def purge_expired(self, force=False):
+        """ Deletes expired jobs, at most once per purge_interval unless ``force`` is set. """
+        now = time.time()
+        with self._purge_lock:
+            if not force and now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+
+
+class JobQueue:
+    """
+    Bounded worker pool that executes persisted jobs.
+
+    Args:
+        store: JobStore holding job records
+        handlers: Mapping of job kind to a callable taking the job params as keywords
+            and returning a result dict (a dict with "error" marks the job failed)
+        max_workers: Pool size
+        max_pending: Maximum queued + running jobs accepted by this process
+        stale_after: Seconds after which a running job is considered abandoned by a dead worker and
+            failed; must exceed the longest a job can run (its Gemini deadline)
+        sweep_interval: Minimum seconds between checks for abandoned jobs on submit and poll
+    """
+
+    def __init__(self, store, handlers, max_workers=4, max_pending=100, stale_after=600, sweep_interval=60):
+        self.store = store
+        self.handlers = handlers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._latencies = deque(maxlen=500)
+        self._stats = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+        self.max_workers = max_workers
+        self.stale_after = stale_after
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+    def recover(self):
+        """
+        Fails jobs a dead worker left running for longer than stale_after and
+        resumes queued ones. Call once from the serving worker's startup hook
+        (gunicorn post_worker_init or the development server), never on import:
+        other processes importing the app must not touch jobs a running server
+        is still processing. A resumed job another worker already claimed is skipped.
+        Jobs that become stale later are failed by the sweep in submit() and get().
+        """
+        self._fail_stale(force=True)
+        for job_id in self.store.ids_with_status(JOB_QUEUED):
+            job = self.store.get(job_id)
+            if job is not None:
+                logging.info(f"Resuming queued job {job_id}")
+                self._enqueue(job_id, job["kind"], job["params"])
+
+    def submit(self, kind, params):
+        """ Persists and enqueues a job; raises QueueFullError when at capacity. """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise QueueFullError("Job queue is full")
+            self._pending += 1
+            self._stats["submitted"] += 1
+        try:
+            self.store.purge_expired()
+            self._fail_stale()
+            job_id = self.store.create(kind, params)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        self._executor.submit(self._run, job_id, kind, params)
+        return job_id
+
+    def get(self, job_id):
+        """ Job record for polling, or None; a job abandoned by a dead worker is reported as failed. """
+        self._fail_stale()
+        return self.store.get(job_id)
+
+    def _fail_stale(self, force=False):
+        """
+        Fails running jobs started more than stale_after ago, at most once per
+        sweep_interval unless ``force`` is set. A job claimed by a worker that
+        died shortly before a restart is caught here rather than left running
+        until it expires.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now < self._next_sweep:
+                return
+            self._next_sweep = now + self.sweep_interval
+        failed = self.store.fail_stale_running(now - self.stale_after)
+        if failed:
+            logging.warning(f"Marked {failed} interrupted job(s) as failed")
+
+    def _enqueue(self, job_id, kind, params):
+        with self._lock:
+            self._pending += 1
+        self._executor.submit(self._run, job_id, kind, params)
+
+    def _run(self, job_id, kind, params):
+        try:
+            if not self.store.claim(job_id):
+                return
+            with self._lock:
+                self._running += 1
+            started = time.perf_counter()
+            error = None
+            result = None
+            try:
+                result = self.handlers[kind](**params)
+                if isinstance(result, dict) and "error" in result:
+                    error = result["error"]
+                    result = None
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {str(e)}")
+                error = f"Error: {str(e)}"
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._latencies.append(time.perf_counter() - started)
+            self.store.finish(job_id, result=result, error=error)
+            with self._lock:
+                self._stats[JOB_FAILED if error else JOB_SUCCEEDED] += 1
+        except Exception as e:
+            logging.error(f"Job {job_id} could not be recorded: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["running"] = self._running
+            stats["queue_depth"] = self._pending - self._running
+            latencies = sorted(self._latencies)
+        stats["max_workers"] = self.max_workers
+        stats["max_pending"] = self.max_pending
+        if latencies:
+            stats["latency_avg_ms"] = round(sum(latencies) / len(latencies) * 1000, 1)
+            stats["latency_p95_ms"] = round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1)
+        return stats
+
+
+def create_job_queue(handlers):
+    """ Builds the job store and worker pool from JOB_* environment variables. """
+    store = JobStore(
+        os.getenv("JOB_STORE_DB", "jobs.db"),
+        ttl=int(os.getenv("JOB_TTL", "86400")),
+    )
+    return JobQueue(
+        store,
+        handlers,
+        max_workers=int(os.getenv("JOB_WORKERS", "4")),
+        max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+        stale_after=int(os.getenv("JOB_STALE_AFTER", "600")),
+    )
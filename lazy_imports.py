@@ -0,0 +1,38 @@
+"""
+Deferred imports for the Google client libraries.
+
+google.generativeai and google.api_core pull in grpc and protobuf and take
+about a second to import. Modules reference them through lazy_module() proxies
+instead, so a worker boots quickly and pays that cost on the first Gemini call
+(or in an explicit warmup) rather than at import time.
+"""
+import importlib
+
+
+class LazyModule:
+    """ Stands in for a module and imports it on first attribute access. """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        """ Imports the module now (no-op once loaded) and returns it. """
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
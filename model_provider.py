@@ -0,0 +1,116 @@
+"""
+Shared Gemini model provider.
+
+Configures the google-generativeai client once per process and hands out
+reusable GenerativeModel instances keyed by model name, generation config and
+system instruction, so request handlers never mutate global library state or
+rebuild models. Token usage reported by each response is logged and totalled
+per endpoint.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from lazy_imports import lazy_module
+
+# Imported on first configure()/get_model() call; see lazy_imports.py
+genai = lazy_module("google.generativeai")
+
+DEFAULT_MODEL_NAME = "gemini-1.5-pro"
+
+
+def _config_key(generation_config):
+    if not generation_config:
+        return ""
+    return json.dumps(generation_config, sort_keys=True, default=str)
+
+
+class ModelProvider:
+    """
+    Thread-safe registry of configured GenerativeModel instances.
+
+    Args:
+        api_key: API key used for genai.configure
+        default_model: Model used when an endpoint has no override
+        endpoint_models: Mapping of endpoint name (itinerary, guide, gems) to model name
+    """
+
+    def __init__(self, api_key, default_model=DEFAULT_MODEL_NAME, endpoint_models=None):
+        self.api_key = api_key
+        self.default_model = default_model
+        self.endpoint_models = dict(endpoint_models or {})
+        self._models = {}
+        self._usage = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, api_key):
+        """ Reads GEMINI_MODEL and GEMINI_MODEL_<ENDPOINT> overrides from the environment. """
+        endpoint_models = {}
+        for endpoint in ("itinerary", "guide", "gems"):
+            model_name = os.getenv(f"GEMINI_MODEL_{endpoint.upper()}")
+            if model_name:
+                endpoint_models[endpoint] = model_name
+        return cls(api_key, os.getenv("GEMINI_MODEL", DEFAULT_MODEL_NAME), endpoint_models)
+
+    def configure(self):
+        """ Configures the client library once; later calls are no-ops. """
+        if self._configured:
+            return
+        with self._lock:
+            if not self._configured:
+                genai.configure(api_key=self.api_key)
+                self._configured = True
+                logging.info("Gemini client configured")
+
+    def model_name_for(self, endpoint=None):
+        return self.endpoint_models.get(endpoint, self.default_model)
+
+    def get_model(self, model_name=None, generation_config=None, system_instruction=None):
+        """ Returns a shared GenerativeModel for the given name, generation config and system instruction. """
+        self.configure()
+        model_name = model_name or self.default_model
+        instruction_key = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest() if system_instruction else ""
+        key = (model_name, _config_key(generation_config), instruction_key)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(
+                        model_name,
+                        generation_config=generation_config,
+                        system_instruction=system_instruction,
+                    )
+                    self._models[key] = model
+        return model
+
+    def model_for(self, endpoint, generation_config=None, system_instruction=None):
+        """ Returns the shared model configured for an API endpoint. """
+        return self.get_model(self.model_name_for(endpoint), generation_config, system_instruction)
+
+    def record_usage(self, endpoint, response):
+        """ Logs and totals the input/output token counts reported for one call. """
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        input_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        logging.info(f"Gemini usage for {endpoint}: {input_tokens} input tokens, {output_tokens} output tokens")
+        with self._lock:
+            totals = self._usage.setdefault(endpoint, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+
+    def usage_stats(self):
+        """ Per-endpoint token totals with average input/output tokens per call. """
+        with self._lock:
+            stats = {endpoint: dict(totals) for endpoint, totals in self._usage.items()}
+        for totals in stats.values():
+            totals["avg_input_tokens"] = round(totals["input_tokens"] / totals["calls"], 1)
+            totals["avg_output_tokens"] = round(totals["output_tokens"] / totals["calls"], 1)
+        return stats
@@ -0,0 +1,390 @@
+"""
+Near-duplicate query matching for the response cache.
+
+Exact cache keys miss paraphrased requests ("beaches, food" vs "food and
+beaches", "mt abu" vs "Mount Abu"). Each request is reduced to:
+- a block of fields that must agree exactly (kind, canonical location,
+  duration or style)
+- a set of canonical tokens from the free-text fields (stopwords dropped,
+  plurals folded, synonyms mapped, negations kept as "no_<word>")
+
+Requests whose token sets are identical after canonicalization share an
+answer through a dict lookup. Otherwise MinHash signatures over the token
+sets are banded into an LSH table, so only a handful of candidates in the
+same block are compared, and the best one at or above the Jaccard threshold
+is reused. The index lives in process memory and is bounded by entry count.
+"""
+import hashlib
+import os
+import random
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+from gems_catalog import normalize_location
+
+# Which parameters must match exactly and which are compared as token sets
+QUERY_FIELDS = {
+    "itinerary": {"exact": ("location", "duration"), "similar": ("interests", "other_prefs")},
+    "guide": {"exact": ("location", "style"), "similar": ("topic",)},
+    "gems": {"exact": ("location",), "similar": ("preferences",)},
+}
+
+STOPWORDS = frozenset((
+    "a", "an", "and", "the", "of", "in", "on", "at", "to", "for", "with", "some", "lots", "lot", "plenty",
+    "i", "we", "my", "our", "me", "us", "like", "love", "want", "prefer", "interested", "into", "really",
+    "very", "more", "please", "also", "things", "thing", "stuff", "places", "place", "spots", "spot",
+    "etc", "or", "about", "around", "local", "good", "best", "great", "nice", "but", "too",
+))
+NEGATIONS = frozenset(("no", "not", "without", "avoid", "non", "never"))
+
+# Canonical word for common variants of travel interests and preferences
+SYNONYMS = {
+    "foods": "food", "foodie": "food", "cuisine": "food", "cuisines": "food", "eating": "food", "eat": "food",
+    "dining": "food", "restaurant": "food", "restaurants": "food", "eatery": "food", "eateries": "food",
+    "culinary": "food", "gastronomy": "food",
+    "beaches": "beach", "seaside": "beach", "coast": "beach", "coastal": "beach",
+    "historical": "history", "historic": "history", "heritage": "history",
+    "temples": "temple", "shrine": "temple", "shrines": "temple", "mandir": "temple",
+    "trekking": "trek", "treks": "trek", "hiking": "trek", "hike": "trek", "hikes": "trek",
+    "shop": "shopping", "shops": "shopping", "markets": "shopping", "market": "shopping",
+    "bazaar": "shopping", "bazaars": "shopping",
+    "museums": "museum", "gallery": "museum", "galleries": "museum",
+    "cheap": "budget", "affordable": "budget", "inexpensive": "budget", "economical": "budget",
+    "upscale": "luxury", "luxurious": "luxury", "premium": "luxury",
+    "kids": "family", "children": "family", "child": "family", "families": "family",
+    "photo": "photography", "photos": "photography", "photographs": "photography",
+    "veg": "vegetarian", "veggie": "vegetarian",
+    "nightclub": "nightlife", "nightclubs": "nightlife", "bars": "nightlife", "pubs": "nightlife",
+    "party": "nightlife", "clubbing": "nightlife",
+    "architectural": "architecture",
+    "adventurous": "adventure", "adventures": "adventure",
+    "animals": "wildlife", "safari": "wildlife",
+    "spiritual": "spirituality", "religious": "spirituality", "pilgrimage": "spirituality",
+    "relaxing": "relaxation", "relax": "relaxation", "peaceful": "relaxation", "calm": "relaxation",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+}
+
+DURATION_UNITS = {"day": "day", "days": "day", "week": "week", "weeks": "week", "night": "night", "nights": "night"}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def _fold_plural(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def canonical_tokens(text):
+    """
+    Canonical token set of a free-text field.
+
+    "Food and beaches" and "beaches, foodie" both give {"food", "beach"};
+    "no seafood" gives {"no_seafood"} so it never matches "seafood".
+    """
+    tokens = set()
+    negate = False
+    for word in _WORD_RE.findall(str(text or "").lower()):
+        if word in NEGATIONS:
+            negate = True
+            continue
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(word) or SYNONYMS.get(_fold_plural(word)) or _fold_plural(word)
+        tokens.add(f"no_{word}" if negate else word)
+        negate = False
+    return tokens
+
+
+def _number_word(word):
+    """ Integer for "3" or "three", else None. """
+    if word.isdigit():
+        return int(word)
+    return NUMBER_WORDS.get(word)
+
+
+def canonical_duration(duration):
+    """
+    Number of days in a duration such as "3 days", "three days", "3-day" or "a week".
+
+    The number right before "day(s)" or "week(s)" is used even when the text
+    has other numbers ("10 days for 2 people" is 10). Ranges ("3-4 days") and
+    mixed units ("3 nights / 4 days") are returned as their words, so they
+    never share a block with a single day count.
+    """
+    words = _WORD_RE.findall(str(duration or "").lower())
+    as_words = " ".join(words)
+    counted = [
+        (_number_word(words[i - 1]), DURATION_UNITS[word], i)
+        for i, word in enumerate(words)
+        if word in DURATION_UNITS and i > 0 and _number_word(words[i - 1]) is not None
+    ]
+    if not counted:
+        if "weekend" in words:
+            return "2"
+        numbers = [_number_word(word) for word in words if word not in ("a", "an") and _number_word(word) is not None]
+        if len(numbers) != 1:
+            return as_words
+        days = numbers[0]
+        if any(word in ("week", "weeks") for word in words):
+            days *= 7
+        return str(days)
+    if len(counted) > 1:
+        return as_words
+    number, unit, index = counted[0]
+    if _is_range(words[:index - 1][::-1], adjacent=True) or _is_range(words[index + 1:]):
+        return as_words
+    if unit == "night":
+        return f"{number} nights"
+    return str(number * (7 if unit == "week" else 1))
+
+
+def _is_range(neighbours, adjacent=False):
+    """
+    True when the words next to a counted number, nearest first, make it a
+    range: "3-4 days" (adjacent number), "3 to 4 days" or "a day or two".
+    """
+    if adjacent and neighbours and _number_word(neighbours[0]) is not None and neighbours[0] not in ("a", "an"):
+        return True
+    return len(neighbours) > 1 and neighbours[0] in ("to", "or") and _number_word(neighbours[1]) is not None
+
+
+def lsh_bands(num_perm, threshold):
+    """
+    Picks (bands, rows) with bands * rows == num_perm for a Jaccard threshold.
+
+    Uses the most rows whose LSH cut-off (1/bands) ** (1/rows) stays well
+    below the threshold: candidates are verified exactly afterwards, so
+    recall matters more than a few extra comparisons.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold * 0.8:
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    """
+    Args:
+        num_perm: Hash functions per signature
+        seed: Seed for the hash function coefficients
+    """
+
+    def __init__(self, num_perm=32, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._coefficients = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+
+    @staticmethod
+    def _hash(token):
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def signature(self, tokens):
+        hashes = [self._hash(token) for token in tokens]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._coefficients]
+
+
+class _IndexEntry:
+    # Bucket hashes are recomputed on removal rather than stored, to keep entries small
+    __slots__ = ("block", "tokens", "canonical")
+
+    def __init__(self, block, tokens, canonical):
+        self.block = block
+        self.tokens = tokens
+        self.canonical = canonical
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index from canonicalized request parameters to cache keys.
+
+    Args:
+        threshold: Minimum Jaccard similarity of the token sets for a match
+        num_perm: MinHash functions per signature (more is more accurate and uses more memory)
+        max_entries: Cache keys kept before the least recently added is dropped
+        location_resolver: Maps a location to its canonical form (defaults to normalize_location)
+    """
+
+    def __init__(self, threshold=0.8, num_perm=32, max_entries=50000, location_resolver=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.location_resolver = location_resolver or normalize_location
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()
+        self._canonical = {}
+        # Bucket hash -> one cache key, or a list of keys when several share the bucket
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "lookups": 0, "hits": 0, "canonical_hits": 0, "similar_hits": 0, "misses": 0,
+            "candidates_checked": 0, "below_threshold": 0, "stale_keys": 0, "indexed": 0, "evicted": 0,
+        }
+
+    def canonicalize(self, kind, params):
+        """ Returns (block, tokens) for already-normalized request parameters. """
+        fields = QUERY_FIELDS[kind]
+        block = [kind]
+        for name in fields["exact"]:
+            value = params.get(name, "")
+            if name == "location":
+                value = self.location_resolver(value)
+            elif name == "duration":
+                value = canonical_duration(value)
+            # Interned so entries sharing a location or token share the strings
+            block.append(sys.intern(value))
+        tokens = frozenset(
+            sys.intern(f"{name}:{token}") for name in fields["similar"] for token in canonical_tokens(params.get(name, ""))
+        )
+        return tuple(block), tokens
+
+    def _bucket_hashes(self, block, tokens):
+        if not tokens:
+            return ()
+        signature = self._hasher.signature(tokens)
+        return tuple(
+            hash((block, band) + tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        )
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if self._canonical.get(entry.canonical) == key:
+            del self._canonical[entry.canonical]
+        for bucket in self._bucket_hashes(entry.block, entry.tokens):
+            members = self._buckets.get(bucket)
+            if members == key:
+                del self._buckets[bucket]
+            elif isinstance(members, list) and key in members:
+                members.remove(key)
+                if len(members) == 1:
+                    self._buckets[bucket] = members[0]
+
+    def add(self, kind, params, key):
+        """ Indexes the cache key of a stored generation. """
+        if kind not in QUERY_FIELDS:
+            return
+        block, tokens = self.canonicalize(kind, params)
+        canonical = hash((block, tuple(sorted(tokens))))
+        buckets = self._bucket_hashes(block, tokens)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _IndexEntry(block, tokens, canonical)
+            self._canonical[canonical] = key
+            for bucket in buckets:
+                members = self._buckets.get(bucket)
+                if members is None:
+                    self._buckets[bucket] = key
+                elif isinstance(members, list):
+                    members.append(key)
+                else:
+                    self._buckets[bucket] = [members, key]
+            self._stats["indexed"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _candidates(self, block, tokens, canonical):
+        """ Cache keys to try, best first: the canonical twin, then LSH candidates by similarity. """
+        buckets = self._bucket_hashes(block, tokens)
+        with self._lock:
+            twin = self._canonical.get(canonical)
+            if twin is not None:
+                return [(twin, 1.0)]
+            keys = set()
+            for bucket in buckets:
+                members = self._buckets.get(bucket)
+                if isinstance(members, list):
+                    keys.update(members)
+                elif members is not None:
+                    keys.add(members)
+            scored = []
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry.block != block:
+                    continue
+                self._stats["candidates_checked"] += 1
+                similarity = len(tokens & entry.tokens) / len(tokens | entry.tokens)
+                if similarity >= self.threshold:
+                    scored.append((key, similarity))
+                else:
+                    self._stats["below_threshold"] += 1
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+    def find(self, kind, params, fetch):
+        """
+        Returns a cached value for a near-duplicate of ``params``, or None.
+
+        Args:
+            kind: The generation type (itinerary, guide, gems)
+            params: Normalized request parameters, as passed to make_cache_key
+            fetch: Callable returning the cached value for a key, or None if it is gone
+        """
+        if kind not in QUERY_FIELDS:
+            return None
+        block, tokens = self.canonicalize(kind, params)
+        canonical = hash((block, tuple(sorted(tokens))))
+        with self._lock:
+            self._stats["lookups"] += 1
+        for key, similarity in self._candidates(block, tokens, canonical):
+            value = fetch(key)
+            if value is None:
+                # Evicted or expired from the response cache
+                with self._lock:
+                    self._stats["stale_keys"] += 1
+                    self._remove(key)
+                continue
+            with self._lock:
+                self._stats["hits"] += 1
+                self._stats["canonical_hits" if similarity == 1.0 else "similar_hits"] += 1
+            return value
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["buckets"] = len(self._buckets)
+        stats["extra_hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        stats["bands"] = self.bands
+        stats["rows"] = self.rows
+        return stats
+
+
+def create_near_duplicate_index(location_resolver=None):
+    """ Builds the index from QUERY_MATCH_* environment variables, or None when disabled. """
+    if os.getenv("QUERY_MATCH_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    return NearDuplicateIndex(
+        threshold=float(os.getenv("QUERY_MATCH_THRESHOLD", "0.8")),
+        num_perm=int(os.getenv("QUERY_MATCH_NUM_PERM", "32")),
+        max_entries=int(os.getenv("QUERY_MATCH_MAX_ENTRIES", "50000")),
+        location_resolver=location_resolver,
+    )
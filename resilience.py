@@ -0,0 +1,393 @@
+"""
+Deadlines, retries, hedging and circuit breaking for Gemini calls.
+
+Every generation goes through ResilientCaller.call(), which:
+- gives each endpoint an overall deadline and passes the remaining time to the
+  client as a per-attempt timeout, so a stalled call cannot hold a worker
+- retries only retryable google_exceptions, with jittered exponential backoff
+- optionally fires a hedged second attempt when the first is slower than a
+  threshold and returns whichever succeeds first
+- fails fast with CircuitOpenError while an endpoint's breaker is open; only
+  retryable, deadline and 5xx errors count towards opening it
+
+ResilientCaller.call_async() applies the same policies and breakers to
+coroutines for the asyncio serving mode (asgi.py).
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+from lazy_imports import lazy_module
+
+google_exceptions = lazy_module("google.api_core.exceptions")
+
+RETRYABLE_EXCEPTION_NAMES = (
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "GatewayTimeout",
+    "DeadlineExceeded",
+)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+@lru_cache(maxsize=None)
+def retryable_exceptions():
+    """ google_exceptions classes worth retrying; resolved on first use so importing this module stays cheap. """
+    return tuple(getattr(google_exceptions, name) for name in RETRYABLE_EXCEPTION_NAMES)
+
+
+def is_upstream_failure(error):
+    """
+    True for errors that say Gemini is unhealthy: retryable errors, deadlines and 5xx.
+
+    Client errors (InvalidArgument, PermissionDenied, a rejected prompt) are the
+    caller's fault and must not open the breaker.
+    """
+    return isinstance(error, retryable_exceptions() + (google_exceptions.ServerError,))
+
+
+class CircuitOpenError(Exception):
+    """ Raised without calling upstream while an endpoint's circuit breaker is open. """
+
+
+class CircuitBreaker:
+    """
+    Args:
+        failure_threshold: Consecutive failures that open the breaker
+        reset_timeout: Seconds the breaker stays open before allowing a trial call
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.short_circuited = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """ True if a call may proceed; in half-open state only one trial call is let through. """
+        with self._lock:
+            if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = BREAKER_HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != BREAKER_OPEN:
+                    self.opens += 1
+                    logging.warning(f"Circuit breaker opened after {self.failures} consecutive failures")
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+    def record_error(self, error):
+        """ Records a failed call; errors that are not upstream failures only end a half-open trial. """
+        if is_upstream_failure(error):
+            self.record_failure()
+        else:
+            self.release()
+
+    def release(self):
+        """ Gives back a half-open trial that ended without an outcome, e.g. a stream the client abandoned. """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opens": self.opens,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class ResiliencePolicy:
+    """
+    Args:
+        deadline: Overall seconds allowed for a call including retries
+        max_retries: Extra attempts after a retryable failure
+        backoff_base: First backoff in seconds (doubles per retry, full jitter)
+        backoff_max: Upper bound for a single backoff
+        hedge_after: Seconds before a hedged second attempt is started (0 disables hedging)
+    """
+
+    def __init__(self, deadline=60, max_retries=2, backoff_base=0.5, backoff_max=8, hedge_after=0):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+
+    @classmethod
+    def from_env(cls, endpoint, default_deadline):
+        """ Reads GEMINI_<SETTING>_<ENDPOINT> overrides, falling back to GEMINI_<SETTING>. """
+        def setting(name, default):
+            value = os.getenv(f"GEMINI_{name}_{endpoint.upper()}", os.getenv(f"GEMINI_{name}"))
+            return float(value) if value else default
+
+        return cls(
+            deadline=setting("DEADLINE", default_deadline),
+            max_retries=int(setting("MAX_RETRIES", 2)),
+            backoff_base=setting("BACKOFF_BASE", 0.5),
+            backoff_max=setting("BACKOFF_MAX", 8),
+            hedge_after=setting("HEDGE_AFTER", 0),
+        )
+
+
+class ResilientCaller:
+    """
+    Applies per-endpoint policies and circuit breakers to upstream calls.
+
+    Args:
+        policies: Mapping of endpoint name to ResiliencePolicy
+        breaker_factory: Zero-argument callable creating a CircuitBreaker per endpoint
+        max_hedge_workers: Threads running hedged calls (both the first attempt and its hedge).
+            While all are busy a call runs on the caller's thread without a hedge.
+    """
+
+    def __init__(self, policies, breaker_factory=CircuitBreaker, max_hedge_workers=64):
+        self.policies = policies
+        self.max_hedge_workers = max_hedge_workers
+        self._default_policy = ResiliencePolicy()
+        self._breaker_factory = breaker_factory
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_hedge_workers, thread_name_prefix="hedge")
+        self._hedge_slots_used = 0
+        self._stats = {}
+
+    def _count(self, endpoint, name):
+        with self._lock:
+            stats = self._stats.setdefault(
+                endpoint, {
+                    "calls": 0, "retries": 0, "hedges": 0, "hedges_skipped": 0, "hedge_wins": 0,
+                    "deadline_exceeded": 0, "failures": 0,
+                }
+            )
+            stats[name] += 1
+
+    def breaker(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = self._breaker_factory()
+            return breaker
+
+    def call(self, endpoint, attempt):
+        """
+        Runs ``attempt(timeout)`` under the endpoint's policy and returns its result.
+
+        ``attempt`` receives the seconds left before the deadline and should pass
+        them to the client as the request timeout.
+        """
+        policy = self.policies.get(endpoint, self._default_policy)
+        breaker = self.breaker(endpoint)
+        self._count(endpoint, "calls")
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker open for {endpoint}")
+
+        deadline = time.monotonic() + policy.deadline
+        retries = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count(endpoint, "deadline_exceeded")
+                breaker.record_failure()
+                raise google_exceptions.DeadlineExceeded(f"Deadline of {policy.deadline}s exceeded for {endpoint}")
+            try:
+                result = self._attempt(endpoint, policy, attempt, remaining)
+                breaker.record_success()
+                return result
+            except Exception as e:
+                if not isinstance(e, retryable_exceptions()) or retries >= policy.max_retries:
+                    self._count(endpoint, "failures")
+                    breaker.record_error(e)
+                    raise
+                retries += 1
+                self._count(endpoint, "retries")
+                backoff = random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** (retries - 1)))
+                backoff = min(backoff, max(deadline - time.monotonic(), 0))
+                logging.warning(f"Retrying {endpoint} after {type(e).__name__} (attempt {retries + 1}, backoff {backoff:.2f}s)")
+                time.sleep(backoff)
+
+    async def call_async(self, endpoint, attempt):
+        """
+        Awaits ``attempt(timeout)`` under the endpoint's policy, like call().
+
+        ``attempt`` is a coroutine function; each attempt is also cancelled when
+        the remaining time runs out, so a stalled call cannot outlive the deadline.
+        """
+        policy = self.policies.get(endpoint, self._default_policy)
+        breaker = self.breaker(endpoint)
+        self._count(endpoint, "calls")
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker open for {endpoint}")
+
+        deadline = time.monotonic() + policy.deadline
+        retries = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count(endpoint, "deadline_exceeded")
+                breaker.record_failure()
+                raise google_exceptions.DeadlineExceeded(f"Deadline of {policy.deadline}s exceeded for {endpoint}")
+            try:
+                result = await self._attempt_async(endpoint, policy, attempt, remaining)
+                breaker.record_success()
+                return result
+            except asyncio.TimeoutError:
+                self._count(endpoint, "deadline_exceeded")
+                breaker.record_failure()
+                raise google_exceptions.DeadlineExceeded(f"Deadline of {policy.deadline}s exceeded for {endpoint}")
+            except Exception as e:
+                if not isinstance(e, retryable_exceptions()) or retries >= policy.max_retries:
+                    self._count(endpoint, "failures")
+                    breaker.record_error(e)
+                    raise
+                retries += 1
+                self._count(endpoint, "retries")
+                backoff = random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** (retries - 1)))
+                backoff = min(backoff, max(deadline - time.monotonic(), 0))
+                logging.warning(f"Retrying {endpoint} after {type(e).__name__} (attempt {retries + 1}, backoff {backoff:.2f}s)")
+                await asyncio.sleep(backoff)
+
+    async def _attempt_async(self, endpoint, policy, attempt, remaining):
+        if not policy.hedge_after or policy.hedge_after >= remaining:
+            return await asyncio.wait_for(attempt(remaining), remaining)
+
+        started = time.monotonic()
+        primary = asyncio.ensure_future(attempt(remaining))
+        done, _ = await asyncio.wait([primary], timeout=policy.hedge_after)
+        if done:
+            return primary.result()
+
+        self._count(endpoint, "hedges")
+        hedge = asyncio.ensure_future(attempt(remaining - (time.monotonic() - started)))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                time_left = remaining - (time.monotonic() - started)
+                done, pending = await asyncio.wait(pending, timeout=max(time_left, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise google_exceptions.DeadlineExceeded(f"Hedged calls for {endpoint} exceeded the deadline")
+                # Reads every finished attempt's error first, so a loser's is never left unretrieved
+                errors = {future: future.exception() for future in done}
+                for future, future_error in errors.items():
+                    if future_error is None:
+                        if future is hedge:
+                            self._count(endpoint, "hedge_wins")
+                        return future.result()
+                    error = future_error
+            raise error
+        finally:
+            # Unlike threads, the losing attempt can be cancelled
+            for future in pending:
+                future.cancel()
+
+    def _attempt(self, endpoint, policy, attempt, remaining):
+        if not policy.hedge_after or policy.hedge_after >= remaining:
+            return attempt(remaining)
+
+        # Both attempts run on the bounded pool so the caller can return the first success.
+        # With no free thread the call runs on the caller's thread, unhedged, rather than wait.
+        primary = self._submit_to_pool(attempt, remaining)
+        if primary is None:
+            self._count(endpoint, "hedges_skipped")
+            return attempt(remaining)
+
+        started = time.monotonic()
+        done, _ = wait([primary], timeout=policy.hedge_after)
+        if done:
+            return primary.result()
+
+        hedge = self._submit_to_pool(attempt, remaining - (time.monotonic() - started))
+        if hedge is None:
+            self._count(endpoint, "hedges_skipped")
+            pending = {primary}
+        else:
+            self._count(endpoint, "hedges")
+            pending = {primary, hedge}
+        error = None
+        while pending:
+            time_left = remaining - (time.monotonic() - started)
+            done, pending = wait(pending, timeout=max(time_left, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                # The attempts were given the same timeout, so they finish on their own
+                raise google_exceptions.DeadlineExceeded(f"Hedged calls for {endpoint} exceeded the deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(endpoint, "hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _submit_to_pool(self, attempt, timeout):
+        """ Runs ``attempt(timeout)`` on the hedge pool, or returns None when every thread is busy. """
+        with self._lock:
+            if self._hedge_slots_used >= self.max_hedge_workers:
+                return None
+            self._hedge_slots_used += 1
+        future = self._hedge_executor.submit(attempt, timeout)
+        future.add_done_callback(self._release_hedge_slot)
+        return future
+
+    def _release_hedge_slot(self, future):
+        with self._lock:
+            self._hedge_slots_used -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = {endpoint: dict(values) for endpoint, values in self._stats.items()}
+            breakers = dict(self._breakers)
+        for endpoint, breaker in breakers.items():
+            stats.setdefault(endpoint, {})["breaker"] = breaker.stats()
+        return stats
+
+
+def create_resilient_caller():
+    """ Builds per-endpoint policies and breakers from GEMINI_* environment variables. """
+    policies = {
+        "itinerary": ResiliencePolicy.from_env("itinerary", 90),
+        # Regenerating a few days produces a fraction of a full itinerary
+        "itinerary_days": ResiliencePolicy.from_env("itinerary_days", 45),
+        "guide": ResiliencePolicy.from_env("guide", 45),
+        "gems": ResiliencePolicy.from_env("gems", 45),
+    }
+    threshold = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+    reset_timeout = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+    return ResilientCaller(
+        policies,
+        breaker_factory=lambda: CircuitBreaker(threshold, reset_timeout),
+        max_hedge_workers=int(os.getenv("GEMINI_HEDGE_WORKERS", "64")),
+    )
@@ -0,0 +1,178 @@
+"""
+Request handling shared by the Flask app (app.py) and the asyncio serving
+mode (asgi.py).
+
+Nothing here depends on a web framework: helpers take query parameters and
+headers as mappings, and GenerationStream keeps the events, circuit breaker
+and cache bookkeeping of a streamed generation, so each mode only drives its
+own upstream iteration.
+"""
+import json
+import logging
+import time
+
+from lazy_imports import lazy_module
+from resilience import CircuitOpenError
+
+google_exceptions = lazy_module("google.api_core.exceptions")
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+# --- Request Options ---
+def cache_bypass_requested(args, headers, data=None):
+    """ True when the caller asked to skip the response cache (?no_cache=1, "no_cache" in the body or Cache-Control: no-cache). """
+    flag = args.get('no_cache')
+    if flag is None and isinstance(data, dict):
+        flag = data.get('no_cache')
+    if str(flag).lower() in TRUE_VALUES:
+        return True
+    return 'no-cache' in headers.get('Cache-Control', '').lower()
+
+
+def streaming_requested(args, headers):
+    """ True when the caller opted into SSE via ?stream=1 or Accept: text/event-stream. """
+    if str(args.get('stream', '')).lower() in TRUE_VALUES:
+        return True
+    return 'text/event-stream' in headers.get('Accept', '')
+
+
+# --- HTTP Caching ---
+def revalidatable_value(response_cache, http_cache, endpoint, cache_key):
+    """
+    Expired response cache value still inside the endpoint's
+    stale-while-revalidate window, or None. Reads the disk tier when configured.
+    """
+    value, expires_at = response_cache.get_entry(cache_key)
+    window = http_cache.policy(endpoint).stale_while_revalidate
+    if value is not None and expires_at <= time.time() < expires_at + window:
+        return value
+    return None
+
+
+# --- Streaming (Server-Sent Events) ---
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class GenerationStream:
+    """
+    One Gemini generation streamed as Server-Sent Events.
+
+    Emits one "chunk" event per text fragment and always finishes with a
+    "done" event carrying completion metadata (and "error" if generation
+    failed). A cached answer is sent as a single chunk, a complete successful
+    result is stored in the response cache, and if a stream fails before
+    sending anything a stale cached answer replaces the error.
+
+    Streams are not retried or hedged once started, but share the endpoint's
+    circuit breaker. close() must run however the stream ends, including a
+    client disconnect, so an abandoned half-open trial is given back.
+
+    Args:
+        kind: Endpoint name (itinerary, guide)
+        result_field: Result field holding the text (itinerary, guide_info)
+        response_cache: cache.ResponseCache
+        breaker: The endpoint's resilience.CircuitBreaker
+        cache_key: Response cache key, or None if the result is not cached
+        bypass_cache: Skip the cache lookup; a successful result is still stored
+    """
+
+    def __init__(self, kind, result_field, response_cache, breaker, cache_key=None, bypass_cache=False):
+        self.kind = kind
+        self.result_field = result_field
+        self.response_cache = response_cache
+        self.breaker = breaker
+        self.cache_key = cache_key
+        self.bypass_cache = bypass_cache
+        self.started = time.perf_counter()
+        self.chunks = []
+        self.metadata = {"kind": kind, "cached": False}
+        self._admitted = False
+        self._settled = False
+
+    @property
+    def ok(self):
+        return "error" not in self.metadata
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    def _chunk(self, text):
+        self.chunks.append(text)
+        return sse_event("chunk", {"text": text})
+
+    def cached_event(self):
+        """ Chunk event with the cached answer, or None when Gemini has to be called. Reads the disk tier. """
+        if self.bypass_cache or self.cache_key is None:
+            return None
+        cached_value = self.response_cache.get(self.cache_key)
+        if cached_value is None:
+            return None
+        self.metadata["cached"] = True
+        return self._chunk(cached_value[self.result_field])
+
+    def admit(self):
+        """ Raises CircuitOpenError while the endpoint's breaker is open. """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker open for {self.kind}")
+        self._admitted = True
+
+    def chunk_event(self, text):
+        """ Chunk event for a streamed fragment, or None for an empty one. """
+        if not text:
+            return None
+        if not self.chunks:
+            self.metadata["time_to_first_chunk_ms"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return self._chunk(text)
+
+    def succeed(self):
+        """ Records a complete stream and caches its text. Writes the disk tier. """
+        self.breaker.record_success()
+        self._settled = True
+        if self.cache_key is not None:
+            self.response_cache.set(self.cache_key, {self.result_field: self.text})
+
+    def fail(self, error):
+        """ Records a failed stream; only upstream failures count against the breaker. """
+        if isinstance(error, CircuitOpenError):
+            logging.warning(f"Not streaming {self.kind}: {str(error)}")
+            self.metadata["error"] = f"API Error: {str(error)}"
+            return
+        if self._admitted and not self._settled:
+            self.breaker.record_error(error)
+            self._settled = True
+        if isinstance(error, google_exceptions.GoogleAPIError):
+            logging.error(f"Vertex AI API error while streaming {self.kind}: {str(error)}")
+            self.metadata["error"] = f"API Error: {str(error)}"
+        else:
+            logging.error(f"Error streaming {self.kind}: {str(error)}")
+            self.metadata["error"] = f"Error: {str(error)}"
+
+    def skip(self, message):
+        """ Ends the stream without calling Gemini, e.g. when the server is too busy. """
+        logging.warning(f"Not streaming {self.kind}: {message}")
+        self.metadata["error"] = message
+
+    def stale_event(self):
+        """ Chunk event with an expired cached answer when the stream failed before sending anything. Reads the disk tier. """
+        if self.ok or self.chunks or self.cache_key is None:
+            return None
+        stale_value = self.response_cache.get_stale(self.cache_key)
+        if stale_value is None:
+            return None
+        del self.metadata["error"]
+        self.metadata["stale"] = True
+        return self._chunk(stale_value[self.result_field])
+
+    def done_event(self):
+        self.metadata["chunks"] = len(self.chunks)
+        self.metadata["length"] = sum(len(text) for text in self.chunks)
+        self.metadata["elapsed_ms"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return sse_event("done", self.metadata)
+
+    def close(self):
+        """ Gives back a half-open breaker trial the stream took but never settled. """
+        if self._admitted and not self._settled:
+            self.breaker.release()
@@ -0,0 +1,202 @@
+"""
+Single-flight coalescing for identical in-flight generations.
+
+Concurrent callers with the same key wait on one upstream call and all
+receive its result (or its exception). Nothing is cached here: once the
+leader finishes, the next call with that key starts a new flight.
+
+With a lock directory configured, leaders in different worker processes
+also serialize on a file lock and re-check the shared cache before calling
+upstream, so a burst spread over several workers still costs one call. Keys
+are hashed onto a fixed set of lock files (stripes), so the directory never
+grows; two keys sharing a stripe only wait for each other.
+
+AsyncSingleFlight does the same for coroutines within one event loop (the
+asyncio serving mode); it does not take cross-worker file locks.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker coalescing is unavailable
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Args:
+        lock_dir: Optional directory for cross-worker file locks
+        lock_timeout: Seconds to wait for another worker's lock before calling upstream anyway
+        lock_stripes: Number of lock files keys are hashed onto
+    """
+
+    def __init__(self, lock_dir=None, lock_timeout=60, lock_stripes=1024):
+        if lock_dir and fcntl is None:
+            logging.warning("Cross-worker single-flight requires fcntl; using in-process coalescing only.")
+            lock_dir = None
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self.lock_dir = lock_dir
+        self.lock_timeout = lock_timeout
+        self.lock_stripes = lock_stripes
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "leaders": 0, "coalesced": 0, "errors": 0, "cross_worker_hits": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def do(self, key, fn, recheck=None):
+        """
+        Runs fn() once per key among concurrent callers and returns its result.
+
+        Args:
+            key: Normalized request key
+            fn: Zero-argument callable performing the upstream call
+            recheck: Optional zero-argument callable returning a shared-cache value
+                (or None); used after waiting on another worker's lock
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["leaders"] += 1
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_leader(key, fn, recheck)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            self._count("errors")
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _run_leader(self, key, fn, recheck):
+        if not self.lock_dir:
+            return fn()
+
+        with open(self._lock_path(key), "a") as lock_file:
+            locked, waited = self._acquire_file_lock(lock_file)
+            try:
+                if waited and recheck is not None:
+                    value = recheck()
+                    if value is not None:
+                        self._count("cross_worker_hits")
+                        return value
+                return fn()
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lock_path(self, key):
+        """ Lock file of the stripe the key hashes onto. """
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        stripe = int.from_bytes(digest[:8], "big") % self.lock_stripes
+        return os.path.join(self.lock_dir, f"stripe-{stripe}.lock")
+
+    def _acquire_file_lock(self, lock_file):
+        """
+        Takes the key's stripe file lock.
+
+        Returns (locked, waited): whether the lock is held, and whether another
+        worker held it first (so its result may already be in the shared cache).
+        """
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True, False
+        except BlockingIOError:
+            pass
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True, True
+            except BlockingIOError:
+                continue
+        logging.warning("Timed out waiting for cross-worker generation lock; calling upstream directly.")
+        return False, True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["cross_worker"] = self.lock_dir is not None
+        if self.lock_dir:
+            stats["lock_stripes"] = self.lock_stripes
+        return stats
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls with the same key into one task.
+
+    The shared task is shielded, so a caller that disconnects does not cancel
+    the generation the other waiters are still waiting for.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._stats = {"calls": 0, "leaders": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key, fn):
+        """ Awaits fn() once per key among concurrent callers and returns its result. """
+        self._stats["calls"] += 1
+        task = self._tasks.get(key)
+        if task is None:
+            self._stats["leaders"] += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["errors"] += 1
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._tasks)
+        return stats
+
+
+def create_single_flight():
+    """ Builds the single-flight group from SINGLE_FLIGHT_* environment variables. """
+    return SingleFlight(
+        lock_dir=os.getenv("SINGLE_FLIGHT_LOCK_DIR"),
+        lock_timeout=float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", "60")),
+        lock_stripes=int(os.getenv("SINGLE_FLIGHT_LOCK_STRIPES", "1024")),
+    )
@@ -0,0 +1,19 @@
+"""
+Shared setup: the app's SQLite state goes to a temporary directory and Gemini
+is replaced by the offline stub from benchmarks/stub_gemini.py, before any
+test module imports app.
+"""
+import os
+import sys
+import tempfile
+
+_state_dir = tempfile.mkdtemp(prefix="travel-app-tests-")
+os.environ.setdefault("JOB_STORE_DB", os.path.join(_state_dir, "jobs.db"))
+os.environ.setdefault("ITINERARY_STORE_DB", os.path.join(_state_dir, "itineraries.db"))
+os.environ.setdefault("GUIDE_SESSION_DB", os.path.join(_state_dir, "guide_sessions.db"))
+os.environ.setdefault("ASGI_WARMUP", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import stub_gemini  # noqa: E402
+
+stub_gemini.install(stub_gemini.StubConfig(latency_ms=20, latency_dist="fixed", response_chars=200, chunks=4, seed=1))
@@ -0,0 +1,101 @@
+"""
+Admission control: per-client token buckets, in-flight caps with a bounded
+queue, and batch items charged to their own endpoint's bucket.
+
+    python -m pytest -q tests
+"""
+import threading
+
+import pytest
+from flask import Flask, Response
+
+import app as travel_app
+from admission import AdmissionController, EndpointLimits, MemoryBucketStore, Rejected, SQLiteBucketStore
+
+
+def _controller(rate=0, burst=1, max_in_flight=4, max_queue=4, queue_timeout=1, bucket_store=None):
+    limits = {"guide": EndpointLimits(rate=rate, burst=burst, max_in_flight=max_in_flight, max_queue=max_queue)}
+    return AdmissionController(limits, bucket_store or MemoryBucketStore(), queue_timeout=queue_timeout)
+
+
+def _client(controller, view):
+    flask_app = Flask(__name__)
+    flask_app.add_url_rule("/guide", "guide", controller.limit("guide")(view))
+    return flask_app.test_client()
+
+
+def test_empty_bucket_returns_429_with_retry_after():
+    client = _client(_controller(rate=0.5, burst=2), lambda: "ok")
+    statuses = [client.get("/guide", headers={"X-API-Key": "a"}).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    rejected = client.get("/guide", headers={"X-API-Key": "a"})
+    assert rejected.headers["Retry-After"] == "2"
+    # Another client has its own bucket
+    assert client.get("/guide", headers={"X-API-Key": "b"}).status_code == 200
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "admission.db")
+    worker_a = _controller(rate=0.01, burst=2, bucket_store=SQLiteBucketStore(path))
+    worker_b = _controller(rate=0.01, burst=2, bucket_store=SQLiteBucketStore(path))
+    worker_a.check_rate("guide", "key:a")
+    worker_b.check_rate("guide", "key:a")
+    with pytest.raises(Rejected) as rejected:
+        worker_a.check_rate("guide", "key:a")
+    assert rejected.value.status == 429
+
+
+def test_full_queue_is_shed_with_503_and_slot_is_released():
+    entered, finish = threading.Event(), threading.Event()
+
+    def slow_view():
+        entered.set()
+        finish.wait(5)
+        return "ok"
+
+    client = _client(_controller(max_in_flight=1, max_queue=0), slow_view)
+    first = threading.Thread(target=client.get, args=("/guide",))
+    first.start()
+    assert entered.wait(5)
+
+    shed = client.get("/guide")
+    assert shed.status_code == 503 and "Retry-After" in shed.headers
+
+    finish.set()
+    first.join()
+    assert client.get("/guide").status_code == 200
+
+
+def test_streamed_response_holds_its_slot_until_closed():
+    controller = _controller(max_in_flight=1, max_queue=0)
+    client = _client(controller, lambda: Response(iter(["a", "b"]), mimetype="text/event-stream"))
+    response = client.get("/guide", buffered=False)
+    assert controller.endpoint_limiters["guide"].in_flight == 1
+    assert client.get("/guide").status_code == 503
+    response.close()
+    assert controller.endpoint_limiters["guide"].in_flight == 0
+
+
+def test_disabled_controller_leaves_routes_undecorated():
+    controller = AdmissionController({"guide": EndpointLimits(0, 1, 1, 0)}, MemoryBucketStore(), enabled=False)
+
+    def view():
+        return "ok"
+
+    assert controller.limit("guide")(view) is view
+
+
+def test_batch_items_are_charged_to_their_endpoint_bucket():
+    if not travel_app.admission.enabled:
+        pytest.skip("admission control disabled by ADMISSION_ENABLED")
+    burst = int(travel_app.admission.limits["guide"].burst)
+    items = [{"type": "guide", "location": "Hampi", "topic": f"topic {index}"} for index in range(burst + 2)]
+    response = travel_app.app.test_client().post(
+        "/api/batch", json={"requests": items}, headers={"X-API-Key": "batch-test"}
+    )
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.get_json()["results"]]
+    assert statuses.count(200) == burst
+    assert statuses.count(429) == 2
+    limited = [result for result in response.get_json()["results"] if result["status"] == 429]
+    assert all(result["retry_after"] >= 1 for result in limited)
@@ -0,0 +1,47 @@
+"""
+Persistent response cache tier: lazy file creation and bounded growth.
+
+    python -m pytest -q tests
+"""
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import SQLiteCache  # noqa: E402
+
+
+def test_no_file_until_used(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = SQLiteCache(str(path))
+    assert not path.exists()
+    cache.set("guide:1", {"guide_info": "x"})
+    assert path.exists()
+
+
+def test_expired_entries_are_served_stale_until_the_horizon_then_purged(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, stale_ttl=60)
+    cache.set("recent", {"v": 1}, ttl=-10)
+    cache.set("ancient", {"v": 2}, ttl=-120)
+
+    assert cache.get("recent") is None
+    assert cache.get("recent", allow_stale=True) == {"v": 1}
+    assert cache.get("ancient", allow_stale=True) is None
+
+    cache.purge_expired(force=True)
+    keys = {row[0] for row in sqlite3.connect(path).execute("SELECT key FROM response_cache")}
+    assert keys == {"recent"}
+
+
+def test_purge_is_throttled(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, stale_ttl=0, purge_interval=3600)
+    cache.set("first", {"v": 1}, ttl=-1)
+    cache.set("second", {"v": 2}, ttl=-1)
+    time.sleep(0.01)
+    count = sqlite3.connect(path).execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+    # The first write purged; the second one within the interval did not
+    assert count == 1
@@ -0,0 +1,26 @@
+"""
+Curated gems lookups: aliases and typos resolve, unrelated places do not.
+
+    python -m pytest -q tests
+"""
+import pytest
+
+from gems_catalog import GemsCatalog
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return GemsCatalog.load()
+
+
+@pytest.mark.parametrize("location, name", [
+    ("Goa", "Goa"), ("GOA", "Goa"), ("Mt. Abu", "Mount Abu"), ("mt abu", "Mount Abu"), ("MOUNT ABU", "Mount Abu"),
+    ("Mount Abuu", "Mount Abu"), ("mont abu", "Mount Abu"),
+])
+def test_aliases_and_typos_resolve(catalog, location, name):
+    assert catalog.resolve(location).name == name
+
+
+@pytest.mark.parametrize("location", ["Goal", "Gaya", "Gao", "Agra", "Mount Abc", "North Goa beaches", "", None])
+def test_unrelated_locations_do_not_resolve(catalog, location):
+    assert catalog.resolve(location) is None
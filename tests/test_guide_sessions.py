@@ -0,0 +1,54 @@
+"""
+Guide sessions stored in SQLite must be visible to every worker process.
+Two store instances on one file stand in for two gunicorn workers.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guide_sessions import SQLiteGuideSessionStore  # noqa: E402
+
+
+def test_turns_recorded_by_one_worker_are_seen_by_another(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    worker_a = SQLiteGuideSessionStore(path, max_turns=2)
+    worker_b = SQLiteGuideSessionStore(path, max_turns=2)
+
+    session = worker_a.create("Hampi", "FUNNY")
+    worker_b.record_turn(worker_b.get(session.id), "history", "Vijayanagara...")
+    stale = worker_a.get(session.id)
+    worker_b.record_turn(worker_b.get(session.id), "food", "Try the thali...")
+
+    # A session read before the other worker's turn picks it up before adding its own
+    worker_a.reload(stale)
+    worker_a.record_turn(stale, "temples", "Virupaksha...")
+
+    seen = worker_b.get(session.id)
+    assert seen.turn_count == 3
+    assert seen.topics() == ["history", "food", "temples"]
+    assert [topic for topic, _ in seen.turns] == ["food", "temples"]
+
+
+def test_delete_and_bounds_apply_across_workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    worker_a = SQLiteGuideSessionStore(path, max_sessions=2)
+    worker_b = SQLiteGuideSessionStore(path, max_sessions=2)
+
+    first = worker_a.create("Goa", "GENERAL")
+    worker_b.create("Hampi", "GENERAL")
+    worker_b.create("Jaipur", "GENERAL")
+    assert worker_a.get(first.id) is None
+    assert worker_a.stats()["sessions"] == 2
+
+    newest = worker_a.create("Udaipur", "BASIC")
+    assert worker_b.delete(newest.id)
+    assert worker_a.get(newest.id) is None
+
+
+def test_idle_sessions_expire(tmp_path):
+    store = SQLiteGuideSessionStore(str(tmp_path / "sessions.db"), idle_timeout=-1)
+    session = store.create("Goa", "GENERAL")
+    assert store.get(session.id) is None
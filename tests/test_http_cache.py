@@ -0,0 +1,96 @@
+"""
+Conditional GET: a 304 carries the same ETag as the 200 it revalidates, and
+responses that must not be reused are sent with no-store.
+
+    python -m pytest -q tests
+"""
+import pytest
+from flask import Flask
+
+import app as travel_app
+from http_cache import HttpCache, HttpCachePolicy, encoded_etag, etag_matches, payload_etag
+
+
+def _cache():
+    return HttpCache({"guide": HttpCachePolicy(max_age=60, stale_while_revalidate=30)}, min_compress_bytes=100)
+
+
+def _respond_compressed(cache, payload, if_none_match=None, accept_encoding=None):
+    """ respond() followed by the after_request compression, as in app.py. """
+    with Flask(__name__).test_request_context():
+        response = cache.respond("guide", payload, if_none_match, accept_encoding=accept_encoding)
+        return cache.compress(response, accept_encoding)
+
+
+def test_etag_ignores_key_order():
+    assert payload_etag({"a": 1, "b": 2}) == payload_etag({"b": 2, "a": 1})
+    assert payload_etag({"a": 1}) != payload_etag({"a": 2})
+
+
+@pytest.mark.parametrize("if_none_match", ['"abc"', 'W/"abc"', '"abc-gzip"', '"abc-br"', '"x", "abc"', "*"])
+def test_validators_match_every_representation(if_none_match):
+    assert etag_matches(if_none_match, '"abc"')
+
+
+@pytest.mark.parametrize("if_none_match", [None, "", '"abd"', '"abcd"'])
+def test_other_validators_do_not_match(if_none_match):
+    assert not etag_matches(if_none_match, '"abc"')
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "gzip", "gzip, deflate, br"])
+def test_304_has_the_etag_of_the_200(accept_encoding):
+    cache = _cache()
+    payload = {"guide_info": "Hampi " * 100}
+    full = _respond_compressed(cache, payload, accept_encoding=accept_encoding)
+    assert full.status_code == 200
+    if accept_encoding:
+        assert full.headers["Content-Encoding"] in ("gzip", "br")
+        assert full.headers["ETag"] == encoded_etag(payload_etag(payload), full.headers["Content-Encoding"])
+
+    revalidated = _respond_compressed(cache, payload, full.headers["ETag"], accept_encoding=accept_encoding)
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == full.headers["ETag"]
+    assert revalidated.headers["Cache-Control"] == full.headers["Cache-Control"]
+
+
+def test_small_bodies_keep_the_plain_etag():
+    cache = _cache()
+    payload = {"guide_info": "short"}
+    full = _respond_compressed(cache, payload, accept_encoding="gzip")
+    assert "Content-Encoding" not in full.headers
+    assert full.headers["ETag"] == payload_etag(payload)
+
+
+def test_uncacheable_response_is_no_store():
+    with Flask(__name__).test_request_context():
+        response = _cache().respond("guide", {"guide_info": "x"}, cacheable=False)
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_guide_endpoint_revalidates_with_304():
+    client = travel_app.app.test_client()
+    url = "/api/guide?location=Hampi&topic=stepwells%20and%20tanks"
+    headers = {"X-API-Key": "http-cache-test"}
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+    assert "max-age" in first.headers["Cache-Control"]
+
+    second = client.get(url, headers=dict(headers, **{"If-None-Match": first.headers["ETag"]}))
+    assert second.status_code == 304
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_cache_bypass_is_no_store():
+    client = travel_app.app.test_client()
+    response = client.get("/api/guide?location=Hampi&topic=boulders&no_cache=1", headers={"X-API-Key": "http-cache-test"})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_curated_gems_without_supplement_are_no_store(monkeypatch):
+    monkeypatch.setattr(travel_app, "GEMS_SUPPLEMENT_MODE", "async")
+    monkeypatch.setattr(travel_app, "_schedule_gems_supplement", lambda *args, **kwargs: None)
+    response = travel_app.app.test_client().get("/api/gems?location=Mt.%20Abu", headers={"X-API-Key": "gems"})
+    assert response.status_code == 200
+    assert travel_app.GEMS_SUPPLEMENT_HEADING not in response.get_json()["gems"]
+    assert response.headers["Cache-Control"] == "no-store"
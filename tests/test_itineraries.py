@@ -0,0 +1,96 @@
+"""
+Itinerary parsing on markdown shaped like real Gemini replies: day sections,
+per-day cost bullets and closing notes.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itineraries import Itinerary  # noqa: E402
+
+ITINERARY = """## 3-Day Jaipur Itinerary: Forts, Food & Bazaars
+
+Jaipur, the Pink City, is best explored early in the day before the heat sets in.
+
+**Day 1: Arrival & The Old City**
+
+* **Morning (9:00 AM):** Check in and head to **Hawa Mahal** (entry ₹50).
+* **Afternoon:** Lunch at **Laxmi Mishthan Bhandar** – try the dal kachori.
+* **Evening:** Walk through Johari Bazaar for jewellery and textiles.
+* **Estimated Cost for the day:** ₹3,500 per person
+
+**Day 2: Amber Fort & Nahargarh**
+
+* **Morning:** Amber Fort (entry ₹100); arrive by 8:30 AM to beat the crowds.
+* **Afternoon:** Lunch at **1135 AD** inside the fort.
+* **Evening:** Sunset at Nahargarh Fort.
+* **Tips:** Carry water and wear comfortable shoes for the ramparts.
+
+**Day 3: City Palace & Departure**
+
+* **Morning:** City Palace and Jantar Mantar (composite ticket ₹300).
+* **Afternoon:** Lunch at **Rawat Mishthan Bhandar** – famous pyaaz kachori.
+- Estimated Cost for the day: ₹4,000
+- Notes: Most museums close by 5 PM.
+
+**Accommodation Suggestions:**
+
+* **Budget:** Zostel Jaipur (₹800/night)
+* **Mid-range:** Alsisar Haveli (₹6,000/night)
+
+### Getting Around
+
+Use app cabs or auto-rickshaws; agree on the fare first.
+"""
+
+
+def test_round_trip_is_exact():
+    assert Itinerary.parse(ITINERARY).markdown == ITINERARY
+
+
+def test_days_keep_their_cost_and_tip_bullets():
+    itinerary = Itinerary.parse(ITINERARY)
+    assert itinerary.day_numbers() == [1, 2, 3]
+    day1, day2, day3 = itinerary.days
+    assert "Estimated Cost for the day:** ₹3,500" in day1.body
+    assert "Carry water" in day2.body
+    assert "Estimated Cost for the day: ₹4,000" in day3.body
+    assert "Most museums close by 5 PM" in day3.body
+    assert {"amount": "₹4,000", "activity": "Estimated Cost for the day: ₹4,000"} in day3.costs
+
+
+def test_epilogue_starts_at_closing_heading():
+    itinerary = Itinerary.parse(ITINERARY)
+    assert itinerary.epilogue.startswith("**Accommodation Suggestions:**")
+    assert "### Getting Around" in itinerary.epilogue
+    assert "Accommodation" not in itinerary.days[-1].body
+
+
+def test_markdown_heading_epilogue():
+    text = "## Day 1: Goa\n\n- Beach day\n- Budget: ₹2,000\n\n## Budget Breakdown\n\n- Stay: ₹5,000\n"
+    itinerary = Itinerary.parse(text)
+    assert itinerary.days[0].body == "\n\n- Beach day\n- Budget: ₹2,000\n\n"
+    assert itinerary.epilogue == "## Budget Breakdown\n\n- Stay: ₹5,000\n"
+
+
+def test_regenerated_last_day_replaces_all_old_activities():
+    itinerary = Itinerary.parse(ITINERARY)
+    reply = (
+        "**Day 3: Galta Ji & Departure**\n\n"
+        "* **Morning:** Galta Ji monkey temple.\n"
+        "* **Afternoon:** Lunch at **Tapri Central**.\n"
+        "* **Estimated Cost for the day:** ₹2,500\n"
+    )
+    new_days = Itinerary.parse(reply).days
+    assert "₹2,500" in new_days[0].body
+
+    merged = itinerary.replace_days(new_days)
+    last = merged.days[-1]
+    assert "Galta Ji" in last.body and "₹2,500" in last.body
+    assert "City Palace" not in last.body and "₹4,000" not in merged.markdown
+    assert merged.epilogue == itinerary.epilogue
+    assert merged.markdown.endswith(itinerary.epilogue)
+    assert "\n\n**Accommodation Suggestions:**" in merged.markdown
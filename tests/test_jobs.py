@@ -0,0 +1,33 @@
+"""
+Jobs abandoned by a worker that died must reach a final state.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JOB_FAILED, JOB_RUNNING, JobQueue, JobStore  # noqa: E402
+
+
+def test_job_claimed_shortly_before_restart_is_failed_later(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.create("itinerary", {})
+    assert store.claim(job_id)
+
+    queue = JobQueue(store, {"itinerary": lambda: {}}, stale_after=0.3, sweep_interval=0.1)
+    queue.recover()
+    assert queue.get(job_id)["status"] == JOB_RUNNING
+
+    time.sleep(0.4)
+    job = queue.get(job_id)
+    assert job["status"] == JOB_FAILED
+    assert job["error"]
+
+
+def test_store_creates_no_file_until_used(tmp_path):
+    path = tmp_path / "jobs.db"
+    JobStore(str(path))
+    assert not path.exists()
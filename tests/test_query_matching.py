@@ -0,0 +1,103 @@
+"""
+Near-duplicate matching must share answers between paraphrases and never
+between requests that ask for different things.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import normalize_list, normalize_text  # noqa: E402
+from query_matching import NearDuplicateIndex, canonical_duration, canonical_tokens  # noqa: E402
+
+
+def _itinerary(location="Jaipur", duration="3 days", interests="forts, food", other_prefs=""):
+    # Same normalization as app._itinerary_cache_params
+    return {
+        "location": normalize_text(location),
+        "duration": normalize_text(duration),
+        "interests": normalize_list(interests),
+        "other_prefs": normalize_text(other_prefs),
+    }
+
+
+def _matches(stored, requested, kind="itinerary"):
+    index = NearDuplicateIndex()
+    index.add(kind, stored, "stored-key")
+    return index.find(kind, requested, lambda key: {"key": key}) is not None
+
+
+@pytest.mark.parametrize("duration, days", [
+    ("3 days", "3"), ("three days", "3"), ("3-day", "3"), ("3 Days", "3"), ("a week", "7"), ("2 weeks", "14"),
+    ("two-week trip", "14"), ("weekend", "2"), ("10 days for 2 people", "10"), ("3 day weekend", "3"),
+])
+def test_duration_day_counts(duration, days):
+    assert canonical_duration(duration) == days
+
+
+@pytest.mark.parametrize("duration", ["3-4 days", "3 to 4 days", "a day or two", "3 nights / 4 days", "3 nights"])
+def test_ranges_and_other_units_never_equal_a_day_count(duration):
+    assert canonical_duration(duration) not in {"3", "4", "2"}
+
+
+@pytest.mark.parametrize("first, second", [
+    ("food and beaches", "beaches, foodie"),
+    ("Temples", "temple"),
+    ("museums and history", "history, museum"),
+    ("no seafood, beaches", "beaches but no seafood"),
+])
+def test_paraphrased_interests_share_tokens(first, second):
+    assert canonical_tokens(first) == canonical_tokens(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("not interested in temples", "temples"),
+    ("no seafood", "seafood"),
+    ("avoid crowds", "crowds"),
+    ("not too crowded", "crowded"),
+])
+def test_negations_do_not_match_the_positive(first, second):
+    assert canonical_tokens(first) != canonical_tokens(second)
+    assert not _matches(_itinerary(interests=second), _itinerary(interests=first))
+
+
+def test_stopwords_do_not_change_the_match():
+    assert _matches(
+        _itinerary(interests="forts, food"),
+        _itinerary(interests="I really love some forts and local food please"),
+    )
+
+
+def test_paraphrased_itinerary_reuses_the_stored_answer():
+    assert _matches(
+        _itinerary(duration="three days", interests="Forts and foodie spots"),
+        _itinerary(duration="3-day", interests="forts, food"),
+    )
+
+
+@pytest.mark.parametrize("changed", [
+    {"duration": "3-4 days"},
+    {"duration": "4 days"},
+    {"duration": "3 nights / 4 days"},
+    {"location": "Udaipur"},
+    {"interests": "forts, food, nightlife"},
+])
+def test_different_requests_do_not_match(changed):
+    assert not _matches(_itinerary(), _itinerary(**changed))
+
+
+def test_guides_in_different_styles_do_not_match():
+    stored = {"location": "hampi", "topic": "history of the temples", "style": "funny"}
+    assert _matches(stored, dict(stored, topic="temple history"), kind="guide")
+    assert not _matches(stored, dict(stored, style="basic"), kind="guide")
+
+
+def test_expired_cache_entry_is_dropped_from_the_index():
+    index = NearDuplicateIndex()
+    index.add("itinerary", _itinerary(), "gone-key")
+    assert index.find("itinerary", _itinerary(interests="food, forts"), lambda key: None) is None
+    assert len(index) == 0
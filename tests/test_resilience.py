@@ -0,0 +1,50 @@
+"""
+Hedged calls must return the first successful attempt instead of waiting
+for a slow one.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import ResiliencePolicy, ResilientCaller  # noqa: E402
+
+
+def _slow_then_fast(slow_seconds):
+    calls = []
+    lock = threading.Lock()
+
+    def attempt(timeout):
+        with lock:
+            calls.append(timeout)
+            number = len(calls)
+        time.sleep(slow_seconds if number == 1 else 0.05)
+        return number
+
+    return attempt
+
+
+def test_fast_hedge_cuts_slow_primary_short():
+    caller = ResilientCaller({"guide": ResiliencePolicy(deadline=5, hedge_after=0.1)})
+    started = time.monotonic()
+    assert caller.call("guide", _slow_then_fast(2)) == 2
+    assert time.monotonic() - started < 1
+    stats = caller.stats()["guide"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_primary_finishing_before_threshold_is_not_hedged():
+    caller = ResilientCaller({"guide": ResiliencePolicy(deadline=5, hedge_after=0.5)})
+    assert caller.call("guide", lambda timeout: "ok") == "ok"
+    assert caller.stats()["guide"]["hedges"] == 0
+
+
+def test_full_pool_skips_the_hedge():
+    caller = ResilientCaller({"guide": ResiliencePolicy(deadline=5, hedge_after=0.05)}, max_hedge_workers=1)
+    assert caller.call("guide", _slow_then_fast(0.2)) == 1
+    stats = caller.stats()["guide"]
+    assert stats["hedges"] == 0 and stats["hedges_skipped"] == 1
@@ -0,0 +1,46 @@
+"""
+Streaming must not leave a half-open circuit breaker stuck when the client
+disconnects mid-stream. Runs offline against benchmarks/stub_gemini.py (see conftest.py).
+
+    python -m pytest -q tests
+"""
+import asyncio
+
+import app as travel_app
+from resilience import BREAKER_HALF_OPEN, BREAKER_OPEN
+
+
+def _half_open_breaker(kind):
+    breaker = travel_app.resilient_caller.breaker(kind)
+    breaker.state = BREAKER_OPEN
+    breaker.opened_at = 0.0
+    return breaker
+
+
+def test_closed_stream_releases_half_open_trial():
+    breaker = _half_open_breaker("guide")
+    events = travel_app.stream_generation_vertexai("guide", "guide_info", "Topic: forts", bypass_cache=True)
+    assert next(events).startswith("event: chunk")
+    assert breaker.state == BREAKER_HALF_OPEN
+
+    # What the WSGI server does when the SSE client goes away
+    events.close()
+
+    assert breaker.allow()
+    breaker.record_success()
+
+
+def test_cancelled_async_stream_releases_half_open_trial():
+    import asgi
+
+    breaker = _half_open_breaker("itinerary")
+
+    async def consume_one_chunk():
+        events = asgi.stream_generation_async("itinerary", "itinerary", "Trip: Jaipur", bypass_cache=True)
+        assert (await events.__anext__()).startswith("event: chunk")
+        await events.aclose()
+
+    asyncio.run(consume_one_chunk())
+
+    assert breaker.allow()
+    breaker.record_success()
@@ -0,0 +1,91 @@
+"""
+Bounded pool of concurrent Gemini calls for the asyncio serving mode.
+
+In the threaded app every in-flight Gemini call holds an OS thread. Under
+asyncio a waiting request costs a coroutine, so thousands can be open at
+once; what has to stay bounded is the number of calls sent to Gemini
+together. Calls beyond ``max_concurrency`` wait on a semaphore. A bounded
+number may wait, each for at most ``queue_timeout`` seconds; beyond that the
+request is shed with 503 + Retry-After, as admission control does for the
+threaded app.
+"""
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
+
+
+class UpstreamBusyError(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class UpstreamPool:
+    """
+    Args:
+        max_concurrency: Gemini calls allowed in flight at once
+        max_waiting: Calls allowed to wait for a slot
+        queue_timeout: Seconds a call may wait before it is shed
+    """
+
+    def __init__(self, max_concurrency=256, max_waiting=2048, queue_timeout=10):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._stats = {"acquired": 0, "queued": 0, "shed": 0, "timed_out": 0, "peak_in_flight": 0, "peak_waiting": 0}
+
+    def _busy(self):
+        return UpstreamBusyError("Server is busy, please retry later", max(1, math.ceil(self.queue_timeout)))
+
+    @asynccontextmanager
+    async def slot(self):
+        """ Holds one upstream slot for the duration of the block; raises UpstreamBusyError when shed. """
+        if self._semaphore.locked():
+            if self.waiting >= self.max_waiting:
+                self._stats["shed"] += 1
+                raise self._busy()
+            self._stats["queued"] += 1
+            self.waiting += 1
+            self._stats["peak_waiting"] = max(self._stats["peak_waiting"], self.waiting)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._stats["timed_out"] += 1
+                raise self._busy()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self._stats["acquired"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+        })
+        return stats
+
+
+def create_upstream_pool():
+    """ Builds the pool from ASYNC_UPSTREAM_* environment variables. """
+    return UpstreamPool(
+        max_concurrency=int(os.getenv("ASYNC_UPSTREAM_MAX_CONCURRENCY", "256")),
+        max_waiting=int(os.getenv("ASYNC_UPSTREAM_MAX_WAITING", "2048")),
+        queue_timeout=float(os.getenv("ASYNC_UPSTREAM_QUEUE_TIMEOUT", "10")),
+    )
@@ -0,0 +1,216 @@
+"""
+Offline cache warming for popular destinations.
+
+Pregenerates the location x topic x style matrix for guides and the location
+list for gems, writing results into the persistent response cache tier that
+the API reads before falling back to live generation. Entries that are still
+fresh are skipped, so an interrupted run can simply be started again.
+
+Usage:
+    python -m app warm --destinations destinations.txt --topics "history,food"
+"""
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import make_cache_key
+
+RATE_LIMIT_MARKERS = ("429", "resource exhausted", "quota", "rate limit")
+
+
+class RateLimiter:
+    """ Spaces upstream calls so the whole pool stays under a requests-per-second budget. """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def back_off(self, seconds):
+        """ Pushes the next slot out after the upstream reports rate limiting. """
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def read_list_file(path):
+    """ Reads one entry per line, ignoring blank lines and # comments. """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def split_values(values):
+    """ Flattens repeated and comma-separated CLI values. """
+    items = []
+    for value in values or []:
+        items.extend(part.strip() for part in value.split(",") if part.strip())
+    return items
+
+
+def build_tasks(destinations, topics, styles, include_guides=True, include_gems=True, skip_gems_for=None):
+    """
+    Expands the warming matrix into (kind, params) tasks.
+
+    ``skip_gems_for`` is an optional predicate for destinations whose gems are
+    served from the curated catalog and need no pregeneration.
+    """
+    tasks = []
+    for location in destinations:
+        if include_guides:
+            for topic in topics:
+                for style in styles:
+                    tasks.append(("guide", {"location": location, "topic": topic, "style": style}))
+        if include_gems and not (skip_gems_for and skip_gems_for(location)):
+            tasks.append(("gems", {"location": location, "preferences": ""}))
+    return tasks
+
+
+def _is_rate_limited(error):
+    error = str(error).lower()
+    return any(marker in error for marker in RATE_LIMIT_MARKERS)
+
+
+class CacheWarmer:
+    """
+    Args:
+        response_cache: ResponseCache with a disk tier to warm
+        generators: Mapping of kind to (generation function, cache-param builder);
+            cached functions are unwrapped so warming never reads the cache itself
+        workers: Parallel upstream calls
+        rate: Maximum upstream calls per second across all workers (0 = unlimited)
+        ttl: Lifetime of warmed entries in seconds
+        min_fresh: Skip entries that remain valid for at least this many seconds
+        retries: Attempts per entry after a rate-limit or transient error
+    """
+
+    def __init__(self, response_cache, generators, workers=4, rate=1.0, ttl=7 * 86400,
+                 min_fresh=86400, retries=3):
+        self.response_cache = response_cache
+        self.generators = generators
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.ttl = ttl
+        self.min_fresh = min_fresh
+        self.retries = retries
+
+    def _is_fresh(self, key):
+        expires_at = self.response_cache.disk.expires_at(key)
+        return expires_at is not None and expires_at - time.time() >= self.min_fresh
+
+    def _warm_one(self, kind, params):
+        func, key_builder = self.generators[kind]
+        key = make_cache_key(kind, **key_builder(**params))
+        if self._is_fresh(key):
+            return "skipped", None
+
+        generate = getattr(func, "__wrapped__", func)
+        error = None
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            result = generate(**params)
+            if "error" not in result:
+                self.response_cache.set(key, result, ttl=self.ttl)
+                return "generated", None
+            error = result["error"]
+            if attempt == self.retries:
+                break
+            delay = min(60, 2 ** attempt * 2)
+            if _is_rate_limited(error):
+                logging.warning(f"Rate limited while warming {kind} {params}; backing off {delay}s")
+                self.limiter.back_off(delay)
+            else:
+                time.sleep(delay / 2)
+        return "failed", error
+
+    def run(self, tasks):
+        """ Warms all tasks and returns a summary report. """
+        started = time.perf_counter()
+        report = {"total": len(tasks), "generated": 0, "skipped": 0, "failed": 0, "failures": []}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="warm") as executor:
+            futures = {executor.submit(self._warm_one, kind, params): (kind, params) for kind, params in tasks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                kind, params = futures[future]
+                try:
+                    outcome, error = future.result()
+                except Exception as e:
+                    outcome, error = "failed", f"Error: {str(e)}"
+                report[outcome] += 1
+                if outcome == "failed":
+                    report["failures"].append({"kind": kind, "params": params, "error": error})
+                if done % 10 == 0 or done == len(tasks):
+                    logging.info(f"Warmed {done}/{len(tasks)} entries")
+        elapsed = time.perf_counter() - started
+        report["elapsed_s"] = round(elapsed, 2)
+        report["generated_per_s"] = round(report["generated"] / elapsed, 3) if elapsed else 0.0
+        return report
+
+
+def main(argv, response_cache, generators, styles, skip_gems_for=None):
+    """
+    Entry point for ``python -m app warm``.
+
+    Args:
+        argv: Command-line arguments after "warm"
+        response_cache: The API's ResponseCache (must have a disk tier)
+        generators: Mapping of kind to (generation function, cache-param builder)
+        styles: Supported guide styles
+        skip_gems_for: Optional predicate for destinations with curated gems
+    """
+    parser = argparse.ArgumentParser(prog="python -m app warm", description="Pregenerate guides and gems.")
+    parser.add_argument("--destinations", required=True, help="File with one destination per line")
+    parser.add_argument("--topics", action="append", help="Guide topics (comma-separated, repeatable)")
+    parser.add_argument("--topics-file", help="File with one guide topic per line")
+    parser.add_argument("--styles", action="append", help=f"Guide styles (default: {','.join(styles)})")
+    parser.add_argument("--no-guides", action="store_true", help="Skip guide generation")
+    parser.add_argument("--no-gems", action="store_true", help="Skip hidden gems generation")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel upstream calls (default 4)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Max upstream calls per second (default 1, 0 = unlimited)")
+    parser.add_argument("--ttl", type=int, default=7 * 86400, help="Lifetime of warmed entries in seconds")
+    parser.add_argument("--min-fresh", type=int, default=86400,
+                        help="Skip entries valid for at least this many more seconds")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per entry on failure")
+    args = parser.parse_args(argv)
+
+    if response_cache.disk is None:
+        parser.error("RESPONSE_CACHE_DB must be set so warmed entries are visible to the API")
+
+    topics = split_values(args.topics)
+    if args.topics_file:
+        topics.extend(read_list_file(args.topics_file))
+    selected_styles = [style.upper() for style in split_values(args.styles)] or list(styles)
+    unknown = [style for style in selected_styles if style not in styles]
+    if unknown:
+        parser.error(f"Unsupported styles: {', '.join(unknown)}")
+    include_guides = not args.no_guides
+    if include_guides and not topics:
+        parser.error("--topics or --topics-file is required unless --no-guides is given")
+
+    tasks = build_tasks(
+        read_list_file(args.destinations), topics, selected_styles,
+        include_guides=include_guides, include_gems=not args.no_gems, skip_gems_for=skip_gems_for,
+    )
+    warmer = CacheWarmer(
+        response_cache, generators, workers=args.workers, rate=args.rate,
+        ttl=args.ttl, min_fresh=args.min_fresh, retries=args.retries,
+    )
+    logging.info(f"Warming {len(tasks)} entries with {args.workers} workers at {args.rate} req/s")
+    report = warmer.run(tasks)
+
+    logging.info(
+        f"Warm complete: {report['generated']} generated, {report['skipped']} fresh, "
+        f"{report['failed']} failed in {report['elapsed_s']}s ({report['generated_per_s']} generated/s)"
+    )
+    for failure in report["failures"]:
+        logging.error(f"Failed to warm {failure['kind']} {failure['params']}: {failure['error']}")
+    return 1 if report["failed"] else 0